@@ -5,12 +5,20 @@ LessLLM - A lightweight LLM API proxy framework
 __version__ = "0.1.0"
 __author__ = "LessLLM Team"
 
-from .config import Config, configure
-from .server import start_server
-
 __all__ = [
     "Config",
     "configure", 
     "start_server",
     "__version__"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    # 延迟导入配置和服务端，避免 `lessllm --help` / `lessllm init` 加载 pydantic、FastAPI 等重量级依赖
+    if name in ("Config", "configure"):
+        from . import config
+        return getattr(config, name)
+    if name == "start_server":
+        from .server import start_server
+        return start_server
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
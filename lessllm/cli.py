@@ -7,9 +7,6 @@ import sys
 import os
 import subprocess
 import time
-from pathlib import Path
-from .config import configure
-from .server import start_server
 
 
 def main():
@@ -102,7 +99,12 @@ def start_gui_process(host, port):
 
 def run_server(args):
     """运行服务器"""
+    gui_process = None
     try:
+        # 延迟导入：只有 server 命令才需要加载完整的服务端依赖
+        from .config import configure
+        from .server import start_server
+        
         # 加载配置
         if args.config:
             if not os.path.exists(args.config):
@@ -113,7 +115,6 @@ def run_server(args):
             configure()
         
         # 启动 GUI（如果未禁用）
-        gui_process = None
         if not getattr(args, 'no_gui', False):
             gui_host = getattr(args, 'gui_host', 'localhost')
             gui_port = getattr(args, 'gui_port', 8501)
@@ -168,16 +169,26 @@ def terminate_gui_process(process):
 def test_connectivity(args):
     """测试连接性"""
     try:
+        # 延迟导入：只有 test 命令才需要事件循环和代理管理器
+        import asyncio
+        from .config import configure
+        from .proxy.manager import ProxyManager
+        
         # 加载配置
         if args.config:
             config = configure(yaml_path=args.config)
         else:
             config = configure()
         
-        from .proxy.manager import ProxyManager
-        
         proxy_manager = ProxyManager(config.proxy)
-        result = proxy_manager.test_connectivity()
+        
+        async def run_test():
+            try:
+                return await proxy_manager.test_connectivity()
+            finally:
+                await proxy_manager.aclose()
+        
+        result = asyncio.run(run_test())
         
         if result["success"]:
             print("✓ Proxy connectivity test successful")
@@ -197,10 +208,6 @@ def test_connectivity(args):
 def run_gui(args):
     """运行GUI"""
     try:
-        import subprocess
-        import sys
-        import os
-        
         # 获取GUI脚本路径
         gui_script = os.path.join(os.path.dirname(__file__), "..", "gui", "dashboard.py")
         gui_script = os.path.abspath(gui_script)
@@ -233,9 +240,8 @@ def run_gui(args):
         sys.exit(1)
 
 
-def init_config(args):
-    """初始化配置文件"""
-    config_content = """# LessLLM Configuration File
+# 默认配置文件模板（模块加载时编码一次）
+_CONFIG_TEMPLATE_BYTES = """# LessLLM Configuration File
 
 proxy:
   # HTTP代理配置
@@ -276,19 +282,24 @@ server:
   host: "0.0.0.0"
   port: 8000
   workers: 1
-"""
-    
+""".encode("utf-8")
+
+
+def init_config(args):
+    """初始化配置文件"""
     try:
-        output_path = Path(args.output)
-        
-        if output_path.exists():
+        # O_EXCL 保证"检查是否存在"与"创建文件"是同一个原子操作
+        try:
+            fd = os.open(args.output, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
             response = input(f"Configuration file {args.output} already exists. Overwrite? (y/N): ")
             if response.lower() != 'y':
                 print("Configuration initialization cancelled")
                 return
+            fd = os.open(args.output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(config_content)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_CONFIG_TEMPLATE_BYTES)
         
         print(f"✓ Configuration file created: {args.output}")
         print("Please edit the file and set your API keys and proxy settings")
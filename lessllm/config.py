@@ -3,13 +3,12 @@ Configuration management system for LessLLM
 """
 
 import os
+import re
 import yaml
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Dict, Any, Optional, Tuple
 from pydantic import BaseModel
-try:
-    from pydantic_settings import BaseSettings
-except ImportError:
-    from pydantic import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
 
 # 尝试加载.env文件
@@ -27,12 +26,28 @@ except ImportError:
                     os.environ[key] = value
 
 
+# ${VAR} 环境变量占位符
+_ENV_VAR_PATTERN = re.compile(r'\$\{([^}]+)\}')
+
+
+@lru_cache(maxsize=8)
+def _load_yaml(yaml_path: str, mtime_ns: int) -> Tuple[Any, bool]:
+    """解析YAML文件，返回 (数据, 是否包含环境变量占位符)，按路径和修改时间缓存结果"""
+    with open(yaml_path, 'r', encoding='utf-8') as f:
+        raw = f.read()
+    return yaml.safe_load(raw), '${' in raw
+
+
 class ProxyConfig(BaseModel):
     """代理配置"""
     http_proxy: Optional[str] = None
     socks_proxy: Optional[str] = None
     auth: Optional[Dict[str, str]] = None
     timeout: int = 30
+    # 上游连接池大小与空闲连接保留时间（秒）
+    max_connections: int = 1000
+    max_keepalive_connections: int = 100
+    keepalive_expiry: float = 30.0
 
 
 class LoggingConfig(BaseModel):
@@ -49,6 +64,19 @@ class AnalysisConfig(BaseModel):
     cache_estimation_accuracy_threshold: float = 0.8
 
 
+class ReliabilityConfig(BaseModel):
+    """上游调用可靠性配置"""
+    # 连续失败多少次后打开断路器，以及打开后多久放行试探请求（秒）
+    circuit_failure_threshold: int = 5
+    circuit_recovery_seconds: float = 30.0
+    # 非流式请求遇到超时、429或5xx时的总尝试次数和退避基数（秒）
+    retry_attempts: int = 3
+    retry_base_delay: float = 0.25
+    # 每个提供商同时进行的请求数上限，以及额外允许排队等待的请求数
+    bulkhead_capacity: int = 64
+    bulkhead_max_waiting: int = 128
+
+
 class ServerConfig(BaseModel):
     """服务器配置"""
     host: str = "0.0.0.0"
@@ -64,12 +92,13 @@ class Config(BaseSettings):
     logging: LoggingConfig = LoggingConfig()
     analysis: AnalysisConfig = AnalysisConfig()
     server: ServerConfig = ServerConfig()
+    reliability: ReliabilityConfig = ReliabilityConfig()
     
-    model_config = {
-        "env_file": ".env",
-        "case_sensitive": False,
-        "extra": "ignore"  # 允许并忽略额外字段
-    }
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=False,
+        extra="ignore"  # 允许并忽略额外字段
+    )
         
     @classmethod
     def from_yaml(cls, yaml_path: str) -> "Config":
@@ -77,14 +106,13 @@ class Config(BaseSettings):
         if not os.path.exists(yaml_path):
             raise FileNotFoundError(f"Configuration file not found: {yaml_path}")
         
-        # 先创建一个基础实例以加载.env文件
-        base_config = cls()
+        # 文件未修改时复用已解析的数据；环境变量替换总是生成新的容器，不会改动缓存
+        yaml_path = os.path.abspath(yaml_path)
+        yaml_data, has_env_vars = _load_yaml(yaml_path, os.stat(yaml_path).st_mtime_ns)
         
-        with open(yaml_path, 'r', encoding='utf-8') as f:
-            yaml_data = yaml.safe_load(f)
-            
-        # 替换环境变量
-        yaml_data = cls._replace_env_vars(yaml_data)
+        # 替换环境变量（文件中没有占位符时跳过整棵树的遍历）
+        if has_env_vars:
+            yaml_data = cls._replace_env_vars(yaml_data)
         
         # 使用yaml数据创建新实例
         return cls(**yaml_data)
@@ -97,23 +125,21 @@ class Config(BaseSettings):
         elif isinstance(data, list):
             return [Config._replace_env_vars(item) for item in data]
         elif isinstance(data, str):
-            import re
-            # 支持 ${VAR} 和 ${VAR}_suffix 格式
-            def replace_env_var(match):
-                env_var = match.group(1)
-                return os.getenv(env_var, match.group(0))
-            
-            return re.sub(r'\$\{([^}]+)\}', replace_env_var, data)
+            # 支持 ${VAR}、${VAR}_suffix 和 ${A}:${B} 格式
+            if '${' not in data:
+                return data
+            return _ENV_VAR_PATTERN.sub(lambda m: os.getenv(m.group(1), m.group(0)), data)
         return data
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
         return {
-            "proxy": self.proxy.dict(),
+            "proxy": self.proxy.model_dump(),
             "providers": self.providers,
-            "logging": self.logging.dict(),
-            "analysis": self.analysis.dict(),
-            "server": self.server.dict()
+            "logging": self.logging.model_dump(),
+            "analysis": self.analysis.model_dump(),
+            "server": self.server.model_dump(),
+            "reliability": self.reliability.model_dump()
         }
 
 
@@ -3,57 +3,117 @@ API request logger
 """
 
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from .models import APICallLog, RawAPIData, EstimatedAnalysis, PerformanceAnalysis, CacheAnalysis
 from .storage import LogStorage
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 每个批次最多写入的日志条数
+LOG_BATCH_SIZE = 500
+
+# 日志队列容量上限，防止存储写入过慢时内存无限增长
+LOG_QUEUE_MAXSIZE = 10000
+
+# 队列已满时等待空位的最长时间（秒）
+LOG_QUEUE_PUT_TIMEOUT = 0.05
+
+# 通知工作线程退出的哨兵对象
+_STOP = object()
+
+# 错误日志共用的零值分析数据，只读，所有错误日志共享同一实例
+_ERROR_PERFORMANCE = PerformanceAnalysis(total_latency_ms=0)
+_ERROR_CACHE = CacheAnalysis()
+
 
 class APILogger:
     """API调用日志记录器"""
     
-    def __init__(self, storage: LogStorage):
+    def __init__(self, storage: LogStorage, max_queue_size: int = LOG_QUEUE_MAXSIZE,
+                 drop_on_overload: bool = False):
         self.storage = storage
-        self._log_queue = asyncio.Queue()
+        self._log_queue = asyncio.Queue(maxsize=max_queue_size)
         self._logger_task: Optional[asyncio.Task] = None
+        # 单线程执行阻塞的存储写入，不阻塞事件循环，同时保证写入串行
+        self._io_pool: Optional[ThreadPoolExecutor] = None
         self._shutdown = False
+        # 队列已满时是否立即丢弃日志；否则短暂等待空位
+        self.drop_on_overload = drop_on_overload
+        self.dropped_logs = 0
     
     async def start(self):
         """启动日志记录器"""
         if self._logger_task is None:
+            self._io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lessllm-log-io")
             self._logger_task = asyncio.create_task(self._log_worker())
             logger.info("API logger started")
     
     async def stop(self):
-        """停止日志记录器"""
+        """停止日志记录器，写完已入队的日志后退出"""
         self._shutdown = True
         if self._logger_task:
+            await self._log_queue.put(_STOP)
             await self._logger_task
             self._logger_task = None
+            self._io_pool.shutdown(wait=True)
+            self._io_pool = None
             logger.info("API logger stopped")
     
     async def log_request(self, log: APICallLog):
-        """异步记录API请求"""
-        if not self._shutdown:
-            await self._log_queue.put(log)
+        """异步记录API请求；队列已满时丢弃日志并计数"""
+        if self._shutdown:
+            return
+        try:
+            if self.drop_on_overload:
+                self._log_queue.put_nowait(log)
+            else:
+                await asyncio.wait_for(self._log_queue.put(log), timeout=LOG_QUEUE_PUT_TIMEOUT)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self.dropped_logs += 1
+            logger.warning("Log queue full, dropped log %s (%d dropped so far)",
+                           log.request_id, self.dropped_logs)
     
     async def _log_worker(self):
-        """日志工作线程"""
-        while not self._shutdown or not self._log_queue.empty():
+        """日志工作线程：批量取出队列中的日志并在单个事务中写入"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
             try:
-                # 等待日志条目或超时
+                # 阻塞等待第一条日志，空闲时不会定时唤醒
+                item = await self._log_queue.get()
+                
+                # 取出已经在队列中的其余日志，组成一个批次
+                items = [item]
+                while len(items) < LOG_BATCH_SIZE and not self._log_queue.empty():
+                    items.append(self._log_queue.get_nowait())
+                
+                batch = [entry for entry in items if entry is not _STOP]
+                stopping = len(batch) != len(items)
+                
                 try:
-                    log = await asyncio.wait_for(self._log_queue.get(), timeout=1.0)
-                    self.storage.store_log(log)
-                    self._log_queue.task_done()
-                except asyncio.TimeoutError:
-                    continue
+                    if batch:
+                        await loop.run_in_executor(self._io_pool, self._store_batch, batch)
+                finally:
+                    for _ in items:
+                        self._log_queue.task_done()
                     
             except Exception as e:
-                logger.error(f"Failed to process log entry: {e}")
+                logger.error("Failed to process log batch: %s", e)
+    
+    def _store_batch(self, batch: List[APICallLog]):
+        """批量写入日志；整批失败时逐条重试，避免一条坏数据拖垮整个批次"""
+        try:
+            self.storage.store_logs_batch(batch)
+        except Exception as e:
+            logger.warning("Batch insert of %d logs failed, retrying individually: %s", len(batch), e)
+            for log in batch:
+                try:
+                    self.storage.store_log(log)
+                except Exception as row_error:
+                    logger.error("Failed to process log entry: %s", row_error)
     
     def log_sync(self, log: APICallLog):
         """同步记录日志（用于关键路径）"""
@@ -100,7 +160,7 @@ class APILogger:
             estimated_cost_usd=estimated_cost
         )
         
-        return APICallLog(
+        log = APICallLog(
             request_id=request_id,
             provider=provider,
             model=model,
@@ -112,6 +172,9 @@ class APILogger:
             user_id=user_id,
             session_id=session_id
         )
+        # usage仍在缓存中时提取关键字段，存储时不再重复解析
+        log.extract_key_fields()
+        return log
     
     def create_error_log(
         self,
@@ -133,8 +196,8 @@ class APILogger:
         )
         
         estimated_analysis = EstimatedAnalysis(
-            estimated_performance=PerformanceAnalysis(total_latency_ms=0),
-            estimated_cache=CacheAnalysis(),
+            estimated_performance=_ERROR_PERFORMANCE,
+            estimated_cache=_ERROR_CACHE,
             estimated_cost_usd=0.0
         )
         
@@ -4,8 +4,8 @@ Data models for API logging and analysis
 
 from datetime import datetime
 from typing import Dict, Any, Optional, List
-from pydantic import BaseModel, Field
-import uuid
+from pydantic import BaseModel, Field, PrivateAttr
+from .ids import new_id
 
 
 class PerformanceAnalysis(BaseModel):
@@ -68,7 +68,7 @@ class APICallLog(BaseModel):
     """完整的API调用日志"""
     # 基础信息
     timestamp: datetime = Field(default_factory=datetime.utcnow)
-    request_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    request_id: str = Field(default_factory=new_id)
     provider: str
     model: str
     endpoint: str
@@ -93,8 +93,15 @@ class APICallLog(BaseModel):
     actual_cached_tokens: Optional[int] = None
     actual_cache_hit_rate: Optional[float] = None
     
+    # 关键字段是否已提取，避免存储重试时重复解析
+    _key_fields_extracted: bool = PrivateAttr(default=False)
+    
     def extract_key_fields(self):
-        """从原始数据中提取关键字段以便查询"""
+        """从原始数据中提取关键字段以便查询（只执行一次）"""
+        if self._key_fields_extracted:
+            return
+        self._key_fields_extracted = True
+        
         if self.raw_data.extracted_usage:
             usage = self.raw_data.extracted_usage
             
@@ -119,7 +126,7 @@ class APICallLog(BaseModel):
 
 class StreamingChunk(BaseModel):
     """流式响应块数据模型"""
-    chunk_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    chunk_id: str = Field(default_factory=new_id)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     request_id: str
     chunk_data: Dict[str, Any]
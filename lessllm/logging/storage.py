@@ -3,24 +3,92 @@ DuckDB storage system for API logs
 """
 
 import duckdb
-import json
+import pandas as pd
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from pathlib import Path
 from ..logging.models import APICallLog, BatchAnalysisSummary
+from ..utils import json_codec
 import logging
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
+# api_calls 共42列，按建表顺序插入
+_INSERT_SQL = f"INSERT INTO api_calls VALUES ({', '.join(['?'] * 42)})"
+
+# performance_stats_daily 的累加列：求平均的指标保存 (总和, 非空计数)，
+# 与主表写入在同一事务中增量更新
+_DAILY_STATS_COLUMNS = (
+    "request_count", "successful_requests",
+    "ttft_sum", "ttft_count",
+    "tpot_sum", "tpot_count",
+    "latency_sum", "latency_count",
+    "tokens_per_second_sum", "tokens_per_second_count",
+    "cache_hit_rate_sum", "cache_hit_rate_count",
+    "total_tokens", "total_cost_usd",
+)
+
+# 累加时NULL视为"无数据"而不是0，与直接在主表上SUM的语义一致
+_UPSERT_DAILY_STATS_SQL = (
+    f"INSERT INTO performance_stats_daily VALUES ({', '.join(['?'] * (3 + len(_DAILY_STATS_COLUMNS)))}) "
+    "ON CONFLICT (date, model, provider) DO UPDATE SET "
+    + ", ".join(f"{c} = COALESCE({c} + EXCLUDED.{c}, {c}, EXCLUDED.{c})" for c in _DAILY_STATS_COLUMNS)
+)
+
+_REBUILD_DAILY_STATS_SQL = """
+    INSERT INTO performance_stats_daily
+    SELECT
+        CAST(timestamp AS DATE), model, provider,
+        COUNT(*), COUNT(CASE WHEN success = true THEN 1 END),
+        SUM(estimated_ttft_ms), COUNT(estimated_ttft_ms),
+        SUM(estimated_tpot_ms), COUNT(estimated_tpot_ms),
+        SUM(estimated_total_latency_ms), COUNT(estimated_total_latency_ms),
+        SUM(estimated_tokens_per_second), COUNT(estimated_tokens_per_second),
+        SUM(estimated_cache_hit_rate), COUNT(estimated_cache_hit_rate),
+        SUM(actual_total_tokens), SUM(estimated_cost_usd)
+    FROM api_calls
+    GROUP BY CAST(timestamp AS DATE), model, provider
+"""
+
+# Parquet导出参数：较大的行组和ZSTD压缩让导出文件更小、再次读取时扫描更快
+_EXPORT_PARQUET_OPTIONS = "FORMAT PARQUET, COMPRESSION ZSTD, ROW_GROUP_SIZE 100000"
+
 
 class LogStorage:
     """DuckDB日志存储系统"""
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, keep_connection: bool = False):
         self.db_path = db_path
         self._ensure_db_directory()
+        
+        # 长连接模式：进程内只打开一次数据库，每次操作使用独立游标。
+        # DuckDB同一时间只允许一个进程读写打开数据库文件，长连接会使GUI等
+        # 其他进程无法访问，因此默认每次操作临时连接
+        self._conn: Optional[duckdb.DuckDBPyConnection] = (
+            duckdb.connect(self.db_path) if keep_connection else None
+        )
         self._init_database()
     
+    @contextmanager
+    def _connection(self):
+        """获取数据库连接：长连接模式下返回新游标，否则临时打开连接"""
+        if self._conn is None:
+            with duckdb.connect(self.db_path) as conn:
+                yield conn
+        else:
+            cursor = self._conn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+    
+    def close(self):
+        """关闭长连接"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+    
     def _ensure_db_directory(self):
         """确保数据库目录存在"""
         db_dir = Path(self.db_path).parent
@@ -28,13 +96,15 @@ class LogStorage:
     
     def _init_database(self):
         """初始化数据库和表结构"""
-        with duckdb.connect(self.db_path) as conn:
+        with self._connection() as conn:
             # 创建主表
+            # request_id 不设主键：唯一性由按时间递增的ID生成保证，避免每次写入维护唯一索引；
+            # 按 request_id 的单行查询依靠ID中的时间前缀做区块裁剪
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS api_calls (
                     -- 基础信息
                     timestamp TIMESTAMP,
-                    request_id VARCHAR PRIMARY KEY,
+                    request_id VARCHAR,
                     provider VARCHAR,
                     model VARCHAR,
                     endpoint VARCHAR,
@@ -91,10 +161,12 @@ class LogStorage:
             """)
             
             # 创建索引
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_model_timestamp ON api_calls(model, timestamp);")
+            # provider/model 基数很低，ART索引对范围和分组查询无帮助却拖慢写入；
+            # 数据按时间顺序写入，按时间过滤时依靠DuckDB的min/max区块元数据裁剪
+            conn.execute("DROP INDEX IF EXISTS idx_model_timestamp;")
+            conn.execute("DROP INDEX IF EXISTS idx_provider_model;")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_performance ON api_calls(estimated_ttft_ms, estimated_tpot_ms);")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_analysis ON api_calls(estimated_cache_hit_rate, actual_cache_hit_rate);")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_provider_model ON api_calls(provider, model);")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_user_session ON api_calls(user_id, session_id);")
             
             # 创建分析视图
@@ -132,66 +204,52 @@ class LogStorage:
                 GROUP BY model, provider, DATE(timestamp);
             """)
             
+            # 按天物化的性能统计，供 get_performance_stats 直接读取汇总值
+            stats_table_exists = conn.execute(
+                "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'performance_stats_daily'"
+            ).fetchone()[0] > 0
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS performance_stats_daily (
+                    date DATE,
+                    model VARCHAR,
+                    provider VARCHAR,
+                    request_count BIGINT,
+                    successful_requests BIGINT,
+                    ttft_sum DOUBLE,
+                    ttft_count BIGINT,
+                    tpot_sum DOUBLE,
+                    tpot_count BIGINT,
+                    latency_sum DOUBLE,
+                    latency_count BIGINT,
+                    tokens_per_second_sum DOUBLE,
+                    tokens_per_second_count BIGINT,
+                    cache_hit_rate_sum DOUBLE,
+                    cache_hit_rate_count BIGINT,
+                    total_tokens BIGINT,
+                    total_cost_usd DOUBLE,
+                    PRIMARY KEY (date, model, provider)
+                );
+            """)
+            # 旧数据库首次升级时根据已有日志回填
+            if not stats_table_exists:
+                conn.execute(_REBUILD_DAILY_STATS_SQL)
+            
         logger.info(f"Database initialized at {self.db_path}")
     
     def store_log(self, log: APICallLog):
         """存储API调用日志"""
         try:
-            # 确保提取了关键字段
-            log.extract_key_fields()
+            row = self._log_to_row(log)
             
-            with duckdb.connect(self.db_path) as conn:
-                conn.execute("""
-                    INSERT INTO api_calls VALUES (
-                        ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-                    )
-                """, (
-                    log.timestamp,
-                    log.request_id,
-                    log.provider,
-                    log.model,
-                    log.endpoint,
-                    log.success,
-                    log.error_message,
-                    json.dumps(log.raw_data.raw_request),
-                    json.dumps(log.raw_data.raw_response),
-                    json.dumps(log.raw_data.extracted_usage) if log.raw_data.extracted_usage else None,
-                    json.dumps(log.raw_data.extracted_cache_info) if log.raw_data.extracted_cache_info else None,
-                    json.dumps(log.raw_data.extracted_performance) if log.raw_data.extracted_performance else None,
-                    # HTTP 详细信息
-                    json.dumps(log.raw_data.request_headers),
-                    json.dumps(log.raw_data.response_headers),
-                    json.dumps(log.raw_data.upstream_request_headers),
-                    json.dumps(log.raw_data.upstream_response_headers),
-                    # HTTP 元数据
-                    log.raw_data.request_method,
-                    log.raw_data.request_url,
-                    json.dumps(log.raw_data.request_query_params),
-                    log.raw_data.client_ip,
-                    log.raw_data.user_agent,
-                    log.raw_data.response_status_code,
-                    log.raw_data.response_size_bytes,
-                    log.raw_data.upstream_url,
-                    log.raw_data.upstream_status_code,
-                    # 分析数据
-                    log.estimated_analysis.estimated_performance.ttft_ms,
-                    log.estimated_analysis.estimated_performance.tpot_ms,
-                    log.estimated_analysis.estimated_performance.total_latency_ms,
-                    log.estimated_analysis.estimated_performance.tokens_per_second,
-                    log.estimated_analysis.estimated_cache.estimated_cached_tokens,
-                    log.estimated_analysis.estimated_cache.estimated_fresh_tokens,
-                    log.estimated_analysis.estimated_cache.estimated_cache_hit_rate,
-                    log.estimated_analysis.estimated_cost_usd,
-                    log.actual_prompt_tokens,
-                    log.actual_completion_tokens,
-                    log.actual_total_tokens,
-                    log.actual_cached_tokens,
-                    log.actual_cache_hit_rate,
-                    log.proxy_used,
-                    log.user_id,
-                    log.session_id,
-                    log.estimated_analysis.analysis_timestamp
-                ))
+            with self._connection() as conn:
+                conn.begin()
+                try:
+                    conn.execute(_INSERT_SQL, row)
+                    conn.executemany(_UPSERT_DAILY_STATS_SQL, self._daily_stats_rows([log]))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
             
             logger.debug(f"Stored log for request {log.request_id}")
             
@@ -199,10 +257,142 @@ class LogStorage:
             logger.error(f"Failed to store log {log.request_id}: {e}")
             raise
     
+    def store_logs_batch(self, logs: List[APICallLog]):
+        """在单个事务中批量存储API调用日志"""
+        if not logs:
+            return
+        
+        try:
+            # 按列组织整批数据，由DuckDB一次性扫描写入，而不是逐行执行INSERT；
+            # 使用object类型保留None，避免整数列被转换为带NaN的浮点列。
+            # 按时间排序写入，使每个行组的时间范围紧凑，便于按时间过滤时裁剪
+            batch = pd.DataFrame.from_records(
+                [self._log_to_row(log) for log in sorted(logs, key=lambda log: log.timestamp)]
+            ).astype(object)
+            
+            with self._connection() as conn:
+                conn.begin()
+                try:
+                    conn.append("api_calls", batch)
+                    conn.executemany(_UPSERT_DAILY_STATS_SQL, self._daily_stats_rows(logs))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            
+            logger.debug("Stored %d logs in batch", len(logs))
+            
+        except Exception as e:
+            logger.error("Failed to store log batch of %d: %s", len(logs), e)
+            raise
+    
+    @staticmethod
+    def _daily_stats_rows(logs: List[APICallLog]) -> List[tuple]:
+        """按 (日期, 模型, 提供商) 汇总一批日志，生成物化统计表的增量行"""
+        totals: Dict[tuple, list] = {}
+        for log in logs:
+            analysis = log.estimated_analysis
+            performance = analysis.estimated_performance
+            key = (log.timestamp.date(), log.model, log.provider)
+            
+            row = totals.get(key)
+            if row is None:
+                row = totals[key] = [0, 0, None, 0, None, 0, None, 0, None, 0, None, 0, None, None]
+            
+            row[0] += 1
+            row[1] += 1 if log.success else 0
+            
+            # 求平均的指标：累加总和与非空计数
+            averaged = (
+                performance.ttft_ms,
+                performance.tpot_ms,
+                performance.total_latency_ms,
+                performance.tokens_per_second,
+                analysis.estimated_cache.estimated_cache_hit_rate,
+            )
+            for index, value in enumerate(averaged):
+                if value is not None:
+                    position = 2 + index * 2
+                    row[position] = value if row[position] is None else row[position] + value
+                    row[position + 1] += 1
+            
+            # 只求和的指标
+            for position, value in ((12, log.actual_total_tokens), (13, analysis.estimated_cost_usd)):
+                if value is not None:
+                    row[position] = value if row[position] is None else row[position] + value
+        
+        return [key + tuple(row) for key, row in totals.items()]
+    
+    def refresh_performance_stats(self):
+        """根据主表完整重建按天物化的性能统计"""
+        with self._connection() as conn:
+            conn.begin()
+            try:
+                conn.execute("DELETE FROM performance_stats_daily")
+                conn.execute(_REBUILD_DAILY_STATS_SQL)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    @staticmethod
+    def _log_to_row(log: APICallLog) -> tuple:
+        """将日志对象展开为与 api_calls 列顺序一致的元组"""
+        # 确保提取了关键字段
+        log.extract_key_fields()
+        
+        return (
+            log.timestamp,
+            log.request_id,
+            log.provider,
+            log.model,
+            log.endpoint,
+            log.success,
+            log.error_message,
+            json_codec.dumps(log.raw_data.raw_request),
+            json_codec.dumps(log.raw_data.raw_response),
+            json_codec.dumps(log.raw_data.extracted_usage) if log.raw_data.extracted_usage else None,
+            json_codec.dumps(log.raw_data.extracted_cache_info) if log.raw_data.extracted_cache_info else None,
+            json_codec.dumps(log.raw_data.extracted_performance) if log.raw_data.extracted_performance else None,
+            # HTTP 详细信息
+            json_codec.dumps(log.raw_data.request_headers),
+            json_codec.dumps(log.raw_data.response_headers),
+            json_codec.dumps(log.raw_data.upstream_request_headers),
+            json_codec.dumps(log.raw_data.upstream_response_headers),
+            # HTTP 元数据
+            log.raw_data.request_method,
+            log.raw_data.request_url,
+            json_codec.dumps(log.raw_data.request_query_params),
+            log.raw_data.client_ip,
+            log.raw_data.user_agent,
+            log.raw_data.response_status_code,
+            log.raw_data.response_size_bytes,
+            log.raw_data.upstream_url,
+            log.raw_data.upstream_status_code,
+            # 分析数据
+            log.estimated_analysis.estimated_performance.ttft_ms,
+            log.estimated_analysis.estimated_performance.tpot_ms,
+            log.estimated_analysis.estimated_performance.total_latency_ms,
+            log.estimated_analysis.estimated_performance.tokens_per_second,
+            log.estimated_analysis.estimated_cache.estimated_cached_tokens,
+            log.estimated_analysis.estimated_cache.estimated_fresh_tokens,
+            log.estimated_analysis.estimated_cache.estimated_cache_hit_rate,
+            log.estimated_analysis.estimated_cost_usd,
+            log.actual_prompt_tokens,
+            log.actual_completion_tokens,
+            log.actual_total_tokens,
+            log.actual_cached_tokens,
+            log.actual_cache_hit_rate,
+            log.proxy_used,
+            log.user_id,
+            log.session_id,
+            log.estimated_analysis.analysis_timestamp
+        )
+    
     def query(self, sql: str, params: Optional[List] = None) -> List[Dict[str, Any]]:
         """执行SQL查询"""
         try:
-            with duckdb.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 if params:
                     cursor = conn.execute(sql, params)
                 else:
@@ -223,8 +413,8 @@ class LogStorage:
                             model: Optional[str] = None, 
                             provider: Optional[str] = None,
                             days: int = 7) -> Dict[str, Any]:
-        """获取性能统计"""
-        where_conditions = [f"timestamp >= current_date - INTERVAL {days} DAY"]
+        """获取性能统计（读取按天物化的汇总表）"""
+        where_conditions = [f"date >= current_date - INTERVAL {days} DAY"]
         params = []
         
         if model:
@@ -239,16 +429,16 @@ class LogStorage:
         
         sql = f"""
             SELECT 
-                COUNT(*) as total_requests,
-                COUNT(CASE WHEN success = true THEN 1 END) as successful_requests,
-                AVG(estimated_ttft_ms) as avg_ttft_ms,
-                AVG(estimated_tpot_ms) as avg_tpot_ms,
-                AVG(estimated_total_latency_ms) as avg_latency_ms,
-                AVG(estimated_tokens_per_second) as avg_tokens_per_second,
-                AVG(estimated_cache_hit_rate) as avg_cache_hit_rate,
-                SUM(actual_total_tokens) as total_tokens,
-                SUM(estimated_cost_usd) as total_cost_usd
-            FROM api_calls 
+                COALESCE(SUM(request_count), 0) as total_requests,
+                COALESCE(SUM(successful_requests), 0) as successful_requests,
+                SUM(ttft_sum) / NULLIF(SUM(ttft_count), 0) as avg_ttft_ms,
+                SUM(tpot_sum) / NULLIF(SUM(tpot_count), 0) as avg_tpot_ms,
+                SUM(latency_sum) / NULLIF(SUM(latency_count), 0) as avg_latency_ms,
+                SUM(tokens_per_second_sum) / NULLIF(SUM(tokens_per_second_count), 0) as avg_tokens_per_second,
+                SUM(cache_hit_rate_sum) / NULLIF(SUM(cache_hit_rate_count), 0) as avg_cache_hit_rate,
+                SUM(total_tokens) as total_tokens,
+                SUM(total_cost_usd) as total_cost_usd
+            FROM performance_stats_daily 
             WHERE {where_clause}
         """
         
@@ -307,15 +497,20 @@ class LogStorage:
                 else:
                     where_conditions.append("provider = ?")
                     params.append(value)
-            elif key == "success_only" and value:
-                where_conditions.append("success = true")
+            elif key == "success_only":
+                if value:
+                    where_conditions.append("success = true")
+            else:
+                raise ValueError(f"Unsupported export filter: {key}")
                 
         where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
         
-        sql = f"COPY (SELECT * FROM api_calls{where_clause}) TO '{filepath}' (FORMAT PARQUET)"
+        # COPY 的目标路径不能参数化，转义单引号后内联
+        escaped_path = str(filepath).replace("'", "''")
+        sql = f"COPY (SELECT * FROM api_calls{where_clause}) TO '{escaped_path}' ({_EXPORT_PARQUET_OPTIONS})"
         
         try:
-            with duckdb.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 conn.execute(sql, params)
             logger.info(f"Data exported to {filepath}")
         except Exception as e:
@@ -351,13 +546,16 @@ class LogStorage:
         delete_sql = f"DELETE FROM api_calls WHERE timestamp < current_date - INTERVAL {days_to_keep} DAY"
         
         try:
-            with duckdb.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 # 先查询数量
                 count_result = conn.execute(count_sql).fetchone()
                 deleted_count = count_result[0] if count_result else 0
                 
                 # 执行删除
                 conn.execute(delete_sql)
+                conn.execute(
+                    f"DELETE FROM performance_stats_daily WHERE date < current_date - INTERVAL {days_to_keep} DAY"
+                )
             
             logger.info(f"Cleaned up {deleted_count} old log records")
             return deleted_count
@@ -4,10 +4,23 @@ Intelligent cache analysis system
 
 import re
 import hashlib
-from typing import List, Dict, Any
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple
 from ..logging.models import CacheAnalysis
 from ..utils.token_counter import count_tokens
 
+# 重复模式检测至少需要10个单词，即至少19个字符（10个单字符单词 + 9个空格）
+_MIN_REPETITIVE_LENGTH = 19
+
+# 文本分析结果缓存的最大条目数
+_TEXT_STATS_CACHE_SIZE = 8192
+
+# 单段文本的分析结果：(token_count, template_tokens, is_repetitive)
+TextStats = Tuple[int, int, bool]
+
+# 预处理后的消息：(role, text, token_count, template_tokens, is_repetitive)
+PreparedMessage = Tuple[str, str, int, int, bool]
+
 
 class CacheEstimator:
     """智能缓存分析算法"""
@@ -26,22 +39,28 @@ class CacheEstimator:
             r"What (is|are|would be) the",
             r"How (do|can|should) (I|you|we)",
         ]
+        # 按文本指纹缓存分析结果；多轮对话中历史消息会在后续请求里重复出现
+        self._text_stats_cache: "OrderedDict[bytes, TextStats]" = OrderedDict()
+        self.text_stats_hits = 0
+        self.text_stats_misses = 0
         
     def estimate_cache_tokens(self, messages: List[Dict[str, Any]]) -> CacheAnalysis:
         """预估缓存token使用情况"""
         if not messages:
             return CacheAnalysis()
-            
-        total_tokens = self._count_messages_tokens(messages)
+        
+        # 统一预处理一次，后续分析不再重复做类型判断和token计数
+        prepared = self._prepare_messages(messages)
+        total_tokens = self._count_messages_tokens(prepared)
         
         # 1. 系统消息缓存分析
-        system_cached = self._analyze_system_messages(messages)
+        system_cached = self._analyze_system_messages(prepared)
         
         # 2. 模板和重复内容缓存分析  
-        template_cached = self._analyze_templates(messages)
+        template_cached = self._analyze_templates(prepared)
         
         # 3. 对话历史缓存分析
-        history_cached = self._analyze_conversation_history(messages)
+        history_cached = self._analyze_conversation_history(prepared)
         
         estimated_cached = min(total_tokens, system_cached + template_cached + history_cached)
         estimated_fresh = max(0, total_tokens - estimated_cached)
@@ -55,91 +74,115 @@ class CacheEstimator:
             conversation_history_cached=history_cached
         )
     
-    def _count_messages_tokens(self, messages: List[Dict[str, Any]]) -> int:
-        """计算消息总token数"""
-        total = 0
+    def _prepare_messages(self, messages: List[Dict[str, Any]]) -> List[PreparedMessage]:
+        """将消息规范化为 (role, text, token_count, template_tokens, is_repetitive) 元组列表"""
+        prepared = []
         for msg in messages:
-            content = msg.get("content", "")
-            if isinstance(content, str):
-                total += count_tokens(content)
-            elif isinstance(content, list):
-                # 处理多模态内容
-                for item in content:
-                    if isinstance(item, dict) and item.get("type") == "text":
-                        total += count_tokens(item.get("text", ""))
-        return total
+            text = self._extract_text(msg.get("content", ""))
+            prepared.append((msg.get("role", ""), text, *self._get_text_stats(text)))
+        return prepared
+    
+    def _get_text_stats(self, text: str) -> TextStats:
+        """获取文本的token数、模板token数和重复模式标记，相同文本只分析一次"""
+        if not text:
+            return 0, 0, False
+        
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        stats = self._text_stats_cache.get(key)
+        if stats is not None:
+            self.text_stats_hits += 1
+            self._text_stats_cache.move_to_end(key)
+            return stats
+        
+        self.text_stats_misses += 1
+        tokens = count_tokens(text)
+        stats = (
+            tokens,
+            self._match_template_tokens(text, tokens),
+            # 过短的内容不可能凑够10个单词，跳过扫描
+            len(text) >= _MIN_REPETITIVE_LENGTH and self._has_repetitive_patterns(text)
+        )
+        self._text_stats_cache[key] = stats
+        if len(self._text_stats_cache) > _TEXT_STATS_CACHE_SIZE:
+            self._text_stats_cache.popitem(last=False)
+        return stats
+    
+    @staticmethod
+    def _extract_text(content: Any) -> str:
+        """提取消息内容中的文本
+        
+        请求体来自JSON解析，只会是内置的 str/list/dict，因此用 `type(x) is`
+        代替开销更大的 isinstance。非文本内容返回空字符串作为占位，
+        使消息位置（如"最后一条消息"）保持不变。
+        """
+        content_type = type(content)
+        if content_type is str:
+            return content
+        if content_type is list:
+            # 处理多模态内容，只保留文本部分
+            return " ".join(
+                item.get("text", "") for item in content
+                if type(item) is dict and item.get("type") == "text"
+            )
+        return ""
+    
+    def _count_messages_tokens(self, prepared: List[PreparedMessage]) -> int:
+        """计算消息总token数"""
+        return sum(message[2] for message in prepared)
     
-    def _analyze_system_messages(self, messages: List[Dict[str, Any]]) -> int:
+    def _analyze_system_messages(self, prepared: List[PreparedMessage]) -> int:
         """分析系统消息的缓存潜力"""
         cached_tokens = 0
-        for msg in messages:
-            if msg.get("role") == "system":
-                content = msg.get("content", "")
-                if isinstance(content, str):
-                    content_hash = hashlib.md5(content.encode()).hexdigest()
-                    if content_hash in self.system_message_cache:
-                        cached_tokens += count_tokens(content)
-                    else:
-                        self.system_message_cache[content_hash] = content
+        for role, text, tokens, _, _ in prepared:
+            if role == "system":
+                content_hash = hashlib.md5(text.encode()).hexdigest()
+                if content_hash in self.system_message_cache:
+                    cached_tokens += tokens
+                else:
+                    self.system_message_cache[content_hash] = text
         return cached_tokens
         
-    def _analyze_templates(self, messages: List[Dict[str, Any]]) -> int:
+    def _analyze_templates(self, prepared: List[PreparedMessage]) -> int:
         """识别常见模板和重复模式"""
-        cached_tokens = 0
-        for msg in messages:
-            content = msg.get("content", "")
-            if isinstance(content, str):
-                for pattern in self.template_patterns:
-                    matches = re.findall(pattern, content, re.IGNORECASE)
-                    if matches:
-                        # 估算模板部分的token数
-                        matched_text = " ".join(matches)
-                        cached_tokens += min(count_tokens(matched_text), count_tokens(content) // 4)
-                        break  # 每个消息只计算一次模板缓存
-        return cached_tokens
+        return sum(message[3] for message in prepared)
+    
+    def _match_template_tokens(self, text: str, tokens: int) -> int:
+        """估算单条消息中模板部分的token数"""
+        for pattern in self.template_patterns:
+            matches = re.findall(pattern, text, re.IGNORECASE)
+            if matches:
+                # 估算模板部分的token数
+                matched_text = " ".join(matches)
+                return min(count_tokens(matched_text), tokens // 4)  # 每个消息只计算一次模板缓存
+        return 0
     
-    def _analyze_conversation_history(self, messages: List[Dict[str, Any]]) -> int:
+    def _analyze_conversation_history(self, prepared: List[PreparedMessage]) -> int:
         """分析对话历史的缓存潜力"""
-        if len(messages) <= 2:
+        if len(prepared) <= 2:
             return 0
             
         # 假设除最后一条消息外，其他消息有可能被缓存
         cached_tokens = 0
-        for msg in messages[:-1]:  # 排除最后一条消息
-            content = msg.get("content", "")
-            if isinstance(content, str):
-                # 根据消息位置和长度调整缓存概率
-                msg_tokens = count_tokens(content)
-                cache_probability = self._calculate_history_cache_probability(msg, len(messages))
-                cached_tokens += int(msg_tokens * cache_probability)
+        for role, text, tokens, _, is_repetitive in prepared[:-1]:  # 排除最后一条消息
+            content_length = len(text)
+            
+            # 基础缓存概率，系统消息更容易被缓存
+            probability = 0.8 if role == "system" else 0.3
+            
+            # 短消息更容易被缓存
+            if content_length < 100:
+                probability += 0.2
+            elif content_length < 500:
+                probability += 0.1
+            
+            # 重复内容更容易被缓存
+            if is_repetitive:
+                probability += 0.2
+            
+            cached_tokens += int(tokens * min(1.0, probability))
         
         return cached_tokens
     
-    def _calculate_history_cache_probability(self, message: Dict[str, Any], total_messages: int) -> float:
-        """计算历史消息的缓存概率"""
-        role = message.get("role", "")
-        content = message.get("content", "")
-        
-        # 基础缓存概率
-        base_probability = 0.3
-        
-        # 系统消息更容易被缓存
-        if role == "system":
-            base_probability = 0.8
-        
-        # 短消息更容易被缓存
-        content_length = len(content)
-        if content_length < 100:
-            base_probability += 0.2
-        elif content_length < 500:
-            base_probability += 0.1
-        
-        # 重复内容更容易被缓存
-        if self._has_repetitive_patterns(content):
-            base_probability += 0.2
-        
-        return min(1.0, base_probability)
-    
     def _has_repetitive_patterns(self, content: str) -> bool:
         """检测内容是否有重复模式"""
         # 简单的重复模式检测
@@ -3,65 +3,73 @@ Performance monitoring and metrics collection
 """
 
 import time
-from typing import List, Optional
+from typing import Optional
 from ..logging.models import PerformanceAnalysis
 
 
 class PerformanceTracker:
-    """精确的性能指标收集器"""
+    """精确的性能指标收集器
+    
+    所有时间点使用单调时钟 time.perf_counter_ns() 记录（整数纳秒），
+    不受系统时间调整影响，只在计算指标时换算为毫秒。
+    """
     
     def __init__(self):
-        self.request_start: Optional[float] = None
-        self.first_token_time: Optional[float] = None
-        self.token_timestamps: List[float] = []
+        self.request_start: Optional[int] = None
+        self.first_token_time: Optional[int] = None
+        # 只保留最后一个token的时间和计数，长流式响应不会累积时间戳列表
+        self.last_token_time: Optional[int] = None
+        self.token_count = 0
         
     def start_request(self):
         """记录请求开始时间"""
-        self.request_start = time.time()
+        self.request_start = time.perf_counter_ns()
         
     def record_first_token(self):
         """记录第一个token到达时间 - TTFT测量"""
         if self.first_token_time is None:
-            self.first_token_time = time.time()
+            self.first_token_time = time.perf_counter_ns()
             
     def record_token(self):
         """记录每个token到达时间 - TPOT计算基础"""
-        current_time = time.time()
+        current_time = time.perf_counter_ns()
         if self.first_token_time is None:
-            self.record_first_token()
-        self.token_timestamps.append(current_time)
+            self.first_token_time = current_time
+        self.last_token_time = current_time
+        self.token_count += 1
         
     def calculate_metrics(self, output_tokens: int) -> PerformanceAnalysis:
         """计算流式请求的最终性能指标"""
-        if not self.request_start:
+        if self.request_start is None:
             raise ValueError("Request start time not recorded")
             
-        if not self.first_token_time:
+        if self.first_token_time is None:
             # 如果没有记录到token，可能是空响应
             return PerformanceAnalysis(
                 ttft_ms=None,
                 tpot_ms=None,
-                total_latency_ms=int((time.time() - self.request_start) * 1000),
+                total_latency_ms=(time.perf_counter_ns() - self.request_start) // 1_000_000,
                 tokens_per_second=None
             )
         
         # TTFT = 第一个token时间 - 请求开始时间
-        ttft = (self.first_token_time - self.request_start) * 1000
+        ttft_ms = (self.first_token_time - self.request_start) // 1_000_000
         
         # TPOT = 总生成时间 / 输出token数
         tpot = None
         tokens_per_second = None
         
-        if len(self.token_timestamps) > 1 and output_tokens > 0:
-            generation_time = self.token_timestamps[-1] - self.first_token_time
+        if self.token_count > 1 and output_tokens > 0:
+            generation_time = self.last_token_time - self.first_token_time
             if generation_time > 0:
-                tpot = (generation_time * 1000) / output_tokens
-                tokens_per_second = output_tokens / generation_time
+                tpot = generation_time / 1_000_000 / output_tokens
+                tokens_per_second = output_tokens * 1_000_000_000 / generation_time
         
-        total_latency = int((self.token_timestamps[-1] if self.token_timestamps else time.time() - self.request_start) * 1000)
+        end_time = self.last_token_time if self.last_token_time is not None else time.perf_counter_ns()
+        total_latency = (end_time - self.request_start) // 1_000_000
         
         return PerformanceAnalysis(
-            ttft_ms=int(ttft),
+            ttft_ms=ttft_ms,
             tpot_ms=round(tpot, 2) if tpot else None,
             total_latency_ms=total_latency,
             tokens_per_second=round(tokens_per_second, 2) if tokens_per_second else None
@@ -69,11 +77,11 @@ class PerformanceTracker:
     
     def calculate_non_streaming_metrics(self) -> PerformanceAnalysis:
         """计算非流式请求的性能指标"""
-        if not self.request_start:
+        if self.request_start is None:
             raise ValueError("Request start time not recorded")
             
-        end_time = time.time()
-        total_latency = int((end_time - self.request_start) * 1000)
+        end_time = time.perf_counter_ns()
+        total_latency = (end_time - self.request_start) // 1_000_000
         
         # 非流式响应：TTFT = 总延迟，TPOT无法测量
         return PerformanceAnalysis(
@@ -85,6 +93,6 @@ class PerformanceTracker:
     
     def get_current_latency(self) -> int:
         """获取当前延迟（毫秒）"""
-        if not self.request_start:
+        if self.request_start is None:
             return 0
-        return int((time.time() - self.request_start) * 1000)
\ No newline at end of file
+        return (time.perf_counter_ns() - self.request_start) // 1_000_000
\ No newline at end of file
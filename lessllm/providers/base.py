@@ -2,8 +2,10 @@
 Base provider abstraction for LLM APIs
 """
 
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Dict, Any, AsyncIterator, Optional
+from types import MappingProxyType
+from typing import Dict, Any, AsyncIterator, List, Mapping, Optional, Union
 from ..logging.models import RawAPIData
 from ..proxy.manager import ProxyManager
 import httpx
@@ -11,33 +13,82 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+SSE_DATA_PREFIX = b"data: "
+
+
+async def iter_sse_data(response: httpx.Response) -> AsyncIterator[bytes]:
+    """逐条产出SSE流中 data 行的原始字节负载
+    
+    直接在字节上按行切分，不先把整个流解码为字符串，
+    负载可以直接交给JSON解析。
+    """
+    buffer = bytearray()
+    async for chunk in response.aiter_bytes():
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                break
+            if buffer.startswith(SSE_DATA_PREFIX, start):
+                yield bytes(buffer[start + len(SSE_DATA_PREFIX):end]).rstrip(b"\r")
+            start = end + 1
+        del buffer[:start]
+    
+    # 流结束时最后一行可能没有换行符
+    if buffer.startswith(SSE_DATA_PREFIX):
+        yield bytes(buffer[len(SSE_DATA_PREFIX):]).rstrip(b"\r")
+
 
 class BaseProvider(ABC):
     """所有LLM提供商的基础接口"""
     
-    def __init__(self, api_key: str, proxy_manager: Optional[ProxyManager] = None, base_url: Optional[str] = None):
+    def __init__(self, api_key: str, proxy_manager: Optional[ProxyManager] = None, base_url: Optional[str] = None,
+                 http_client: Optional[httpx.AsyncClient] = None):
         self.api_key = api_key
         self.proxy_manager = proxy_manager
         self.base_url = base_url
-        self._client: Optional[httpx.AsyncClient] = None
+        # 外部传入的共享客户端由调用方负责关闭
+        self._client: Optional[httpx.AsyncClient] = http_client
+        self._owns_client = http_client is None
+    
+    @property
+    def pricing(self) -> Mapping[str, Mapping[str, float]]:
+        """模型价格表 (USD per 1K tokens)，只读；修改价格需要整体重新赋值"""
+        return self._pricing
+    
+    @pricing.setter
+    def pricing(self, pricing: Dict[str, Dict[str, float]]):
+        # 保存只读副本，原地修改会直接报错，不会让下面换算好的单价悄悄过期
+        self._pricing = MappingProxyType({
+            model: MappingProxyType(dict(price)) for model, price in pricing.items()
+        })
+        # 每token单价 (输入, 输出)，设置价格时换算好，计费时直接查表
+        self._token_prices = {
+            model: (price["input"] / 1000, price["output"] / 1000)
+            for model, price in pricing.items()
+        }
     
     async def get_client(self) -> httpx.AsyncClient:
         """获取HTTP客户端，复用连接"""
         if self._client is None:
             if self.proxy_manager:
-                self._client = self.proxy_manager.get_httpx_client()
+                # 同一个代理管理器下的提供商共用连接池，由代理管理器负责关闭
+                self._client = self.proxy_manager.get_shared_client()
+                self._owns_client = False
             else:
                 self._client = httpx.AsyncClient(
                     timeout=30.0,
                     limits=httpx.Limits(max_connections=10)
                 )
+                self._owns_client = True
         return self._client
     
     async def close(self):
-        """关闭HTTP客户端"""
-        if self._client:
+        """关闭HTTP客户端（共享客户端只解除引用）"""
+        if self._client and self._owns_client:
             await self._client.aclose()
-            self._client = None
+        self._client = None
     
     @abstractmethod
     async def send_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
@@ -49,6 +100,23 @@ class BaseProvider(ABC):
         """发送流式请求到LLM API"""
         pass
     
+    async def send_requests_batch(
+        self, requests: List[Dict[str, Any]]
+    ) -> List[Union[Dict[str, Any], BaseException]]:
+        """并发发送一批非流式请求
+        
+        所有请求共享同一个HTTP客户端的连接池；结果顺序与输入一致，
+        失败的请求在对应位置返回异常对象而不是中断整批请求。
+        """
+        if not requests:
+            return []
+        # 预先创建共享客户端，避免并发任务各自创建
+        await self.get_client()
+        return await asyncio.gather(
+            *(self.send_request(request) for request in requests),
+            return_exceptions=True
+        )
+    
     @abstractmethod
     def parse_raw_response(self, request: Dict[str, Any], response: Dict[str, Any]) -> RawAPIData:
         """解析原始API响应"""
@@ -99,7 +167,7 @@ class BaseProvider(ABC):
             await self.send_request(test_request)
             return True
         except Exception as e:
-            logger.error(f"API key validation failed: {e}")
+            logger.error("API key validation failed: %s", e)
             return False
     
     @abstractmethod
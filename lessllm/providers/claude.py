@@ -4,20 +4,25 @@ Claude API provider implementation
 
 import json
 from typing import Dict, Any, AsyncIterator, Optional
-from .base import BaseProvider
+from .base import BaseProvider, iter_sse_data
 from ..logging.models import RawAPIData
+from ..utils import json_codec
 from ..proxy.manager import ProxyManager
 import httpx
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 从OpenAI格式请求原样透传给Claude的采样参数
+_PASSTHROUGH_PARAMS = ("temperature", "top_p", "top_k")
+
 
 class ClaudeProvider(BaseProvider):
     """Claude API提供商实现"""
     
-    def __init__(self, api_key: str, proxy_manager: Optional[ProxyManager] = None, base_url: Optional[str] = None):
-        super().__init__(api_key, proxy_manager, base_url)
+    def __init__(self, api_key: str, proxy_manager: Optional[ProxyManager] = None, base_url: Optional[str] = None,
+                 http_client: Optional[httpx.AsyncClient] = None):
+        super().__init__(api_key, proxy_manager, base_url, http_client)
         
         # Claude模型价格表 (USD per 1K tokens)
         self.pricing = {
@@ -36,12 +41,24 @@ class ClaudeProvider(BaseProvider):
             "claude-2.1": 200000,
             "claude-2.0": 100000,
         }
+        
+        # 请求头只依赖 api_key 和 base_url，按这两个值缓存
+        self._headers: Optional[Dict[str, str]] = None
+        self._headers_key: Optional[tuple] = None
     
     def get_default_base_url(self) -> str:
         return "https://api.anthropic.com/v1"
     
     def get_headers(self) -> Dict[str, str]:
-        """获取Claude特定的请求头"""
+        """获取Claude特定的请求头（返回缓存的字典，调用方不应修改）"""
+        headers_key = (self.api_key, self.base_url)
+        if self._headers_key != headers_key:
+            self._headers = self._build_headers()
+            self._headers_key = headers_key
+        return self._headers
+    
+    def _build_headers(self) -> Dict[str, str]:
+        """构造Claude请求头"""
         headers = {
             "Content-Type": "application/json",
             "User-Agent": "LessLLM/0.1.0"
@@ -65,18 +82,19 @@ class ClaudeProvider(BaseProvider):
         headers = self.get_headers()
         
         # 直接使用Claude格式的请求，不做转换
-        claude_request = request.copy()
-        claude_request["stream"] = False
+        claude_request = {**request, "stream": False}
         
         try:
             response = await client.post(url, json=claude_request, headers=headers)
             response.raise_for_status()
-            return response.json()
+            return json_codec.loads(response.content)
         except httpx.HTTPStatusError as e:
-            logger.error(f"Claude API HTTP error: {e.response.status_code} - {e.response.text}")
+            # 响应体可能很大，只有在确实输出日志时才解码
+            if logger.isEnabledFor(logging.ERROR):
+                logger.error("Claude API HTTP error: %d - %s", e.response.status_code, e.response.text)
             raise Exception(f"Claude API error: {e.response.status_code}")
         except Exception as e:
-            logger.error(f"Claude API request failed: {e}")
+            logger.error("Claude API request failed: %s", e)
             raise
     
     async def send_claude_messages_streaming_request(self, request: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
@@ -86,26 +104,23 @@ class ClaudeProvider(BaseProvider):
         headers = self.get_headers()
         
         # 直接使用Claude格式的请求，设置流式
-        claude_request = request.copy()
-        claude_request["stream"] = True
+        claude_request = {**request, "stream": True}
         
         try:
             async with client.stream("POST", url, json=claude_request, headers=headers) as response:
                 response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]  # 移除 "data: " 前缀
-                        if data.strip() == "[DONE]":
-                            break
-                        try:
-                            yield json.loads(data)
-                        except json.JSONDecodeError:
-                            continue
+                async for data in iter_sse_data(response):
+                    if data.strip() == b"[DONE]":
+                        break
+                    try:
+                        yield json_codec.loads(data)
+                    except json.JSONDecodeError:
+                        continue
         except httpx.HTTPStatusError as e:
-            logger.error(f"Claude streaming API HTTP error: {e.response.status_code}")
+            logger.error("Claude streaming API HTTP error: %d", e.response.status_code)
             raise Exception(f"Claude streaming API error: {e.response.status_code}")
         except Exception as e:
-            logger.error(f"Claude streaming API request failed: {e}")
+            logger.error("Claude streaming API request failed: %s", e)
             raise
     
     async def send_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
@@ -121,12 +136,13 @@ class ClaudeProvider(BaseProvider):
         try:
             response = await client.post(url, json=claude_request, headers=headers)
             response.raise_for_status()
-            return response.json()
+            return json_codec.loads(response.content)
         except httpx.HTTPStatusError as e:
-            logger.error(f"Claude API error: {e.response.status_code} - {e.response.text}")
+            if logger.isEnabledFor(logging.ERROR):
+                logger.error("Claude API error: %d - %s", e.response.status_code, e.response.text)
             raise
         except Exception as e:
-            logger.error(f"Request failed: {e}")
+            logger.error("Request failed: %s", e)
             raise
     
     async def send_streaming_request(self, request: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
@@ -143,51 +159,46 @@ class ClaudeProvider(BaseProvider):
             async with client.stream("POST", url, json=claude_request, headers=headers) as response:
                 response.raise_for_status()
                 
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]  # 移除 "data: " 前缀
-                        
-                        try:
-                            chunk = json.loads(data)
-                            yield chunk
-                        except json.JSONDecodeError:
-                            continue
-                            
+                async for data in iter_sse_data(response):
+                    try:
+                        yield json_codec.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    
         except httpx.HTTPStatusError as e:
-            logger.error(f"Claude streaming API error: {e.response.status_code}")
+            logger.error("Claude streaming API error: %d", e.response.status_code)
             raise
         except Exception as e:
-            logger.error(f"Streaming request failed: {e}")
+            logger.error("Streaming request failed: %s", e)
             raise
     
     def _convert_to_claude_format(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """将OpenAI格式转换为Claude格式"""
+        messages = request.get("messages", [])
         claude_request = {
             "model": request["model"],
             "max_tokens": request.get("max_tokens", 1000),
-            "messages": []
+            "messages": [
+                {"role": msg["role"], "content": msg["content"]}
+                for msg in messages if msg["role"] != "system"
+            ]
         }
         
-        # 转换消息格式
-        system_message = None
-        for msg in request.get("messages", []):
-            if msg["role"] == "system":
-                system_message = msg["content"]
-            else:
-                claude_request["messages"].append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-        
+        # 有多条system消息时以最后一条为准
+        system_message = next((msg["content"] for msg in reversed(messages) if msg["role"] == "system"), None)
         if system_message:
             claude_request["system"] = system_message
-            
+        
         # 复制其他参数
-        if "temperature" in request:
-            claude_request["temperature"] = request["temperature"]
-        if "top_p" in request:
-            claude_request["top_p"] = request["top_p"]
-            
+        for key in _PASSTHROUGH_PARAMS:
+            if key in request:
+                claude_request[key] = request[key]
+        
+        # OpenAI的stop可以是单个字符串或列表，Claude只接受列表形式的stop_sequences
+        stop = request.get("stop")
+        if stop:
+            claude_request["stop_sequences"] = [stop] if isinstance(stop, str) else list(stop)
+        
         return claude_request
     
     def parse_raw_response(self, request: Dict[str, Any], response: Dict[str, Any]) -> RawAPIData:
@@ -215,19 +226,13 @@ class ClaudeProvider(BaseProvider):
     
     def estimate_cost(self, usage: Dict[str, Any], model: str) -> float:
         """估算Claude API调用成本"""
-        if model not in self.pricing:
-            logger.warning(f"Unknown model for cost estimation: {model}")
+        prices = self._token_prices.get(model)
+        if prices is None:
+            logger.warning("Unknown model for cost estimation: %s", model)
             return 0.0
         
-        pricing = self.pricing[model]
-        prompt_tokens = usage.get("prompt_tokens", 0)
-        completion_tokens = usage.get("completion_tokens", 0)
-        
-        # 计算成本 (价格是每1K tokens)
-        input_cost = (prompt_tokens / 1000) * pricing["input"]
-        output_cost = (completion_tokens / 1000) * pricing["output"]
-        
-        return input_cost + output_cost
+        input_price, output_price = prices
+        return usage.get("prompt_tokens", 0) * input_price + usage.get("completion_tokens", 0) * output_price
     
     def normalize_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """将通用请求格式转换为Claude格式"""
@@ -237,7 +242,11 @@ class ClaudeProvider(BaseProvider):
         """将Claude响应格式转换为OpenAI兼容格式"""
         if "content" not in response:
             return response
-            
+        
+        content = response["content"]
+        
+        stop_reason = response.get("stop_reason")
+        
         # 转换为OpenAI格式
         normalized = {
             "id": response.get("id", ""),
@@ -248,18 +257,21 @@ class ClaudeProvider(BaseProvider):
                 "index": 0,
                 "message": {
                     "role": "assistant",
-                    "content": response["content"][0]["text"] if response["content"] else ""
+                    "content": content[0]["text"] if content else ""
                 },
-                "finish_reason": "stop" if response.get("stop_reason") == "end_turn" else response.get("stop_reason")
+                "finish_reason": "stop" if stop_reason == "end_turn" else stop_reason
             }]
         }
         
         # 添加usage信息
-        if "usage" in response:
+        usage = response.get("usage")
+        if usage is not None:
+            input_tokens = usage.get("input_tokens", 0)
+            output_tokens = usage.get("output_tokens", 0)
             normalized["usage"] = {
-                "prompt_tokens": response["usage"].get("input_tokens", 0),
-                "completion_tokens": response["usage"].get("output_tokens", 0),
-                "total_tokens": response["usage"].get("input_tokens", 0) + response["usage"].get("output_tokens", 0)
+                "prompt_tokens": input_tokens,
+                "completion_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens
             }
         
         return normalized
@@ -278,12 +290,10 @@ class ClaudeProvider(BaseProvider):
     
     def get_input_cost_per_token(self, model: str) -> float:
         """获取输入token的单价(USD)"""
-        if model in self.pricing:
-            return self.pricing[model]["input"] / 1000
-        return 0.0
+        prices = self._token_prices.get(model)
+        return prices[0] if prices else 0.0
     
     def get_output_cost_per_token(self, model: str) -> float:
         """获取输出token的单价(USD)"""
-        if model in self.pricing:
-            return self.pricing[model]["output"] / 1000
-        return 0.0
\ No newline at end of file
+        prices = self._token_prices.get(model)
+        return prices[1] if prices else 0.0
\ No newline at end of file
@@ -4,8 +4,9 @@ OpenAI API provider implementation
 
 import json
 from typing import Dict, Any, AsyncIterator, Optional
-from .base import BaseProvider
+from .base import BaseProvider, iter_sse_data
 from ..logging.models import RawAPIData
+from ..utils import json_codec
 from ..proxy.manager import ProxyManager
 import httpx
 import logging
@@ -16,8 +17,9 @@ logger = logging.getLogger(__name__)
 class OpenAIProvider(BaseProvider):
     """OpenAI API提供商实现"""
     
-    def __init__(self, api_key: str, proxy_manager: Optional[ProxyManager] = None, base_url: Optional[str] = None):
-        super().__init__(api_key, proxy_manager, base_url)
+    def __init__(self, api_key: str, proxy_manager: Optional[ProxyManager] = None, base_url: Optional[str] = None,
+                 http_client: Optional[httpx.AsyncClient] = None):
+        super().__init__(api_key, proxy_manager, base_url, http_client)
         
         # OpenAI模型价格表 (USD per 1K tokens)
         self.pricing = {
@@ -61,10 +63,12 @@ class OpenAIProvider(BaseProvider):
             response.raise_for_status()
             return response.json()
         except httpx.HTTPStatusError as e:
-            logger.error(f"OpenAI API error: {e.response.status_code} - {e.response.text}")
+            # 响应体可能很大，只有在确实输出日志时才解码
+            if logger.isEnabledFor(logging.ERROR):
+                logger.error("OpenAI API error: %d - %s", e.response.status_code, e.response.text)
             raise
         except Exception as e:
-            logger.error(f"Request failed: {e}")
+            logger.error("Request failed: %s", e)
             raise
     
     async def send_streaming_request(self, request: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
@@ -81,24 +85,20 @@ class OpenAIProvider(BaseProvider):
             async with client.stream("POST", url, json=request_data, headers=headers) as response:
                 response.raise_for_status()
                 
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = line[6:]  # 移除 "data: " 前缀
-                        
-                        if data == "[DONE]":
-                            break
-                            
-                        try:
-                            chunk = json.loads(data)
-                            yield chunk
-                        except json.JSONDecodeError:
-                            continue
+                async for data in iter_sse_data(response):
+                    if data.strip() == b"[DONE]":
+                        break
+                    
+                    try:
+                        yield json_codec.loads(data)
+                    except json.JSONDecodeError:
+                        continue
                             
         except httpx.HTTPStatusError as e:
-            logger.error(f"OpenAI streaming API error: {e.response.status_code}")
+            logger.error("OpenAI streaming API error: %d", e.response.status_code)
             raise
         except Exception as e:
-            logger.error(f"Streaming request failed: {e}")
+            logger.error("Streaming request failed: %s", e)
             raise
     
     def parse_raw_response(self, request: Dict[str, Any], response: Dict[str, Any]) -> RawAPIData:
@@ -136,19 +136,13 @@ class OpenAIProvider(BaseProvider):
     
     def estimate_cost(self, usage: Dict[str, Any], model: str) -> float:
         """估算OpenAI API调用成本"""
-        if model not in self.pricing:
-            logger.warning(f"Unknown model for cost estimation: {model}")
+        prices = self._token_prices.get(model)
+        if prices is None:
+            logger.warning("Unknown model for cost estimation: %s", model)
             return 0.0
         
-        pricing = self.pricing[model]
-        prompt_tokens = usage.get("prompt_tokens", 0)
-        completion_tokens = usage.get("completion_tokens", 0)
-        
-        # 计算成本 (价格是每1K tokens)
-        input_cost = (prompt_tokens / 1000) * pricing["input"]
-        output_cost = (completion_tokens / 1000) * pricing["output"]
-        
-        return input_cost + output_cost
+        input_price, output_price = prices
+        return usage.get("prompt_tokens", 0) * input_price + usage.get("completion_tokens", 0) * output_price
     
     def normalize_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
         """OpenAI格式已经是标准格式，直接返回"""
@@ -172,12 +166,10 @@ class OpenAIProvider(BaseProvider):
     
     def get_input_cost_per_token(self, model: str) -> float:
         """获取输入token的单价(USD)"""
-        if model in self.pricing:
-            return self.pricing[model]["input"] / 1000
-        return 0.0
+        prices = self._token_prices.get(model)
+        return prices[0] if prices else 0.0
     
     def get_output_cost_per_token(self, model: str) -> float:
         """获取输出token的单价(USD)"""
-        if model in self.pricing:
-            return self.pricing[model]["output"] / 1000
-        return 0.0
\ No newline at end of file
+        prices = self._token_prices.get(model)
+        return prices[1] if prices else 0.0
\ No newline at end of file
@@ -9,6 +9,12 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 
 class ProxyManager:
     """统一的代理管理器"""
@@ -18,10 +24,28 @@ class ProxyManager:
         self.socks_proxy = config.socks_proxy
         self.auth = config.auth or {}
         self.timeout = config.timeout
+        self.limits = httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry
+        )
+        self._shared_client: Optional[httpx.AsyncClient] = None
         
         # 验证代理配置
         self._validate_config()
         
+        # 代理配置在构造后不再变化，代理、认证和代理信息只计算一次
+        self._proxies = self._build_proxy_config()
+        self._auth = self._build_auth_config()
+        self.active_proxy = self.socks_proxy or self.http_proxy or "direct"
+        self._proxy_info = {
+            "http_proxy": self.http_proxy,
+            "socks_proxy": self.socks_proxy,
+            "has_auth": bool(self.auth and self.auth.get("username")),
+            "timeout": self.timeout,
+            "active_proxy": self.active_proxy
+        }
+        
     def _validate_config(self):
         """验证代理配置的有效性"""
         if self.http_proxy and self.socks_proxy:
@@ -35,46 +59,54 @@ class ProxyManager:
     
     def get_httpx_client(self, **kwargs) -> httpx.AsyncClient:
         """获取配置了代理的httpx客户端"""
-        proxies = self._build_proxy_config()
-        auth = self._build_auth_config()
-        
         # 合并默认配置和用户配置
         client_config = {
             "timeout": self.timeout,
-            "limits": httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            "limits": self.limits,
+            # 安装了 h2 时启用HTTP/2，同一上游的并发请求（含流式）复用一条连接
+            "http2": HTTP2_AVAILABLE,
             "follow_redirects": True,
             **kwargs  # 允许用户覆盖默认配置
         }
         
         # 添加认证配置（如果有）
-        if auth:
-            client_config["auth"] = auth
+        if self._auth:
+            client_config["auth"] = self._auth
         
-        logger.debug(f"Creating httpx client with proxy config: {proxies}")
-        # 新版本httpx使用transport来处理代理
-        if proxies:
-            # 为每个协议创建代理传输
-            transports = {}
-            for protocol, proxy_url in proxies.items():
-                if proxy_url.startswith('socks'):
-                    try:
-                        import httpx_socks
-                        transports[protocol] = httpx_socks.AsyncSOCKSProxyTransport.from_url(proxy_url)
-                    except ImportError:
-                        logger.warning("httpx-socks not installed, SOCKS proxy will not work")
-                else:
-                    transports[protocol] = httpx.HTTPTransport(proxy=proxy_url)
-            
-            # 使用自定义传输
-            if transports:
-                # 使用第一个传输作为默认传输
-                default_transport = list(transports.values())[0]
-                client_config["transport"] = default_transport
-                # 对于多个协议，我们需要创建更复杂的传输配置
-                # 这里简化处理，只使用一个代理
+        logger.debug(f"Creating httpx client with proxy config: {self._proxies}")
+        # 新版本httpx使用transport来处理代理；http:// 和 https:// 总是指向同一个代理，
+        # 只需要一个传输（传输归客户端所有，随客户端关闭，因此每个客户端各建一个）
+        if self._proxies:
+            proxy_url = self._proxies["https://"]
+            if proxy_url.startswith('socks'):
+                try:
+                    import httpx_socks
+                    client_config["transport"] = httpx_socks.AsyncSOCKSProxyTransport.from_url(proxy_url)
+                except ImportError:
+                    logger.warning("httpx-socks not installed, SOCKS proxy will not work")
+            else:
+                # 自定义传输时客户端的 limits/http2 不生效，需要传给传输本身
+                client_config["transport"] = httpx.AsyncHTTPTransport(
+                    proxy=proxy_url, limits=client_config["limits"], http2=client_config["http2"]
+                )
         
         return httpx.AsyncClient(**client_config)
     
+    def get_shared_client(self, **kwargs) -> httpx.AsyncClient:
+        """获取共享的httpx客户端
+        
+        首次调用时按参数创建，之后的调用直接复用同一个连接池，参数不再生效。
+        """
+        if self._shared_client is None or self._shared_client.is_closed:
+            self._shared_client = self.get_httpx_client(**kwargs)
+        return self._shared_client
+    
+    async def aclose(self):
+        """关闭共享客户端"""
+        if self._shared_client is not None:
+            await self._shared_client.aclose()
+            self._shared_client = None
+    
     def _build_proxy_config(self) -> Optional[Dict[str, str]]:
         """构建代理配置"""
         if self.socks_proxy:
@@ -95,47 +127,19 @@ class ProxyManager:
             return (self.auth["username"], self.auth.get("password", ""))
         return None
     
-    def test_connectivity(self, test_url: str = "https://httpbin.org/get") -> Dict[str, Any]:
-        """测试代理连接性"""
+    async def test_connectivity(self, test_url: str = "https://httpbin.org/get") -> Dict[str, Any]:
+        """测试代理连接性（复用共享客户端的连接池）"""
         try:
-            # 使用同步客户端进行测试
-            proxies = self._build_proxy_config()
-            auth = self._build_auth_config()
+            response = await self.get_shared_client().get(test_url)
             
-            # 构建同步客户端配置
-            client_config = {
-                "timeout": self.timeout
+            return {
+                "success": True,
+                "status_code": response.status_code,
+                "response_time_ms": response.elapsed.total_seconds() * 1000,
+                "proxy_used": self.socks_proxy or self.http_proxy,
+                "message": "Proxy connection successful"
             }
             
-            if auth:
-                client_config["auth"] = auth
-            
-            # 处理代理配置
-            if proxies:
-                # 为同步客户端处理代理
-                proxy_url = list(proxies.values())[0]  # 使用第一个代理
-                if proxy_url.startswith('socks'):
-                    try:
-                        import httpx_socks
-                        transport = httpx_socks.SyncSOCKSProxyTransport.from_url(proxy_url)
-                        client_config["transport"] = transport
-                    except ImportError:
-                        logger.warning("httpx-socks not installed, SOCKS proxy will not work")
-                        # 回退到直接连接
-                else:
-                    client_config["proxy"] = proxy_url
-            
-            with httpx.Client(**client_config) as sync_client:
-                response = sync_client.get(test_url)
-                
-                return {
-                    "success": True,
-                    "status_code": response.status_code,
-                    "response_time_ms": response.elapsed.total_seconds() * 1000,
-                    "proxy_used": self.socks_proxy or self.http_proxy,
-                    "message": "Proxy connection successful"
-                }
-                
         except httpx.TimeoutException:
             return {
                 "success": False,
@@ -159,11 +163,5 @@ class ProxyManager:
             }
     
     def get_proxy_info(self) -> Dict[str, Any]:
-        """获取代理信息"""
-        return {
-            "http_proxy": self.http_proxy,
-            "socks_proxy": self.socks_proxy,
-            "has_auth": bool(self.auth and self.auth.get("username")),
-            "timeout": self.timeout,
-            "active_proxy": self.socks_proxy or self.http_proxy or "direct"
-        }
\ No newline at end of file
+        """获取代理信息（构造时预先计算，调用方不应修改返回的字典）"""
+        return self._proxy_info
\ No newline at end of file
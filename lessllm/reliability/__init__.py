@@ -0,0 +1,13 @@
+"""
+Reliability primitives for upstream provider calls
+"""
+
+from .circuit import CircuitBreaker, CircuitOpenError, is_upstream_failure
+from .retry import retry_async, is_retryable
+from .bulkhead import Bulkhead, BulkheadFullError
+
+__all__ = [
+    "CircuitBreaker", "CircuitOpenError", "is_upstream_failure",
+    "retry_async", "is_retryable",
+    "Bulkhead", "BulkheadFullError",
+]
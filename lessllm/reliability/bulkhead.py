@@ -0,0 +1,59 @@
+"""
+Bulkhead limiting concurrent in-flight calls per upstream
+"""
+
+import asyncio
+from typing import AsyncIterator, TypeVar
+
+T = TypeVar("T")
+
+
+class BulkheadFullError(Exception):
+    """并发请求和等待队列都已满，请求被拒绝"""
+
+
+class Bulkhead:
+    """限制单个上游的并发请求数
+    
+    最多 capacity 个请求同时进行，另有最多 max_waiting 个请求排队等待，
+    超出时立即抛出 BulkheadFullError，而不是无限堆积连接和缓冲区。
+    """
+    
+    def __init__(self, capacity: int = 64, max_waiting: int = 128):
+        self.capacity = capacity
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(capacity)
+    
+    def is_full(self) -> bool:
+        """并发数和等待队列是否都已满"""
+        return self._semaphore.locked() and self.waiting >= self.max_waiting
+    
+    async def acquire(self):
+        """获取一个并发名额，队列已满时抛出 BulkheadFullError"""
+        if self.is_full():
+            raise BulkheadFullError("Bulkhead full")
+        
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+    
+    def release(self):
+        """释放并发名额"""
+        self._semaphore.release()
+    
+    async def __aenter__(self) -> "Bulkhead":
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        self.release()
+        return False
+    
+    async def wrap_stream(self, stream: AsyncIterator[T]) -> AsyncIterator[T]:
+        """在整个流式响应期间占用一个并发名额"""
+        async with self:
+            async for item in stream:
+                yield item
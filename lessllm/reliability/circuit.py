@@ -0,0 +1,120 @@
+"""
+Circuit breaker for upstream provider calls
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Iterator, Optional, TypeVar
+import httpx
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """断路器处于打开状态，请求没有发送到上游"""
+
+
+def exception_chain(exc: BaseException) -> Iterator[BaseException]:
+    """依次产出异常及其 __cause__/__context__
+    
+    提供商会把 httpx 异常包装成普通 Exception 再抛出，分类时需要沿异常链查找。
+    """
+    seen = set()
+    current: Optional[BaseException] = exc
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        yield current
+        current = current.__cause__ or current.__context__
+
+
+def is_upstream_failure(exc: BaseException) -> bool:
+    """判断异常是否说明上游不可用（超时、连接或代理错误、5xx）"""
+    for current in exception_chain(exc):
+        if isinstance(current, httpx.TransportError):
+            return True
+        if isinstance(current, httpx.HTTPStatusError):
+            return current.response.status_code >= 500
+    return False
+
+
+@dataclass
+class CircuitBreaker:
+    """单个上游的断路器：CLOSED → OPEN → HALF_OPEN → CLOSED
+    
+    连续 failure_threshold 次上游失败后打开，recovery_s 秒内直接拒绝请求；
+    之后放行一个试探请求，成功则关闭，失败则重新打开。
+    只在事件循环线程中使用，不需要加锁。
+    """
+    
+    failure_threshold: int = 5
+    recovery_s: float = 30.0
+    state: str = CLOSED
+    failures: int = 0
+    opened_at: float = 0.0
+    _trial_in_flight: bool = field(default=False, repr=False)
+    
+    def is_open(self) -> bool:
+        """是否处于打开状态且未到恢复时间（只读，不改变状态）"""
+        return self.state == OPEN and time.monotonic() - self.opened_at < self.recovery_s
+    
+    def before_call(self):
+        """请求发出前调用，断路器打开时抛出 CircuitOpenError"""
+        if self.state == OPEN:
+            if self.is_open():
+                raise CircuitOpenError("Circuit breaker is open")
+            self.state = HALF_OPEN
+        
+        if self.state == HALF_OPEN:
+            # 半开状态只放行一个试探请求
+            if self._trial_in_flight:
+                raise CircuitOpenError("Circuit breaker is half-open")
+            self._trial_in_flight = True
+    
+    def record_success(self):
+        """记录上游调用成功"""
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+    
+    def record_failure(self):
+        """记录上游调用失败"""
+        self._trial_in_flight = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+    
+    def _record(self, exc: Optional[BaseException]):
+        if exc is None:
+            self.record_success()
+        elif is_upstream_failure(exc):
+            self.record_failure()
+        elif isinstance(exc, Exception):
+            # 4xx 等错误说明上游本身可用
+            self.record_success()
+        else:
+            # 取消或客户端断开：不能说明上游状态，只释放试探名额
+            self._trial_in_flight = False
+    
+    async def __aenter__(self) -> "CircuitBreaker":
+        self.before_call()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        self._record(exc)
+        return False
+    
+    async def wrap_stream(self, stream: AsyncIterator[T]) -> AsyncIterator[T]:
+        """包装上游流式响应，流完整结束记为成功，中途异常按类型记录"""
+        self.before_call()
+        try:
+            async for item in stream:
+                yield item
+        except BaseException as exc:
+            self._record(exc)
+            raise
+        self.record_success()
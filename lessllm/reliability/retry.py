@@ -0,0 +1,51 @@
+"""
+Retry with exponential backoff for upstream provider calls
+"""
+
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, TypeVar
+import httpx
+
+from .circuit import exception_chain
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 限流和网关类错误通常是暂时的，可以重试；其他4xx重试也不会成功
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """判断异常是否值得重试（超时、连接或代理错误、429和网关错误）"""
+    for current in exception_chain(exc):
+        if isinstance(current, httpx.TransportError):
+            return True
+        if isinstance(current, httpx.HTTPStatusError):
+            return current.response.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+async def retry_async(
+    fn: Callable[[], Awaitable[T]],
+    *,
+    attempts: int = 3,
+    base: float = 0.25,
+    retry_on: Callable[[BaseException], bool] = is_retryable
+) -> T:
+    """调用 fn，可重试的异常按指数退避加随机抖动重试
+    
+    第 n 次重试前等待 base * 2^n + uniform(0, base) 秒，attempts 为总尝试次数。
+    """
+    attempts = max(1, attempts)
+    for attempt in range(attempts):
+        try:
+            return await fn()
+        except Exception as exc:
+            if attempt == attempts - 1 or not retry_on(exc):
+                raise
+            delay = base * (2 ** attempt) + random.uniform(0, base)
+            logger.warning("Upstream call failed (%s), retrying in %.2fs (%d/%d)", exc, delay, attempt + 1, attempts - 1)
+            await asyncio.sleep(delay)
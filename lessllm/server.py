@@ -4,23 +4,29 @@ FastAPI server for LessLLM proxy
 
 import time
 import asyncio
-import json
+import functools
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, Coroutine, Optional, Set, Tuple
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+import httpx
 import logging
 
-from .config import get_config
+from .config import get_config, ReliabilityConfig
 from .proxy.manager import ProxyManager
 from .providers.openai import OpenAIProvider
 from .providers.claude import ClaudeProvider
+from .providers.base import SSE_DATA_PREFIX
 from .logging.storage import LogStorage
+from .logging.logger import APILogger
 from .logging.models import APICallLog, RawAPIData, EstimatedAnalysis, PerformanceAnalysis, CacheAnalysis
+from .logging.ids import new_id
 from .monitoring.performance import PerformanceTracker
 from .monitoring.cache_estimator import CacheEstimator
+from .utils import json_codec
+from .reliability import CircuitBreaker, CircuitOpenError, Bulkhead, BulkheadFullError, retry_async
 
 logger = logging.getLogger(__name__)
 
@@ -35,34 +41,29 @@ def convert_claude_to_openai(claude_request: Dict[str, Any]) -> Dict[str, Any]:
         "stream": claude_request.get("stream", False)
     }
     
+    # system消息放在最前面，先于其他消息加入，避免之后在列表头部插入
+    if "system" in claude_request:
+        openai_request["messages"].append({
+            "role": "system",
+            "content": claude_request["system"]
+        })
+    
     # 转换messages格式
-    messages = claude_request.get("messages", [])
-    for msg in messages:
-        if isinstance(msg.get("content"), str):
+    append_message = openai_request["messages"].append
+    for msg in claude_request.get("messages", []):
+        content = msg.get("content")
+        if isinstance(content, str):
             # 简单文本消息
-            openai_request["messages"].append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
-        elif isinstance(msg.get("content"), list):
+            append_message({"role": msg["role"], "content": content})
+        elif isinstance(content, list):
             # 多模态消息，提取文本部分
-            text_parts = []
-            for content_block in msg["content"]:
-                if content_block.get("type") == "text":
-                    text_parts.append(content_block.get("text", ""))
-            
-            openai_request["messages"].append({
+            append_message({
                 "role": msg["role"],
-                "content": " ".join(text_parts)
+                "content": " ".join(
+                    block.get("text", "") for block in content if block.get("type") == "text"
+                )
             })
     
-    # 处理system消息
-    if "system" in claude_request:
-        openai_request["messages"].insert(0, {
-            "role": "system",
-            "content": claude_request["system"]
-        })
-    
     return openai_request
 
 
@@ -70,18 +71,7 @@ def convert_openai_to_claude_response(openai_response: Dict[str, Any], is_stream
     """将OpenAI响应转换为Claude Messages API格式"""
     if is_streaming:
         # 流式响应转换
-        if "choices" in openai_response and openai_response["choices"]:
-            choice = openai_response["choices"][0]
-            if "delta" in choice and "content" in choice["delta"]:
-                return {
-                    "type": "content_block_delta",
-                    "index": 0,
-                    "delta": {
-                        "type": "text_delta",
-                        "text": choice["delta"]["content"]
-                    }
-                }
-        return {"type": "ping"}
+        return convert_openai_streaming_to_claude(openai_response)
     else:
         # 非流式响应转换
         claude_response = {
@@ -108,12 +98,52 @@ def convert_openai_to_claude_response(openai_response: Dict[str, Any], is_stream
         
         return claude_response
 
+
+class CodecJSONResponse(JSONResponse):
+    """使用 json_codec 序列化的JSON响应（安装了 orjson 时由C实现编码）"""
+    
+    def render(self, content: Any) -> bytes:
+        return json_codec.dumps_bytes(content)
+
+
 # 全局变量
-app = FastAPI(title="LessLLM", description="Lightweight LLM API Proxy", version="0.2.0")
+app = FastAPI(
+    title="LessLLM",
+    description="Lightweight LLM API Proxy",
+    version="0.2.0",
+    default_response_class=CodecJSONResponse
+)
 storage: Optional[LogStorage] = None
+api_logger: Optional[APILogger] = None
 proxy_manager: Optional[ProxyManager] = None
 providers: Dict[str, Any] = {}
+http_client: Optional[httpx.AsyncClient] = None
+warm_up_task: Optional[asyncio.Task] = None
 cache_estimator: Optional[CacheEstimator] = None
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+bulkheads: Dict[str, Bulkhead] = {}
+# 模型名前缀 → (提供商名称, 提供商)，启动时根据已配置的提供商预先计算
+model_routes: Dict[str, Tuple[str, Any]] = {}
+default_route: Optional[Tuple[str, Any]] = None
+single_route: Optional[Tuple[str, Any]] = None
+# 同时进行的日志构建任务上限；超过后丢弃新日志，过载时不无限堆积任务
+MAX_LOG_TASKS = 1024
+log_tasks: Set[asyncio.Task] = set()
+# 模型名 → 路由的缓存容量；模型名来自客户端，需要有上限
+MODEL_ROUTE_CACHE_SIZE = 256
+reliability_config = ReliabilityConfig()
+# SSE事件结束标记；流式响应直接产出字节，避免每个分块再格式化字符串
+SSE_EVENT_END = b"\n\n"
+# 没有内容的OpenAI流式分块转换成的Claude事件（只读，不要修改）
+_PING_EVENT = {"type": "ping"}
+# 预先编码的固定SSE事件
+SSE_DONE = SSE_DATA_PREFIX + b"[DONE]" + SSE_EVENT_END
+SSE_PING = SSE_DATA_PREFIX + json_codec.dumps_bytes(_PING_EVENT) + SSE_EVENT_END
+# OpenAI格式文本增量事件模板，%s 处填入JSON编码后的文本
+_OPENAI_DELTA_EVENT = SSE_DATA_PREFIX + b'{"choices":[{"index":0,"delta":{"content":%s}}]}' + SSE_EVENT_END
+# 健康检查响应缓存：(生成时间, 响应)，负载均衡器频繁探测时避免重复构造
+HEALTH_CACHE_TTL_SECONDS = 1.0
+_health_cache: Tuple[float, Dict[str, Any]] = (0.0, {})
 
 # CORS设置
 app.add_middleware(
@@ -127,7 +157,7 @@ app.add_middleware(
 
 def init_app():
     """初始化应用"""
-    global storage, proxy_manager, providers, cache_estimator
+    global storage, api_logger, proxy_manager, providers, http_client, cache_estimator, reliability_config, _health_cache
     
     # 尝试从环境变量或默认配置加载
     try:
@@ -140,11 +170,20 @@ def init_app():
     
     # 初始化存储
     if config.logging.enabled:
-        storage = LogStorage(config.logging.storage["db_path"])
+        storage = LogStorage(
+            config.logging.storage["db_path"],
+            keep_connection=config.logging.storage.get("keep_connection", False)
+        )
+        # 日志写入由后台任务批量完成；队列满时直接丢弃，不拖慢请求
+        api_logger = APILogger(storage, drop_on_overload=True)
     
     # 初始化代理管理器
     proxy_manager = ProxyManager(config.proxy)
     
+    # 所有提供商共享同一个连接池，避免每个提供商各自建立TCP/TLS连接；
+    # 连接池大小由 proxy 配置中的 max_connections 等字段决定
+    http_client = proxy_manager.get_shared_client()
+    
     # 初始化提供商
     for provider_name, provider_config in config.providers.items():
         api_key = provider_config.get("api_key")
@@ -155,12 +194,21 @@ def init_app():
             continue
             
         if provider_name.lower() in ["openai", "openai-compatible"]:
-            providers[provider_name] = OpenAIProvider(api_key, proxy_manager, base_url)
+            providers[provider_name] = OpenAIProvider(api_key, proxy_manager, base_url, http_client)
         elif provider_name.lower() in ["claude", "anthropic"]:
-            providers[provider_name] = ClaudeProvider(api_key, proxy_manager, base_url)
+            providers[provider_name] = ClaudeProvider(api_key, proxy_manager, base_url, http_client)
         else:
             logger.warning(f"Unknown provider: {provider_name}")
     
+    # 每个提供商一个断路器和并发隔离舱（首次使用时按配置创建），
+    # 某个上游故障或拥塞时快速失败，不拖垮其他提供商
+    reliability_config = config.reliability
+    circuit_breakers.clear()
+    bulkheads.clear()
+    _health_cache = (0.0, {})
+    
+    build_model_routes()
+    
     # 初始化缓存估算器
     if config.analysis.enable_cache_estimation:
         cache_estimator = CacheEstimator()
@@ -168,18 +216,74 @@ def init_app():
     logger.info(f"LessLLM initialized with {len(providers)} providers")
 
 
+async def warm_up_connections():
+    """预先与各上游建立连接，使首个真实请求复用已完成TLS握手的连接"""
+    urls = list({provider.get_endpoint_url("") for provider in providers.values()})
+    results = await asyncio.gather(
+        *(http_client.head(url, timeout=5.0) for url in urls),
+        return_exceptions=True
+    )
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            logger.debug("Connection warm-up to %s failed: %s", url, result)
+
+
+def spawn_log_task(coro: Coroutine[Any, Any, None]) -> Optional[asyncio.Task]:
+    """在后台运行日志构建任务
+    
+    持有任务引用直到完成（事件循环只保留弱引用）；进行中的任务达到 MAX_LOG_TASKS 时
+    丢弃这条日志，与日志队列满时的处理方式一致。
+    """
+    if len(log_tasks) >= MAX_LOG_TASKS:
+        coro.close()
+        logger.warning("Too many pending log tasks (%d), dropping log", len(log_tasks))
+        return None
+    
+    task = asyncio.create_task(coro)
+    log_tasks.add(task)
+    task.add_done_callback(log_tasks.discard)
+    return task
+
+
 @app.on_event("startup")
 async def startup_event():
     """应用启动事件"""
+    global warm_up_task
     init_app()
+    
+    if api_logger is not None:
+        await api_logger.start()
+    
+    # 后台预热连接池，不阻塞启动
+    if providers:
+        warm_up_task = asyncio.create_task(warm_up_connections())
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭事件"""
+    global http_client, warm_up_task
+    
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+        warm_up_task = None
+    
     # 关闭所有provider连接
     for provider in providers.values():
         await provider.close()
+    
+    # 关闭共享连接池
+    if proxy_manager is not None:
+        await proxy_manager.aclose()
+    http_client = None
+    
+    # 等待进行中的日志构建任务入队，写完已入队的日志，再关闭日志数据库长连接
+    if log_tasks:
+        await asyncio.gather(*log_tasks, return_exceptions=True)
+    if api_logger is not None:
+        await api_logger.stop()
+    if storage is not None:
+        storage.close()
 
 
 @app.get("/")
@@ -194,9 +298,16 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """健康检查"""
+    """健康检查（响应缓存 HEALTH_CACHE_TTL_SECONDS 秒）"""
+    global _health_cache
+    
+    cached_at, cached = _health_cache
+    now = time.monotonic()
+    if cached and now - cached_at < HEALTH_CACHE_TTL_SECONDS:
+        return cached
+    
     config = get_config()
-    return {
+    response = {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
         "providers": list(providers.keys()),
@@ -204,24 +315,96 @@ async def health_check():
         "logging_enabled": config.logging.enabled,
         "cache_analysis_enabled": config.analysis.enable_cache_estimation
     }
+    _health_cache = (now, response)
+    return response
+
+
+def get_circuit_breaker(provider_name: str) -> CircuitBreaker:
+    """获取提供商对应的断路器"""
+    breaker = circuit_breakers.get(provider_name)
+    if breaker is None:
+        breaker = circuit_breakers[provider_name] = CircuitBreaker(
+            failure_threshold=reliability_config.circuit_failure_threshold,
+            recovery_s=reliability_config.circuit_recovery_seconds
+        )
+    return breaker
+
+
+def get_bulkhead(provider_name: str) -> Bulkhead:
+    """获取提供商对应的并发隔离舱"""
+    bulkhead = bulkheads.get(provider_name)
+    if bulkhead is None:
+        bulkhead = bulkheads[provider_name] = Bulkhead(
+            capacity=reliability_config.bulkhead_capacity,
+            max_waiting=reliability_config.bulkhead_max_waiting
+        )
+    return bulkhead
+
+
+def ensure_provider_available(provider_name: str):
+    """断路器打开或并发已满时直接返回503，不再向上游发送请求"""
+    if get_circuit_breaker(provider_name).is_open():
+        raise HTTPException(status_code=503, detail=f"Provider {provider_name} is temporarily unavailable")
+    if get_bulkhead(provider_name).is_full():
+        raise HTTPException(status_code=503, detail=f"Provider {provider_name} bulkhead full")
+
+
+async def call_upstream(provider_name: str, send: Callable[[], Awaitable[Any]]) -> Any:
+    """发送非流式上游请求：占用一个并发名额，每次尝试经过断路器，暂时性错误按指数退避重试"""
+    breaker = get_circuit_breaker(provider_name)
+    
+    async def attempt():
+        async with breaker:
+            return await send()
+    
+    async with get_bulkhead(provider_name):
+        return await retry_async(
+            attempt,
+            attempts=reliability_config.retry_attempts,
+            base=reliability_config.retry_base_delay
+        )
+
+
+def guard_stream(provider_name: str, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """包装上游流式响应：整个流期间占用并发名额，结果计入断路器"""
+    return get_bulkhead(provider_name).wrap_stream(get_circuit_breaker(provider_name).wrap_stream(stream))
+
+
+def build_model_routes():
+    """根据已配置的提供商预先计算模型路由表"""
+    global default_route, single_route
+    
+    model_routes.clear()
+    for name, provider in providers.items():
+        # 同类提供商有多个时沿用第一个
+        if isinstance(provider, OpenAIProvider):
+            model_routes.setdefault("gpt", (name, provider))
+        elif isinstance(provider, ClaudeProvider):
+            model_routes.setdefault("claude", (name, provider))
+    
+    # 如果没有找到特定的提供商，使用第一个可用的
+    default_route = next(iter(providers.items()), None)
+    # 只配置了一个提供商时所有模型都路由到它
+    single_route = default_route if len(providers) == 1 else None
+    resolve_model_route.cache_clear()
 
 
 def get_provider_for_model(model: str) -> tuple[str, Any]:
     """根据模型选择提供商"""
-    # 简单的模型映射逻辑
-    if model.startswith("gpt"):
-        for name, provider in providers.items():
-            if isinstance(provider, OpenAIProvider):
-                return name, provider
-    elif model.startswith("claude"):
-        for name, provider in providers.items():
-            if isinstance(provider, ClaudeProvider):
-                return name, provider
+    if single_route is not None:
+        return single_route
+    return resolve_model_route(model)
+
+
+@functools.lru_cache(maxsize=MODEL_ROUTE_CACHE_SIZE)
+def resolve_model_route(model: str) -> Tuple[str, Any]:
+    """按前缀表解析模型对应的提供商；结果按模型名缓存，路由表重建时清空"""
+    for prefix, route in model_routes.items():
+        if model.startswith(prefix):
+            return route
     
-    # 如果没有找到特定的提供商，使用第一个可用的
-    if providers:
-        first_provider = next(iter(providers.items()))
-        return first_provider
+    if default_route is not None:
+        return default_route
     
     raise HTTPException(status_code=400, detail=f"No provider available for model: {model}")
 
@@ -229,44 +412,42 @@ def get_provider_for_model(model: str) -> tuple[str, Any]:
 async def handle_claude_messages_api(request: Request):
     """处理Claude Messages API请求 - 智能路由"""
     # 从request body获取数据
-    request_data = await request.json()
-    request_start_time = time.time()
-    request_id = f"req_{int(time.time() * 1000)}"
+    request_data = json_codec.loads(await request.body())
+    request_id = f"req_{new_id()}"
     
     # 捕获完整的 HTTP 请求信息
-    client_ip = request.client.host if request.client else None
-    user_agent = request.headers.get("user-agent", "")
-    request_headers = dict(request.headers)
-    request_url = str(request.url)
-    query_params = dict(request.query_params)
+    http_context = capture_http_context(request)
     
     # 记录Claude CLI的beta参数
-    if query_params:
-        logger.info(f"Claude Messages API called with query params: {query_params}")
+    if request.query_params:
+        logger.info(f"Claude Messages API called with query params: {dict(request.query_params)}")
     
     try:
         # 获取模型对应的提供商
         model = request_data.get("model", "claude-3-5-sonnet-20241022")
         provider_name, provider = get_provider_for_model(model)
+        ensure_provider_available(provider_name)
         
         # 检查提供商类型，决定处理方式
         if isinstance(provider, ClaudeProvider):
             # Claude提供商：直接透传Claude Messages API
             logger.info(f"Direct passthrough: Claude Messages API → Claude Provider ({provider_name})")
             return await handle_claude_direct_passthrough(
-                request_data, provider, provider_name, request_id, request_headers, 
-                client_ip, user_agent, request_url, query_params
+                request_data, provider, provider_name, request_id, http_context
             )
         else:
             # 非Claude提供商：需要转换
             logger.info(f"Format conversion: Claude Messages API → OpenAI Provider ({provider_name})")
             return await handle_claude_to_openai_conversion(
-                request_data, provider, provider_name, request_id, request_headers,
-                client_ip, user_agent, request_url, query_params
+                request_data, provider, provider_name, request_id, http_context
             )
     
     except HTTPException:
         raise
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail=f"Provider {provider_name} is temporarily unavailable")
+    except BulkheadFullError:
+        raise HTTPException(status_code=503, detail=f"Provider {provider_name} bulkhead full")
     except Exception as e:
         logger.error(f"Claude Messages request {request_id} failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -275,16 +456,11 @@ async def handle_claude_messages_api(request: Request):
 async def handle_openai_chat_completions_api(request: Request):
     """处理OpenAI Chat Completions API请求 - 智能路由"""
     # 从request body获取数据
-    request_data = await request.json()
-    request_start_time = time.time()
-    request_id = f"req_{int(time.time() * 1000)}"
+    request_data = json_codec.loads(await request.body())
+    request_id = f"req_{new_id()}"
     
     # 捕获完整的 HTTP 请求信息
-    client_ip = request.client.host if request.client else None
-    user_agent = request.headers.get("user-agent", "")
-    request_headers = dict(request.headers)
-    request_url = str(request.url)
-    query_params = dict(request.query_params)
+    http_context = capture_http_context(request)
     
     try:
         # 获取模型对应的提供商
@@ -293,32 +469,34 @@ async def handle_openai_chat_completions_api(request: Request):
             raise HTTPException(status_code=400, detail="Model is required")
         
         provider_name, provider = get_provider_for_model(model)
+        ensure_provider_available(provider_name)
         
         # 检查提供商类型，决定处理方式
         if isinstance(provider, OpenAIProvider):
             # OpenAI提供商：直接透传
             logger.info(f"Direct passthrough: OpenAI Chat Completions API → OpenAI Provider ({provider_name})")
             return await handle_openai_direct_passthrough(
-                request_data, provider, provider_name, request_id, request_headers,
-                client_ip, user_agent, request_url, query_params
+                request_data, provider, provider_name, request_id, http_context
             )
         elif isinstance(provider, ClaudeProvider):
             # Claude提供商：需要转换
             logger.info(f"Format conversion: OpenAI Chat Completions API → Claude Provider ({provider_name})")
             return await handle_openai_to_claude_conversion(
-                request_data, provider, provider_name, request_id, request_headers,
-                client_ip, user_agent, request_url, query_params
+                request_data, provider, provider_name, request_id, http_context
             )
         else:
             # 其他提供商：默认使用OpenAI格式
             logger.info(f"Default OpenAI format: OpenAI Chat Completions API → Provider ({provider_name})")
             return await handle_openai_direct_passthrough(
-                request_data, provider, provider_name, request_id, request_headers,
-                client_ip, user_agent, request_url, query_params
+                request_data, provider, provider_name, request_id, http_context
             )
     
     except HTTPException:
         raise
+    except CircuitOpenError:
+        raise HTTPException(status_code=503, detail=f"Provider {provider_name} is temporarily unavailable")
+    except BulkheadFullError:
+        raise HTTPException(status_code=503, detail=f"Provider {provider_name} bulkhead full")
     except Exception as e:
         logger.error(f"OpenAI Chat Completions request {request_id} failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -330,23 +508,11 @@ async def handle_openai_chat_completions_api(request: Request):
 
 async def handle_claude_direct_passthrough(
     request_data: Dict[str, Any], provider: Any, provider_name: str, request_id: str,
-    request_headers: Dict[str, str], client_ip: str, user_agent: str, 
-    request_url: str, query_params: Dict[str, Any]
+    http_context: Dict[str, Any]
 ):
     """Claude Messages API直接透传到Claude提供商"""
     # 初始化性能跟踪器
-    performance_tracker = PerformanceTracker()
-    performance_tracker.start_request()
-    
-    # 构建 HTTP 上下文信息
-    http_context = {
-        "client_ip": client_ip,
-        "user_agent": user_agent,
-        "request_headers": request_headers,
-        "request_url": request_url,
-        "query_params": query_params,
-        "request_method": "POST"
-    }
+    performance_tracker = start_performance_tracker()
     
     # 检查是否为流式请求
     is_streaming = request_data.get("stream", False)
@@ -366,26 +532,14 @@ async def handle_claude_direct_passthrough(
 
 async def handle_claude_to_openai_conversion(
     request_data: Dict[str, Any], provider: Any, provider_name: str, request_id: str,
-    request_headers: Dict[str, str], client_ip: str, user_agent: str,
-    request_url: str, query_params: Dict[str, Any]
+    http_context: Dict[str, Any]
 ):
     """将Claude Messages API转换为OpenAI格式并发送到OpenAI提供商"""
     # 转换Claude Messages API格式到OpenAI Chat Completions格式
     openai_request = convert_claude_to_openai(request_data)
     
     # 初始化性能跟踪器
-    performance_tracker = PerformanceTracker()
-    performance_tracker.start_request()
-    
-    # 构建 HTTP 上下文信息
-    http_context = {
-        "client_ip": client_ip,
-        "user_agent": user_agent,
-        "request_headers": request_headers,
-        "request_url": request_url,
-        "query_params": query_params,
-        "request_method": "POST"
-    }
+    performance_tracker = start_performance_tracker()
     
     # 检查是否为流式请求
     is_streaming = openai_request.get("stream", False)
@@ -409,23 +563,11 @@ async def handle_claude_to_openai_conversion(
 
 async def handle_openai_direct_passthrough(
     request_data: Dict[str, Any], provider: Any, provider_name: str, request_id: str,
-    request_headers: Dict[str, str], client_ip: str, user_agent: str,
-    request_url: str, query_params: Dict[str, Any]
+    http_context: Dict[str, Any]
 ):
     """OpenAI Chat Completions API直接透传到OpenAI提供商"""
     # 初始化性能跟踪器
-    performance_tracker = PerformanceTracker()
-    performance_tracker.start_request()
-    
-    # 构建 HTTP 上下文信息
-    http_context = {
-        "client_ip": client_ip,
-        "user_agent": user_agent,
-        "request_headers": request_headers,
-        "request_url": request_url,
-        "query_params": query_params,
-        "request_method": "POST"
-    }
+    performance_tracker = start_performance_tracker()
     
     # 检查是否为流式请求
     is_streaming = request_data.get("stream", False)
@@ -435,7 +577,7 @@ async def handle_openai_direct_passthrough(
             handle_streaming_request(
                 request_data, provider, provider_name, request_id, performance_tracker, http_context
             ),
-            media_type="text/plain"
+            media_type="text/event-stream"
         )
     else:
         return await handle_regular_request(
@@ -445,26 +587,14 @@ async def handle_openai_direct_passthrough(
 
 async def handle_openai_to_claude_conversion(
     request_data: Dict[str, Any], provider: Any, provider_name: str, request_id: str,
-    request_headers: Dict[str, str], client_ip: str, user_agent: str,
-    request_url: str, query_params: Dict[str, Any]
+    http_context: Dict[str, Any]
 ):
     """将OpenAI Chat Completions API转换为Claude格式并发送到Claude提供商"""
     # 使用provider的内置转换方法
     claude_request = provider._convert_to_claude_format(request_data)
     
     # 初始化性能跟踪器
-    performance_tracker = PerformanceTracker()
-    performance_tracker.start_request()
-    
-    # 构建 HTTP 上下文信息
-    http_context = {
-        "client_ip": client_ip,
-        "user_agent": user_agent,
-        "request_headers": request_headers,
-        "request_url": request_url,
-        "query_params": query_params,
-        "request_method": "POST"
-    }
+    performance_tracker = start_performance_tracker()
     
     # 检查是否为流式请求
     is_streaming = claude_request.get("stream", False)
@@ -475,11 +605,11 @@ async def handle_openai_to_claude_conversion(
             handle_claude_to_openai_streaming_conversion(
                 claude_request, provider, provider_name, request_id, performance_tracker, http_context
             ),
-            media_type="text/plain"
+            media_type="text/event-stream"
         )
     else:
         # 非流式响应
-        response = await provider.send_request(claude_request)
+        response = await call_upstream(provider_name, lambda: provider.send_request(claude_request))
         # 转换响应格式回OpenAI Chat Completions格式
         return provider.normalize_response(response)
 
@@ -489,35 +619,45 @@ async def handle_openai_to_claude_streaming_conversion(
     performance_tracker: PerformanceTracker, http_context: Dict[str, Any]
 ):
     """处理OpenAI到Claude的流式转换"""
-    response_chunks = []
-    full_response = {"choices": [{"message": {"content": ""}}]}
+    chunk_count = 0
+    # 文本片段先放进列表，结束后一次性拼接
+    content_parts = []
+    # 实际发送给客户端的字节数
+    response_size = 0
     
     try:
-        async for chunk in provider.send_streaming_request(claude_request):
+        stream = provider.send_streaming_request(claude_request)
+        async for chunk in guard_stream(provider_name, stream):
             # 记录token时间戳
             performance_tracker.record_token()
             
-            # 将Claude流式响应转换为OpenAI格式
-            openai_chunk = convert_claude_streaming_to_openai(chunk)
-            if openai_chunk:
-                response_chunks.append(openai_chunk)
-                if openai_chunk.get("choices") and openai_chunk["choices"][0].get("delta", {}).get("content"):
-                    full_response["choices"][0]["message"]["content"] += openai_chunk["choices"][0]["delta"]["content"]
+            # 只有文本增量需要转发；直接套用预先编码的OpenAI事件模板，不构造中间字典
+            text = claude_text_delta(chunk)
+            if text is not None:
+                chunk_count += 1
+                content_parts.append(text)
                 
                 # 返回OpenAI格式的流式数据
-                yield f"data: {json.dumps(openai_chunk)}\n\n"
+                event = openai_delta_event(text)
+                response_size += len(event)
+                yield event
         
-        yield "data: [DONE]\n\n"
+        event = SSE_DONE
+        response_size += len(event)
+        yield event
         
     except Exception as e:
         logger.error(f"OpenAI to Claude streaming conversion failed: {e}")
-        yield f'data: {{"error": "{str(e)}"}}\n\n'
+        event = SSE_DATA_PREFIX + json_codec.dumps_bytes({"error": str(e)}) + SSE_EVENT_END
+        response_size += len(event)
+        yield event
     
     # 异步记录日志
-    if storage:
-        asyncio.create_task(record_streaming_log(
+    if api_logger:
+        full_response = {"choices": [{"message": {"content": "".join(content_parts)}}]}
+        spawn_log_task(record_streaming_log(
             claude_request, full_response, provider, provider_name,
-            request_id, performance_tracker, len(response_chunks), http_context
+            request_id, performance_tracker, chunk_count, http_context, response_size
         ))
 
 
@@ -526,29 +666,40 @@ async def handle_claude_to_openai_streaming_conversion(
     performance_tracker: PerformanceTracker, http_context: Dict[str, Any]
 ):
     """处理Claude到OpenAI的流式转换"""
-    response_chunks = []
-    full_response_content = ""
+    chunk_count = 0
+    # 文本片段先放进列表，结束后一次性拼接
+    content_parts = []
+    # 实际发送给客户端的字节数
+    response_size = 0
     
     try:
-        async for chunk in provider.send_streaming_request(openai_request):
+        stream = provider.send_streaming_request(openai_request)
+        async for chunk in guard_stream(provider_name, stream):
             # 记录token时间戳
             performance_tracker.record_token()
             
             # 将OpenAI流式响应转换为Claude格式
             claude_chunk = convert_openai_streaming_to_claude(chunk)
             if claude_chunk:
-                response_chunks.append(claude_chunk)
+                chunk_count += 1
+                
+                if claude_chunk is _PING_EVENT:
+                    event = SSE_PING
+                    response_size += len(event)
+                    yield event
+                    continue
                 
                 # 提取文本内容用于日志记录
-                if claude_chunk.get("type") == "content_block_delta":
-                    delta = claude_chunk.get("delta", {})
-                    if delta.get("type") == "text_delta":
-                        full_response_content += delta.get("text", "")
+                content_parts.append(claude_chunk["delta"]["text"])
                 
                 # 返回Claude格式的流式数据
-                yield f"data: {json.dumps(claude_chunk)}\n\n"
+                event = SSE_DATA_PREFIX + json_codec.dumps_bytes(claude_chunk) + SSE_EVENT_END
+                response_size += len(event)
+                yield event
         
-        yield "data: [DONE]\n\n"
+        event = SSE_DONE
+        response_size += len(event)
+        yield event
         
     except Exception as e:
         logger.error(f"Claude to OpenAI streaming conversion failed: {e}")
@@ -559,46 +710,98 @@ async def handle_claude_to_openai_streaming_conversion(
                 "message": str(e)
             }
         }
-        yield f'data: {json.dumps(error_chunk)}\n\n'
+        event = SSE_DATA_PREFIX + json_codec.dumps_bytes(error_chunk) + SSE_EVENT_END
+        response_size += len(event)
+        yield event
     
     # 异步记录日志
-    if storage:
-        asyncio.create_task(record_claude_streaming_log(
-            openai_request, full_response_content, provider, provider_name,
-            request_id, performance_tracker, len(response_chunks), http_context
+    if api_logger:
+        spawn_log_task(record_claude_streaming_log(
+            openai_request, "".join(content_parts), provider, provider_name,
+            request_id, performance_tracker, chunk_count, http_context, response_size
         ))
 
 
+def claude_text_delta(claude_chunk: Dict[str, Any]) -> Optional[str]:
+    """提取Claude流式事件中的文本增量，不是文本增量事件时返回None"""
+    try:
+        if claude_chunk["type"] == "content_block_delta":
+            delta = claude_chunk["delta"]
+            if delta["type"] == "text_delta":
+                return delta.get("text", "")
+    except (KeyError, TypeError):
+        pass
+    return None
+
+
 def convert_claude_streaming_to_openai(claude_chunk: Dict[str, Any]) -> Dict[str, Any]:
     """将Claude流式响应转换为OpenAI格式"""
-    if claude_chunk.get("type") == "content_block_delta":
-        delta = claude_chunk.get("delta", {})
-        if delta.get("type") == "text_delta":
-            return {
-                "choices": [{
-                    "index": 0,
-                    "delta": {
-                        "content": delta.get("text", "")
-                    }
-                }]
+    text = claude_text_delta(claude_chunk)
+    if text is None:
+        return None
+    return {
+        "choices": [{
+            "index": 0,
+            "delta": {
+                "content": text
             }
-    return None
+        }]
+    }
+
+
+def openai_delta_event(text: str) -> bytes:
+    """把文本增量直接编码为OpenAI格式的SSE事件，等价于编码 convert_claude_streaming_to_openai 的结果"""
+    return _OPENAI_DELTA_EVENT % json_codec.dumps_bytes(text)
+
+
+def openai_text_delta(openai_chunk: Dict[str, Any]) -> Optional[str]:
+    """提取OpenAI流式分块中的文本增量，没有内容时返回None"""
+    try:
+        return openai_chunk["choices"][0]["delta"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return None
 
 
 def convert_openai_streaming_to_claude(openai_chunk: Dict[str, Any]) -> Dict[str, Any]:
-    """将OpenAI流式响应转换为Claude格式"""
-    if "choices" in openai_chunk and openai_chunk["choices"]:
-        choice = openai_chunk["choices"][0]
-        if "delta" in choice and "content" in choice["delta"]:
-            return {
-                "type": "content_block_delta",
-                "index": 0,
-                "delta": {
-                    "type": "text_delta",
-                    "text": choice["delta"]["content"]
-                }
-            }
-    return {"type": "ping"}
+    """将OpenAI流式响应转换为Claude格式
+    
+    每个token都会调用一次：常见的内容分块直接下标取值，缺少字段时才走异常分支；
+    没有内容（包括 content 为 null）的分块返回共享的只读ping事件。
+    """
+    try:
+        content = openai_chunk["choices"][0]["delta"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return _PING_EVENT
+    if content is None:
+        return _PING_EVENT
+    return {
+        "type": "content_block_delta",
+        "index": 0,
+        "delta": {"type": "text_delta", "text": content}
+    }
+
+
+def capture_http_context(request: Request) -> Dict[str, Any]:
+    """捕获记录日志需要的HTTP请求信息
+    
+    请求头和查询参数保留Starlette的只读映射，写日志时才复制成字典。
+    """
+    headers = request.headers
+    return {
+        "client_ip": request.client.host if request.client else None,
+        "user_agent": headers.get("user-agent", ""),
+        "request_headers": headers,
+        "request_url": str(request.url),
+        "query_params": request.query_params,
+        "request_method": request.method
+    }
+
+
+def start_performance_tracker() -> PerformanceTracker:
+    """创建并启动请求的性能跟踪器"""
+    performance_tracker = PerformanceTracker()
+    performance_tracker.start_request()
+    return performance_tracker
 
 
 @app.post("/v1/messages")
@@ -613,62 +816,6 @@ async def chat_completions(request: Request):
     return await handle_openai_chat_completions_api(request)
 
 
-async def chat_completions_internal(request_data: Dict[str, Any], request: Request):
-    """内部聊天完成处理函数"""
-    request_start_time = time.time()
-    request_id = f"req_{int(time.time() * 1000)}"
-    
-    # 捕获完整的 HTTP 请求信息
-    client_ip = request.client.host if request.client else None
-    user_agent = request.headers.get("user-agent", "")
-    request_headers = dict(request.headers)
-    request_url = str(request.url)
-    query_params = dict(request.query_params)
-    
-    try:
-        # 获取模型对应的提供商
-        model = request_data.get("model")
-        if not model:
-            raise HTTPException(status_code=400, detail="Model is required")
-        
-        provider_name, provider = get_provider_for_model(model)
-        
-        # 初始化性能跟踪器
-        performance_tracker = PerformanceTracker()
-        performance_tracker.start_request()
-        
-        # 检查是否为流式请求
-        is_streaming = request_data.get("stream", False)
-        
-        # 构建 HTTP 上下文信息
-        http_context = {
-            "client_ip": client_ip,
-            "user_agent": user_agent,
-            "request_headers": request_headers,
-            "request_url": request_url,
-            "query_params": query_params,
-            "request_method": "POST"
-        }
-        
-        if is_streaming:
-            return StreamingResponse(
-                handle_streaming_request(
-                    request_data, provider, provider_name, request_id, performance_tracker, http_context
-                ),
-                media_type="text/plain"
-            )
-        else:
-            return await handle_regular_request(
-                request_data, provider, provider_name, request_id, performance_tracker, http_context
-            )
-    
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Request {request_id} failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-
 async def handle_regular_request(
     request_data: Dict[str, Any], 
     provider: Any, 
@@ -681,11 +828,50 @@ async def handle_regular_request(
     
     try:
         # 发送请求
-        response = await provider.send_request(request_data)
+        response = await call_upstream(provider_name, lambda: provider.send_request(request_data))
         
         # 记录性能指标
         performance_metrics = performance_tracker.calculate_non_streaming_metrics()
         
+        # 日志构建（解析、估算成本、计算响应大小）放到后台任务，不占用请求延迟
+        if api_logger:
+            spawn_log_task(record_regular_log(
+                request_data, response, provider, provider_name,
+                request_id, performance_metrics, http_context
+            ))
+        
+        return response
+        
+    except Exception as e:
+        # 记录失败日志
+        if api_logger:
+            # 错误日志共用只读的零值分析数据
+            error_log = api_logger.create_error_log(
+                request_id=request_id,
+                provider=provider_name,
+                model=request_data.get("model", "unknown"),
+                endpoint="chat/completions",
+                raw_request=request_data,
+                error_message=str(e),
+                proxy_used=proxy_manager.active_proxy if proxy_manager else None
+            )
+            await api_logger.log_request(error_log)
+        
+        raise
+
+
+async def record_regular_log(
+    request_data: Dict[str, Any],
+    response: Dict[str, Any],
+    provider: Any,
+    provider_name: str,
+    request_id: str,
+    performance_metrics: PerformanceAnalysis,
+    http_context: Dict[str, Any]
+):
+    """记录常规（非流式）请求日志"""
+    
+    try:
         # 估算缓存
         cache_analysis = CacheAnalysis()
         if cache_estimator:
@@ -696,18 +882,18 @@ async def handle_regular_request(
         raw_data = provider.parse_raw_response(request_data, response)
         
         # 增强原始数据，添加 HTTP 信息
-        raw_data.request_headers = http_context["request_headers"]
+        raw_data.request_headers = dict(http_context["request_headers"])
         raw_data.client_ip = http_context["client_ip"]
         raw_data.user_agent = http_context["user_agent"]
         raw_data.request_url = http_context["request_url"]
-        raw_data.request_query_params = http_context["query_params"]
+        raw_data.request_query_params = dict(http_context["query_params"])
         raw_data.request_method = http_context["request_method"]
         
         # 模拟响应信息（实际应该从 provider 返回）
         raw_data.response_status_code = 200
         raw_data.response_headers = {"content-type": "application/json"}
         if isinstance(response, dict):
-            raw_data.response_size_bytes = len(json.dumps(response).encode('utf-8'))
+            raw_data.response_size_bytes = len(json_codec.dumps_bytes(response))
         
         # 估算成本
         estimated_cost = 0.0
@@ -722,42 +908,22 @@ async def handle_regular_request(
         )
         
         # 记录日志
-        if storage:
-            log = APICallLog(
-                request_id=request_id,
-                provider=provider_name,
-                model=request_data["model"],
-                endpoint="chat/completions",
-                raw_data=raw_data,
-                estimated_analysis=estimated_analysis,
-                success=True,
-                proxy_used=proxy_manager.get_proxy_info()["active_proxy"] if proxy_manager else None
-            )
-            
-            # 异步存储日志
-            asyncio.create_task(store_log_async(log))
+        log = APICallLog(
+            request_id=request_id,
+            provider=provider_name,
+            model=request_data["model"],
+            endpoint="chat/completions",
+            raw_data=raw_data,
+            estimated_analysis=estimated_analysis,
+            success=True,
+            proxy_used=proxy_manager.active_proxy if proxy_manager else None
+        )
         
-        return response
+        # 交给后台日志任务存储
+        await api_logger.log_request(log)
         
     except Exception as e:
-        # 记录失败日志
-        if storage:
-            error_log = APICallLog(
-                request_id=request_id,
-                provider=provider_name,
-                model=request_data.get("model", "unknown"),
-                endpoint="chat/completions",
-                raw_data=RawAPIData(raw_request=request_data, raw_response={}),
-                estimated_analysis=EstimatedAnalysis(
-                    estimated_performance=PerformanceAnalysis(total_latency_ms=0),
-                    estimated_cache=CacheAnalysis()
-                ),
-                success=False,
-                error_message=str(e)
-            )
-            asyncio.create_task(store_log_async(error_log))
-        
-        raise
+        logger.error(f"Failed to record regular log: {e}")
 
 
 async def handle_streaming_request(
@@ -770,33 +936,45 @@ async def handle_streaming_request(
 ):
     """处理流式请求"""
     
-    response_chunks = []
-    full_response = {"choices": [{"message": {"content": ""}}]}
+    chunk_count = 0
+    # 文本片段先放进列表，结束后一次性拼接
+    content_parts = []
+    # 实际发送给客户端的字节数
+    response_size = 0
     
     try:
-        async for chunk in provider.send_streaming_request(request_data):
+        stream = provider.send_streaming_request(request_data)
+        async for chunk in guard_stream(provider_name, stream):
             # 记录token时间戳
             performance_tracker.record_token()
             
-            # 收集响应数据
-            response_chunks.append(chunk)
-            if chunk.get("choices") and chunk["choices"][0].get("delta", {}).get("content"):
-                full_response["choices"][0]["message"]["content"] += chunk["choices"][0]["delta"]["content"]
+            # 统计分块数并累积文本内容，不保留分块本身
+            chunk_count += 1
+            text = openai_text_delta(chunk)
+            if text:
+                content_parts.append(text)
             
             # 返回给客户端
-            yield f"data: {chunk}\n\n"
+            event = SSE_DATA_PREFIX + json_codec.dumps_bytes(chunk) + SSE_EVENT_END
+            response_size += len(event)
+            yield event
         
-        yield "data: [DONE]\n\n"
+        event = SSE_DONE
+        response_size += len(event)
+        yield event
         
     except Exception as e:
         logger.error(f"Streaming request {request_id} failed: {e}")
-        yield f'data: {{"error": "{str(e)}"}}\n\n'
+        event = SSE_DATA_PREFIX + json_codec.dumps_bytes({"error": str(e)}) + SSE_EVENT_END
+        response_size += len(event)
+        yield event
     
     # 异步记录日志
-    if storage:
-        asyncio.create_task(record_streaming_log(
+    if api_logger:
+        full_response = {"choices": [{"message": {"content": "".join(content_parts)}}]}
+        spawn_log_task(record_streaming_log(
             request_data, full_response, provider, provider_name, 
-            request_id, performance_tracker, len(response_chunks), http_context
+            request_id, performance_tracker, chunk_count, http_context, response_size
         ))
 
 
@@ -808,7 +986,8 @@ async def record_streaming_log(
     request_id: str,
     performance_tracker: PerformanceTracker,
     chunk_count: int,
-    http_context: Dict[str, Any]
+    http_context: Dict[str, Any],
+    response_size: int
 ):
     """记录流式请求日志"""
     
@@ -826,16 +1005,15 @@ async def record_streaming_log(
         raw_data = provider.parse_raw_response(request_data, response)
         
         # 增强原始数据，添加 HTTP 信息
-        raw_data.request_headers = http_context["request_headers"]
+        raw_data.request_headers = dict(http_context["request_headers"])
         raw_data.client_ip = http_context["client_ip"]
         raw_data.user_agent = http_context["user_agent"]
         raw_data.request_url = http_context["request_url"]
-        raw_data.request_query_params = http_context["query_params"]
+        raw_data.request_query_params = dict(http_context["query_params"])
         raw_data.request_method = http_context["request_method"]
         raw_data.response_status_code = 200
-        raw_data.response_headers = {"content-type": "text/plain; charset=utf-8"}
-        if isinstance(response, dict):
-            raw_data.response_size_bytes = len(json.dumps(response).encode('utf-8'))
+        raw_data.response_headers = {"content-type": "text/event-stream; charset=utf-8"}
+        raw_data.response_size_bytes = response_size
         
         # 估算成本
         estimated_cost = 0.0
@@ -858,23 +1036,15 @@ async def record_streaming_log(
             raw_data=raw_data,
             estimated_analysis=estimated_analysis,
             success=True,
-            proxy_used=proxy_manager.get_proxy_info()["active_proxy"] if proxy_manager else None
+            proxy_used=proxy_manager.active_proxy if proxy_manager else None
         )
         
-        storage.store_log(log)
+        await api_logger.log_request(log)
         
     except Exception as e:
         logger.error(f"Failed to record streaming log: {e}")
 
 
-async def store_log_async(log: APICallLog):
-    """异步存储日志"""
-    try:
-        storage.store_log(log)
-    except Exception as e:
-        logger.error(f"Failed to store log: {e}")
-
-
 async def handle_claude_messages_regular(
     request_data: Dict[str, Any], 
     provider: Any, 
@@ -887,11 +1057,50 @@ async def handle_claude_messages_regular(
     
     try:
         # 直接发送Claude格式请求
-        response = await provider.send_claude_messages_request(request_data)
+        response = await call_upstream(provider_name, lambda: provider.send_claude_messages_request(request_data))
         
         # 记录性能指标
         performance_metrics = performance_tracker.calculate_non_streaming_metrics()
         
+        # 日志构建（计算响应大小、估算成本）放到后台任务，不占用请求延迟
+        if api_logger:
+            spawn_log_task(record_claude_regular_log(
+                request_data, response, provider, provider_name,
+                request_id, performance_metrics, http_context
+            ))
+        
+        return response
+        
+    except Exception as e:
+        # 记录失败日志
+        if api_logger:
+            # 错误日志共用只读的零值分析数据
+            error_log = api_logger.create_error_log(
+                request_id=request_id,
+                provider=provider_name,
+                model=request_data.get("model", "claude-3-5-sonnet-20241022"),
+                endpoint="messages",
+                raw_request=request_data,
+                error_message=str(e),
+                proxy_used=proxy_manager.active_proxy if proxy_manager else None
+            )
+            await api_logger.log_request(error_log)
+        
+        raise
+
+
+async def record_claude_regular_log(
+    request_data: Dict[str, Any],
+    response: Dict[str, Any],
+    provider: Any,
+    provider_name: str,
+    request_id: str,
+    performance_metrics: PerformanceAnalysis,
+    http_context: Dict[str, Any]
+):
+    """记录Claude Messages常规请求日志"""
+    
+    try:
         # 估算缓存
         cache_analysis = CacheAnalysis()
         if cache_estimator:
@@ -902,15 +1111,15 @@ async def handle_claude_messages_regular(
         raw_data = RawAPIData(
             raw_request=request_data,
             raw_response=response,
-            request_headers=http_context["request_headers"],
+            request_headers=dict(http_context["request_headers"]),
             client_ip=http_context["client_ip"],
             user_agent=http_context["user_agent"],
             request_url=http_context["request_url"],
-            request_query_params=http_context["query_params"],
+            request_query_params=dict(http_context["query_params"]),
             request_method=http_context["request_method"],
             response_status_code=200,
             response_headers={"content-type": "application/json"},
-            response_size_bytes=len(json.dumps(response).encode('utf-8'))
+            response_size_bytes=len(json_codec.dumps_bytes(response))
         )
         
         # 从Claude响应中提取usage信息
@@ -930,42 +1139,22 @@ async def handle_claude_messages_regular(
         )
         
         # 记录日志
-        if storage:
-            log = APICallLog(
-                request_id=request_id,
-                provider=provider_name,
-                model=request_data.get("model", "claude-3-5-sonnet-20241022"),
-                endpoint="messages",
-                raw_data=raw_data,
-                estimated_analysis=estimated_analysis,
-                success=True,
-                proxy_used=proxy_manager.get_proxy_info()["active_proxy"] if proxy_manager else None
-            )
-            
-            # 异步存储日志
-            asyncio.create_task(store_log_async(log))
+        log = APICallLog(
+            request_id=request_id,
+            provider=provider_name,
+            model=request_data.get("model", "claude-3-5-sonnet-20241022"),
+            endpoint="messages",
+            raw_data=raw_data,
+            estimated_analysis=estimated_analysis,
+            success=True,
+            proxy_used=proxy_manager.active_proxy if proxy_manager else None
+        )
         
-        return response
+        # 交给后台日志任务存储
+        await api_logger.log_request(log)
         
     except Exception as e:
-        # 记录失败日志
-        if storage:
-            error_log = APICallLog(
-                request_id=request_id,
-                provider=provider_name,
-                model=request_data.get("model", "claude-3-5-sonnet-20241022"),
-                endpoint="messages",
-                raw_data=RawAPIData(raw_request=request_data, raw_response={}),
-                estimated_analysis=EstimatedAnalysis(
-                    estimated_performance=PerformanceAnalysis(total_latency_ms=0),
-                    estimated_cache=CacheAnalysis()
-                ),
-                success=False,
-                error_message=str(e)
-            )
-            asyncio.create_task(store_log_async(error_log))
-        
-        raise
+        logger.error(f"Failed to record Claude regular log: {e}")
 
 
 async def handle_claude_messages_streaming(
@@ -978,27 +1167,34 @@ async def handle_claude_messages_streaming(
 ):
     """处理Claude Messages API的流式请求"""
     
-    response_chunks = []
-    full_response_content = ""
+    chunk_count = 0
+    # 文本片段先放进列表，结束后一次性拼接
+    content_parts = []
+    # 实际发送给客户端的字节数
+    response_size = 0
     
     try:
-        async for chunk in provider.send_claude_messages_streaming_request(request_data):
+        stream = provider.send_claude_messages_streaming_request(request_data)
+        async for chunk in guard_stream(provider_name, stream):
             # 记录token时间戳
             performance_tracker.record_token()
             
-            # 收集响应数据
-            response_chunks.append(chunk)
+            # 统计分块数，不保留分块本身
+            chunk_count += 1
             
             # 提取文本内容用于日志记录
-            if chunk.get("type") == "content_block_delta":
-                delta = chunk.get("delta", {})
-                if delta.get("type") == "text_delta":
-                    full_response_content += delta.get("text", "")
+            text = claude_text_delta(chunk)
+            if text is not None:
+                content_parts.append(text)
             
             # 直接转发Claude格式的流式响应
-            yield f"data: {json.dumps(chunk)}\n\n"
+            event = SSE_DATA_PREFIX + json_codec.dumps_bytes(chunk) + SSE_EVENT_END
+            response_size += len(event)
+            yield event
         
-        yield "data: [DONE]\n\n"
+        event = SSE_DONE
+        response_size += len(event)
+        yield event
         
     except Exception as e:
         logger.error(f"Claude Messages streaming request {request_id} failed: {e}")
@@ -1009,13 +1205,15 @@ async def handle_claude_messages_streaming(
                 "message": str(e)
             }
         }
-        yield f'data: {json.dumps(error_chunk)}\n\n'
+        event = SSE_DATA_PREFIX + json_codec.dumps_bytes(error_chunk) + SSE_EVENT_END
+        response_size += len(event)
+        yield event
     
     # 异步记录日志
-    if storage:
-        asyncio.create_task(record_claude_streaming_log(
-            request_data, full_response_content, provider, provider_name, 
-            request_id, performance_tracker, len(response_chunks), http_context
+    if api_logger:
+        spawn_log_task(record_claude_streaming_log(
+            request_data, "".join(content_parts), provider, provider_name, 
+            request_id, performance_tracker, chunk_count, http_context, response_size
         ))
 
 
@@ -1027,7 +1225,8 @@ async def record_claude_streaming_log(
     request_id: str,
     performance_tracker: PerformanceTracker,
     chunk_count: int,
-    http_context: Dict[str, Any]
+    http_context: Dict[str, Any],
+    response_size: int
 ):
     """记录Claude Messages流式请求日志"""
     
@@ -1052,15 +1251,15 @@ async def record_claude_streaming_log(
         raw_data = RawAPIData(
             raw_request=request_data,
             raw_response=response,
-            request_headers=http_context["request_headers"],
+            request_headers=dict(http_context["request_headers"]),
             client_ip=http_context["client_ip"],
             user_agent=http_context["user_agent"],
             request_url=http_context["request_url"],
-            request_query_params=http_context["query_params"],
+            request_query_params=dict(http_context["query_params"]),
             request_method=http_context["request_method"],
             response_status_code=200,
-            response_headers={"content-type": "text/plain; charset=utf-8"},
-            response_size_bytes=len(response_content.encode('utf-8'))
+            response_headers={"content-type": "text/event-stream; charset=utf-8"},
+            response_size_bytes=response_size
         )
         
         # 估算成本
@@ -1082,10 +1281,10 @@ async def record_claude_streaming_log(
             raw_data=raw_data,
             estimated_analysis=estimated_analysis,
             success=True,
-            proxy_used=proxy_manager.get_proxy_info()["active_proxy"] if proxy_manager else None
+            proxy_used=proxy_manager.active_proxy if proxy_manager else None
         )
         
-        storage.store_log(log)
+        await api_logger.log_request(log)
         
     except Exception as e:
         logger.error(f"Failed to record Claude streaming log: {e}")
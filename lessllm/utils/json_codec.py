@@ -0,0 +1,39 @@
+"""
+JSON encoding helpers with optional orjson acceleration
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> str:
+        """序列化为JSON字符串"""
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode("utf-8")
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """序列化为紧凑的UTF-8 JSON字节"""
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+
+    def loads(data: Any) -> Any:
+        """解析JSON字符串或字节"""
+        return orjson.loads(data)
+else:
+    def dumps(obj: Any) -> str:
+        """序列化为JSON字符串"""
+        return json.dumps(obj)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """序列化为紧凑的UTF-8 JSON字节"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data: Any) -> Any:
+        """解析JSON字符串或字节"""
+        return json.loads(data)
@@ -6,6 +6,12 @@ import re
 from typing import Union, List, Dict, Any
 
 
+# 单词和标点符号
+_TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+# 中文字符
+_CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+
 def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
     """
     简单的token计数器（估算）
@@ -18,13 +24,11 @@ def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
     # 这是一个粗略的估算，实际应该使用tokenizer
     
     # 分割单词和标点符号  
-    tokens = re.findall(r'\w+|[^\w\s]', text)
-    
-    # 对于中文等，每个字符大约是1个token
-    chinese_chars = re.findall(r'[\u4e00-\u9fff]', text)
+    base_count = len(_TOKEN_PATTERN.findall(text))
     
-    # 基础token数
-    base_count = len(tokens) + len(chinese_chars)
+    # 对于中文等，每个字符大约是1个token（纯ASCII文本不可能包含中文，跳过扫描）
+    if not text.isascii():
+        base_count += len(_CJK_PATTERN.findall(text))
     
     # 不同模型的token计算可能略有不同
     if model.startswith("gpt-4"):
@@ -0,0 +1,55 @@
+"""
+并发隔离舱单元测试
+"""
+
+import asyncio
+import pytest
+
+from lessllm.reliability.bulkhead import Bulkhead, BulkheadFullError
+
+
+class TestBulkhead:
+    """并发隔离舱测试"""
+    
+    @pytest.mark.asyncio
+    async def test_limits_concurrency_and_queue(self):
+        """测试并发数和等待队列都满时立即拒绝"""
+        bulkhead = Bulkhead(capacity=1, max_waiting=1)
+        release = asyncio.Event()
+        
+        async def hold():
+            async with bulkhead:
+                await release.wait()
+        
+        running = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        
+        assert bulkhead.waiting == 1
+        assert bulkhead.is_full()
+        with pytest.raises(BulkheadFullError):
+            async with bulkhead:
+                pass
+        
+        release.set()
+        await asyncio.gather(running, waiting)
+        assert not bulkhead.is_full()
+        assert bulkhead.waiting == 0
+    
+    @pytest.mark.asyncio
+    async def test_wrap_stream_holds_slot(self):
+        """测试流式响应期间占用名额，结束后释放"""
+        bulkhead = Bulkhead(capacity=1, max_waiting=0)
+        
+        async def stream():
+            yield 1
+            yield 2
+        
+        items = []
+        async for item in bulkhead.wrap_stream(stream()):
+            assert bulkhead.is_full()
+            items.append(item)
+        
+        assert items == [1, 2]
+        assert not bulkhead.is_full()
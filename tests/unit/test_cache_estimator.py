@@ -0,0 +1,236 @@
+"""
+缓存估算器单元测试
+"""
+
+import pytest
+from unittest.mock import patch
+
+from lessllm.monitoring.cache_estimator import CacheEstimator
+from lessllm.logging.models import CacheAnalysis
+from lessllm.utils.token_counter import count_tokens
+
+
+REPEATED_TEXT = " ".join(["the quick brown fox jumps"] * 6)
+
+
+@pytest.fixture
+def estimator():
+    """缓存估算器实例"""
+    return CacheEstimator()
+
+
+class TestPrepareMessages:
+    """消息预处理测试"""
+    
+    def test_string_content(self, estimator):
+        """测试字符串内容原样保留"""
+        prepared = estimator._prepare_messages([{"role": "user", "content": "Hello world"}])
+        
+        assert prepared == [("user", "Hello world", count_tokens("Hello world"), 0, False)]
+    
+    def test_multimodal_content_joins_text_blocks(self, estimator):
+        """测试多模态内容只保留文本块并拼接"""
+        prepared = estimator._prepare_messages([{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "first"},
+                {"type": "image_url", "image_url": {"url": "http://x"}},
+                "not a block",
+                {"type": "text", "text": "second"},
+            ]
+        }])
+        
+        assert prepared == [("user", "first second", 2, 0, False)]
+    
+    def test_none_and_non_text_content_keep_placeholder(self, estimator):
+        """测试None和非文本内容保留空占位，消息数量不变"""
+        messages = [
+            {"role": "system", "content": None},
+            {"role": "user", "content": [{"type": "image_url", "image_url": {"url": "http://x"}}]},
+            {"role": "assistant", "content": 42},
+            {"role": "user"},
+        ]
+        
+        prepared = estimator._prepare_messages(messages)
+        
+        assert prepared == [
+            ("system", "", 0, 0, False),
+            ("user", "", 0, 0, False),
+            ("assistant", "", 0, 0, False),
+            ("user", "", 0, 0, False),
+        ]
+
+
+class TestEstimateCacheTokens:
+    """缓存估算测试"""
+    
+    def test_empty_messages(self, estimator):
+        """测试空消息列表"""
+        assert estimator.estimate_cache_tokens([]) == CacheAnalysis()
+    
+    def test_total_tokens_include_multimodal_text(self, estimator):
+        """测试总token数包含多模态文本"""
+        messages = [
+            {"role": "user", "content": "Hello world"},
+            {"role": "user", "content": [{"type": "text", "text": "more text here"}]},
+        ]
+        
+        result = estimator.estimate_cache_tokens(messages)
+        
+        total = result.estimated_cached_tokens + result.estimated_fresh_tokens
+        assert total == count_tokens("Hello world") + count_tokens("more text here")
+    
+    def test_multimodal_history_counts_like_string_content(self):
+        """测试多模态文本与等价字符串内容的历史缓存估算一致"""
+        list_messages = [
+            {"role": "user", "content": [{"type": "text", "text": REPEATED_TEXT}]},
+            {"role": "assistant", "content": "ok"},
+            {"role": "user", "content": "next"},
+        ]
+        str_messages = [
+            {"role": "user", "content": REPEATED_TEXT},
+            {"role": "assistant", "content": "ok"},
+            {"role": "user", "content": "next"},
+        ]
+        
+        list_result = CacheEstimator().estimate_cache_tokens(list_messages)
+        str_result = CacheEstimator().estimate_cache_tokens(str_messages)
+        
+        assert list_result == str_result
+        # 长度100~500 +0.1，重复内容 +0.2；"ok" 为短消息 +0.2
+        expected = int(count_tokens(REPEATED_TEXT) * (0.3 + 0.1 + 0.2)) + int(count_tokens("ok") * 0.5)
+        assert expected > 0
+        assert list_result.conversation_history_cached == expected
+    
+    def test_placeholder_preserves_last_message_position(self, estimator):
+        """测试非文本占位消息仍被视为最后一条消息"""
+        messages = [
+            {"role": "user", "content": "Hello there"},
+            {"role": "assistant", "content": "Hi"},
+            {"role": "user", "content": None},
+        ]
+        
+        result = estimator.estimate_cache_tokens(messages)
+        
+        # 前两条消息都属于历史，最后的占位消息被排除
+        expected = int(count_tokens("Hello there") * 0.5) + int(count_tokens("Hi") * 0.5)
+        assert result.conversation_history_cached == expected
+    
+    def test_history_requires_more_than_two_messages(self, estimator):
+        """测试两条及以下消息不计算历史缓存"""
+        messages = [
+            {"role": "user", "content": "Hello there"},
+            {"role": "assistant", "content": "Hi"},
+        ]
+        
+        assert estimator.estimate_cache_tokens(messages).conversation_history_cached == 0
+    
+    def test_system_message_cached_on_repeat(self, estimator):
+        """测试重复的系统消息第二次被视为缓存"""
+        messages = [{"role": "system", "content": "Be concise."}]
+        
+        first = estimator.estimate_cache_tokens(messages)
+        second = estimator.estimate_cache_tokens(messages)
+        
+        assert first.system_message_cached == 0
+        assert second.system_message_cached == count_tokens("Be concise.")
+    
+    def test_multimodal_system_message_cached_on_repeat(self, estimator):
+        """测试多模态系统消息同样参与系统缓存分析"""
+        messages = [{"role": "system", "content": [{"type": "text", "text": "Be concise."}]}]
+        
+        estimator.estimate_cache_tokens(messages)
+        second = estimator.estimate_cache_tokens(messages)
+        
+        assert second.system_message_cached == count_tokens("Be concise.")
+    
+    def test_template_in_multimodal_content(self, estimator):
+        """测试多模态内容中的模板被识别"""
+        text = "You are a helpful assistant. " + "Answer every question carefully and politely. " * 3
+        messages = [{"role": "user", "content": [{"type": "text", "text": text}]}]
+        
+        result = estimator.estimate_cache_tokens(messages)
+        
+        expected = min(count_tokens("You are a helpful assistant"), count_tokens(text) // 4)
+        assert result.template_cached == expected
+
+
+class TestConversationHistory:
+    """对话历史缓存分析测试"""
+    
+    def test_system_role_probability(self, estimator):
+        """测试系统消息的缓存概率更高"""
+        prepared = estimator._prepare_messages([
+            {"role": "system", "content": "Hi"},
+            {"role": "user", "content": "Hi"},
+            {"role": "user", "content": "last"},
+        ])
+        
+        # system: min(1.0, 0.8 + 0.2)，user: 0.3 + 0.2
+        assert estimator._analyze_conversation_history(prepared) == 1 + 0
+    
+    def test_short_content_skips_repetitive_scan(self, estimator):
+        """测试过短的内容不做重复模式扫描"""
+        with patch.object(estimator, '_has_repetitive_patterns') as mock_scan:
+            estimator._prepare_messages([
+                {"role": "user", "content": "a b c d e"},
+                {"role": "user", "content": "x"},
+                {"role": "user", "content": "last"},
+            ])
+        
+        mock_scan.assert_not_called()
+    
+    def test_shortest_repetitive_content_detected(self, estimator):
+        """测试刚好满足长度下限的重复内容仍会被检测"""
+        text = "a a a a a a a a a a"  # 10个单词，19个字符
+        prepared = estimator._prepare_messages([
+            {"role": "user", "content": text},
+            {"role": "user", "content": "x"},
+            {"role": "user", "content": "last"},
+        ])
+        
+        # 0.3 + 0.2（短消息）+ 0.2（重复内容）= 0.7
+        assert estimator._analyze_conversation_history(prepared) == int(10 * 0.7)
+
+
+class TestTextStatsCache:
+    """文本分析结果缓存测试"""
+    
+    def test_repeated_history_analyzed_once(self, estimator):
+        """测试多轮对话中重复的历史消息只分析一次"""
+        first_turn = [
+            {"role": "system", "content": "Be concise."},
+            {"role": "user", "content": REPEATED_TEXT},
+        ]
+        second_turn = first_turn + [
+            {"role": "assistant", "content": "ok"},
+            {"role": "user", "content": "next"},
+        ]
+        
+        estimator.estimate_cache_tokens(first_turn)
+        with patch("lessllm.monitoring.cache_estimator.count_tokens", wraps=count_tokens) as mock_count:
+            estimator.estimate_cache_tokens(second_turn)
+        
+        # 只有新增的两条消息需要计数
+        assert mock_count.call_count == 2
+        assert estimator.text_stats_hits == 2
+    
+    def test_cached_result_matches_fresh_estimator(self, estimator):
+        """测试命中缓存时的估算结果与新实例一致"""
+        messages = [
+            {"role": "user", "content": REPEATED_TEXT},
+            {"role": "assistant", "content": "You are a helpful assistant, please answer."},
+            {"role": "user", "content": "next"},
+        ]
+        
+        estimator.estimate_cache_tokens(messages)
+        
+        assert estimator.estimate_cache_tokens(messages) == CacheEstimator().estimate_cache_tokens(messages)
+    
+    def test_cache_size_bounded(self, estimator):
+        """测试缓存条目数有上限"""
+        with patch("lessllm.monitoring.cache_estimator._TEXT_STATS_CACHE_SIZE", 2):
+            for text in ["one", "two", "three"]:
+                estimator._get_text_stats(text)
+        
+        assert len(estimator._text_stats_cache) == 2
@@ -0,0 +1,123 @@
+"""
+断路器单元测试
+"""
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from lessllm.reliability.circuit import (
+    CircuitBreaker, CircuitOpenError, is_upstream_failure, CLOSED, OPEN, HALF_OPEN
+)
+
+
+def _status_error(status_code):
+    request = httpx.Request("POST", "https://api.test.com/v1/messages")
+    response = httpx.Response(status_code, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+class TestIsUpstreamFailure:
+    """上游故障分类测试"""
+    
+    def test_transport_and_server_errors(self):
+        """测试超时、连接错误和5xx被视为上游故障"""
+        assert is_upstream_failure(httpx.ReadTimeout("timeout"))
+        assert is_upstream_failure(httpx.ConnectError("refused"))
+        assert is_upstream_failure(_status_error(502))
+        assert not is_upstream_failure(_status_error(400))
+        assert not is_upstream_failure(ValueError("bad input"))
+    
+    def test_wrapped_exception(self):
+        """测试被包装为普通异常时沿异常链识别"""
+        try:
+            try:
+                raise _status_error(503)
+            except httpx.HTTPStatusError:
+                raise Exception("Claude API error: 503")
+        except Exception as e:
+            assert is_upstream_failure(e)
+
+
+class TestCircuitBreaker:
+    """断路器状态转换测试"""
+    
+    @pytest.mark.asyncio
+    async def test_opens_after_threshold(self):
+        """测试连续失败达到阈值后打开并快速失败"""
+        breaker = CircuitBreaker(failure_threshold=2, recovery_s=30)
+        
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectError):
+                async with breaker:
+                    raise httpx.ConnectError("refused")
+        
+        assert breaker.state == OPEN
+        assert breaker.is_open()
+        with pytest.raises(CircuitOpenError):
+            async with breaker:
+                pass
+    
+    @pytest.mark.asyncio
+    async def test_client_errors_do_not_open(self):
+        """测试4xx等非上游故障不计入失败"""
+        breaker = CircuitBreaker(failure_threshold=1)
+        
+        with pytest.raises(httpx.HTTPStatusError):
+            async with breaker:
+                raise _status_error(400)
+        
+        assert breaker.state == CLOSED
+        assert breaker.failures == 0
+    
+    @pytest.mark.asyncio
+    async def test_half_open_trial(self):
+        """测试恢复时间后只放行一个试探请求，成功则关闭"""
+        breaker = CircuitBreaker(failure_threshold=1, recovery_s=10)
+        breaker.record_failure()
+        
+        with patch("lessllm.reliability.circuit.time.monotonic", return_value=breaker.opened_at + 11):
+            assert not breaker.is_open()
+            breaker.before_call()
+            assert breaker.state == HALF_OPEN
+            with pytest.raises(CircuitOpenError):
+                breaker.before_call()
+        
+        breaker.record_success()
+        assert breaker.state == CLOSED
+    
+    @pytest.mark.asyncio
+    async def test_half_open_failure_reopens(self):
+        """测试试探请求失败后重新打开"""
+        breaker = CircuitBreaker(failure_threshold=3, recovery_s=10)
+        breaker.state = OPEN
+        breaker.opened_at = 0.0
+        
+        with patch("lessllm.reliability.circuit.time.monotonic", return_value=100.0):
+            with pytest.raises(httpx.ReadTimeout):
+                async with breaker:
+                    raise httpx.ReadTimeout("timeout")
+        
+        assert breaker.state == OPEN
+        assert breaker.opened_at == 100.0
+    
+    @pytest.mark.asyncio
+    async def test_wrap_stream(self):
+        """测试流式响应完整结束记为成功，中途故障记为失败"""
+        breaker = CircuitBreaker(failure_threshold=1)
+        
+        async def ok_stream():
+            yield 1
+            yield 2
+        
+        async def broken_stream():
+            yield 1
+            raise httpx.RemoteProtocolError("peer closed")
+        
+        assert [item async for item in breaker.wrap_stream(ok_stream())] == [1, 2]
+        assert breaker.state == CLOSED
+        
+        with pytest.raises(httpx.RemoteProtocolError):
+            async for _ in breaker.wrap_stream(broken_stream()):
+                pass
+        assert breaker.state == OPEN
@@ -0,0 +1,30 @@
+"""
+命令行入口单元测试
+"""
+
+import subprocess
+import sys
+
+
+class TestLazyImports:
+    """CLI延迟导入测试"""
+    
+    def test_cli_import_skips_heavy_modules(self):
+        """测试导入CLI不会加载配置、FastAPI和httpx"""
+        # 在独立进程中检查，避免受其他测试已导入模块的影响
+        code = (
+            "import sys, lessllm.cli\n"
+            "heavy = ['lessllm.config', 'fastapi', 'httpx', 'asyncio']\n"
+            "print(','.join(name for name in heavy if name in sys.modules))"
+        )
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        
+        assert result.stdout.strip() == ""
+    
+    def test_config_resolved_lazily(self):
+        """测试包级别的Config和configure按需解析"""
+        import lessllm
+        from lessllm import config
+        
+        assert lessllm.Config is config.Config
+        assert lessllm.configure is config.configure
@@ -132,6 +132,65 @@ class TestConfig:
         result = Config._replace_env_vars(data)
         assert result["key"] == "${MISSING_VAR}"  # 保持原值
     
+    @patch.dict(os.environ, {"HOST": "localhost", "PORT": "8080"})
+    def test_replace_env_vars_multiple_in_string(self):
+        """测试同一字符串中的多个环境变量"""
+        result = Config._replace_env_vars({"url": "${HOST}:${PORT}", "items": ["${HOST}"]})
+        assert result == {"url": "localhost:8080", "items": ["localhost"]}
+    
+    @patch.dict(os.environ, {"API_KEY": "first_key"})
+    def test_from_yaml_reuses_parsed_file(self):
+        """测试未修改的YAML文件只解析一次，环境变量仍每次替换"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
+            f.write('providers:\n  openai:\n    api_key: "${API_KEY}"\n')
+            yaml_path = f.name
+        
+        try:
+            with patch("lessllm.config.yaml.safe_load", wraps=yaml.safe_load) as mock_load:
+                first = Config.from_yaml(yaml_path)
+                with patch.dict(os.environ, {"API_KEY": "second_key"}):
+                    second = Config.from_yaml(yaml_path)
+            
+            assert mock_load.call_count == 1
+            assert first.providers["openai"]["api_key"] == "first_key"
+            assert second.providers["openai"]["api_key"] == "second_key"
+        finally:
+            os.unlink(yaml_path)
+    
+    def test_from_yaml_skips_substitution_without_placeholders(self):
+        """测试文件中没有环境变量占位符时跳过替换，且配置修改不影响缓存"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
+            f.write('providers:\n  openai:\n    api_key: "plain-key"\n')
+            yaml_path = f.name
+        
+        try:
+            with patch.object(Config, "_replace_env_vars") as mock_replace:
+                config = Config.from_yaml(yaml_path)
+            
+            mock_replace.assert_not_called()
+            config.providers["openai"]["api_key"] = "changed"
+            assert Config.from_yaml(yaml_path).providers["openai"]["api_key"] == "plain-key"
+        finally:
+            os.unlink(yaml_path)
+    
+    def test_from_yaml_reloads_modified_file(self):
+        """测试YAML文件修改后重新解析"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
+            f.write("server:\n  port: 8000\n")
+            yaml_path = f.name
+        
+        try:
+            assert Config.from_yaml(yaml_path).server.port == 8000
+            
+            with open(yaml_path, 'w') as f:
+                f.write("server:\n  port: 9000\n")
+            stat = os.stat(yaml_path)
+            os.utime(yaml_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+            
+            assert Config.from_yaml(yaml_path).server.port == 9000
+        finally:
+            os.unlink(yaml_path)
+    
     def test_from_yaml_valid_file(self):
         """测试从有效YAML文件加载配置"""
         yaml_content = """
@@ -0,0 +1,44 @@
+"""
+日志ID生成单元测试
+"""
+
+from unittest.mock import patch
+
+from lessllm.logging.ids import IdGenerator, new_id
+
+
+class TestIdGenerator:
+    """ID生成器测试"""
+    
+    def test_ids_are_unique(self):
+        """测试生成的ID不重复"""
+        ids = {new_id() for _ in range(10000)}
+        
+        assert len(ids) == 10000
+    
+    def test_id_format(self):
+        """测试ID为固定长度的十六进制字符串"""
+        generated = new_id()
+        
+        assert len(generated) == 28
+        int(generated, 16)
+    
+    def test_ids_ordered_by_time(self):
+        """测试较晚生成的ID排序在后"""
+        generator = IdGenerator()
+        
+        with patch("lessllm.logging.ids.time.time_ns", return_value=1_000_000_000_000):
+            earlier = generator.next_id()
+        with patch("lessllm.logging.ids.time.time_ns", return_value=2_000_000_000_000):
+            later = generator.next_id()
+        
+        assert earlier < later
+    
+    def test_reset_changes_prefix(self):
+        """测试重置后进程前缀改变"""
+        generator = IdGenerator()
+        first = generator.next_id()
+        
+        generator._reset()
+        
+        assert generator.next_id()[12:22] != first[12:22]
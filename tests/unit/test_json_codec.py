@@ -0,0 +1,35 @@
+"""
+JSON编解码工具单元测试
+"""
+
+import json
+
+from lessllm.utils import json_codec
+
+
+class TestJsonCodec:
+    """JSON编解码测试"""
+    
+    def test_dumps_round_trip(self):
+        """测试序列化结果可被标准库解析"""
+        data = {"text": "你好", "items": [1, 2.5, None, True], "nested": {"a": "b"}}
+        
+        encoded = json_codec.dumps(data)
+        
+        assert isinstance(encoded, str)
+        assert json.loads(encoded) == data
+    
+    def test_dumps_non_str_keys(self):
+        """测试非字符串键与标准库行为一致"""
+        assert json.loads(json_codec.dumps({1: "a"})) == {"1": "a"}
+    
+    def test_dumps_bytes_compact_utf8(self):
+        """测试字节序列化为紧凑的UTF-8"""
+        encoded = json_codec.dumps_bytes({"text": "你好", "n": [1, 2]})
+        
+        assert encoded == '{"text":"你好","n":[1,2]}'.encode("utf-8")
+    
+    def test_loads_str_and_bytes(self):
+        """测试解析字符串和字节"""
+        assert json_codec.loads('{"a": 1}') == {"a": 1}
+        assert json_codec.loads(b'{"a": 1}') == {"a": 1}
@@ -0,0 +1,159 @@
+"""
+API日志记录器单元测试
+"""
+
+import asyncio
+import threading
+import pytest
+from unittest.mock import Mock
+
+from lessllm.logging.logger import APILogger
+from lessllm.logging.models import PerformanceAnalysis, CacheAnalysis
+from lessllm.logging.storage import LogStorage
+
+
+class TestAPILoggerWorker:
+    """日志工作线程测试"""
+    
+    @pytest.mark.asyncio
+    async def test_worker_stores_queued_logs_in_one_batch(self):
+        """测试队列中的日志被合并为一个批次写入"""
+        storage = Mock()
+        api_logger = APILogger(storage)
+        
+        logs = [Mock(request_id=f"req-{i}") for i in range(3)]
+        for log in logs:
+            await api_logger.log_request(log)
+        
+        await api_logger.start()
+        await api_logger.stop()
+        
+        storage.store_logs_batch.assert_called_once_with(logs)
+        storage.store_log.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_worker_falls_back_to_single_inserts_on_batch_failure(self):
+        """测试批量写入失败时逐条重试，只丢失坏数据"""
+        storage = Mock()
+        storage.store_logs_batch.side_effect = Exception("duplicate key")
+        
+        good_log = Mock(request_id="good")
+        bad_log = Mock(request_id="bad")
+        
+        def store_log(log):
+            if log is bad_log:
+                raise Exception("bad row")
+        
+        storage.store_log.side_effect = store_log
+        api_logger = APILogger(storage)
+        
+        await api_logger.log_request(good_log)
+        await api_logger.log_request(bad_log)
+        
+        await api_logger.start()
+        await api_logger.stop()
+        
+        assert [call.args[0] for call in storage.store_log.call_args_list] == [good_log, bad_log]
+        assert api_logger._log_queue.empty()
+    
+    @pytest.mark.asyncio
+    async def test_stop_wakes_idle_worker(self):
+        """测试空闲的工作线程在停止时立即退出"""
+        storage = Mock()
+        api_logger = APILogger(storage)
+        
+        await api_logger.start()
+        await asyncio.wait_for(api_logger.stop(), timeout=0.5)
+        
+        storage.store_logs_batch.assert_not_called()
+
+
+class TestAPILoggerBackpressure:
+    """日志队列背压测试"""
+    
+    @pytest.mark.asyncio
+    async def test_drop_on_overload(self):
+        """测试队列已满时立即丢弃并计数"""
+        api_logger = APILogger(Mock(), max_queue_size=2, drop_on_overload=True)
+        
+        for i in range(3):
+            await api_logger.log_request(Mock(request_id=f"req-{i}"))
+        
+        assert api_logger._log_queue.qsize() == 2
+        assert api_logger.dropped_logs == 1
+    
+    @pytest.mark.asyncio
+    async def test_wait_then_drop_on_overload(self):
+        """测试队列已满时短暂等待空位，超时后丢弃"""
+        api_logger = APILogger(Mock(), max_queue_size=1)
+        
+        await api_logger.log_request(Mock(request_id="req-0"))
+        await api_logger.log_request(Mock(request_id="req-1"))
+        
+        assert api_logger._log_queue.qsize() == 1
+        assert api_logger.dropped_logs == 1
+
+
+class TestAPILoggerExecutor:
+    """存储写入线程测试"""
+    
+    @pytest.mark.asyncio
+    async def test_batches_written_off_event_loop(self):
+        """测试批量写入在独立线程中执行"""
+        storage = Mock()
+        threads = []
+        storage.store_logs_batch.side_effect = lambda batch: threads.append(threading.current_thread().name)
+        api_logger = APILogger(storage)
+        
+        await api_logger.start()
+        await api_logger.log_request(Mock(request_id="req-1"))
+        await api_logger.stop()
+        
+        assert len(threads) == 1
+        assert threads[0].startswith("lessllm-log-io")
+        assert api_logger._io_pool is None
+
+
+class TestCreateLogs:
+    """日志构造测试"""
+    
+    def test_success_log_has_key_fields(self):
+        """测试成功日志在创建时即提取关键字段"""
+        api_logger = APILogger(Mock())
+        
+        log = api_logger.create_success_log(
+            request_id="req-1",
+            provider="claude",
+            model="claude-3",
+            endpoint="/v1/messages",
+            raw_request={},
+            raw_response={"usage": {"input_tokens": 10, "output_tokens": 5}},
+            performance=PerformanceAnalysis(total_latency_ms=100),
+            cache_analysis=CacheAnalysis()
+        )
+        
+        assert (log.actual_prompt_tokens, log.actual_completion_tokens, log.actual_total_tokens) == (10, 5, 15)
+    
+    def test_error_logs_share_read_only_analysis(self):
+        """测试错误日志共享零值分析数据且存储过程不会修改它"""
+        api_logger = APILogger(Mock())
+        
+        logs = [
+            api_logger.create_error_log(
+                request_id=f"req-{i}",
+                provider="openai",
+                model="gpt-4",
+                endpoint="/v1/chat/completions",
+                raw_request={},
+                error_message="upstream down"
+            )
+            for i in range(2)
+        ]
+        for log in logs:
+            LogStorage._log_to_row(log)
+        
+        first, second = (log.estimated_analysis for log in logs)
+        assert first.estimated_performance is second.estimated_performance
+        assert first.estimated_cache is second.estimated_cache
+        assert first.estimated_performance == PerformanceAnalysis(total_latency_ms=0)
+        assert first.estimated_cache == CacheAnalysis()
@@ -0,0 +1,74 @@
+"""
+日志数据模型单元测试
+"""
+
+from lessllm.logging.models import (
+    APICallLog, RawAPIData, EstimatedAnalysis, PerformanceAnalysis, CacheAnalysis
+)
+
+
+def make_log(usage=None, cache_info=None) -> APICallLog:
+    """构造测试用日志"""
+    return APICallLog(
+        provider="test",
+        model="test-model",
+        endpoint="/v1/test",
+        raw_data=RawAPIData(
+            raw_request={},
+            raw_response={},
+            extracted_usage=usage,
+            extracted_cache_info=cache_info
+        ),
+        estimated_analysis=EstimatedAnalysis(
+            estimated_performance=PerformanceAnalysis(total_latency_ms=100),
+            estimated_cache=CacheAnalysis()
+        ),
+        success=True
+    )
+
+
+class TestRawAPIData:
+    """原始API数据模型测试"""
+    
+    def test_header_fields_present(self):
+        """测试请求和上游请求头字段存在"""
+        fields = RawAPIData.model_fields
+        
+        assert "request_headers" in fields
+        assert "upstream_request_headers" in fields
+
+
+class TestExtractKeyFields:
+    """关键字段提取测试"""
+    
+    def test_openai_usage(self):
+        """测试OpenAI格式的用量"""
+        log = make_log({"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15})
+        log.extract_key_fields()
+        
+        assert (log.actual_prompt_tokens, log.actual_completion_tokens, log.actual_total_tokens) == (10, 5, 15)
+    
+    def test_claude_usage(self):
+        """测试Claude格式的用量"""
+        log = make_log({"input_tokens": 10, "output_tokens": 5})
+        log.extract_key_fields()
+        
+        assert (log.actual_prompt_tokens, log.actual_completion_tokens, log.actual_total_tokens) == (10, 5, 15)
+    
+    def test_cache_info(self):
+        """测试缓存信息提取"""
+        log = make_log(cache_info={"cached_tokens": 8, "cache_hit_rate": 0.5})
+        log.extract_key_fields()
+        
+        assert log.actual_cached_tokens == 8
+        assert log.actual_cache_hit_rate == 0.5
+    
+    def test_extract_key_fields_runs_once(self):
+        """测试关键字段只提取一次"""
+        log = make_log({"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15})
+        log.extract_key_fields()
+        
+        log.raw_data.extracted_usage = {"prompt_tokens": 99}
+        log.extract_key_fields()
+        
+        assert log.actual_prompt_tokens == 10
@@ -0,0 +1,74 @@
+"""
+性能指标收集器单元测试
+"""
+
+import pytest
+from unittest.mock import patch
+
+from lessllm.monitoring.performance import PerformanceTracker
+
+
+def _tracker_with_times(times):
+    """按给定的毫秒时间序列依次返回 time.perf_counter_ns()"""
+    return patch(
+        "lessllm.monitoring.performance.time.perf_counter_ns",
+        side_effect=[ms * 1_000_000 for ms in times]
+    )
+
+
+class TestPerformanceTracker:
+    """性能指标收集器测试"""
+    
+    def test_streaming_metrics(self):
+        """测试流式指标只依赖首尾token时间"""
+        tracker = PerformanceTracker()
+        with _tracker_with_times([0, 500, 600, 700, 900]):
+            tracker.start_request()
+            for _ in range(4):
+                tracker.record_token()
+        
+        metrics = tracker.calculate_metrics(output_tokens=4)
+        
+        assert tracker.token_count == 4
+        assert metrics.ttft_ms == 500
+        assert metrics.tpot_ms == 100.0
+        assert metrics.tokens_per_second == 10.0
+        assert metrics.total_latency_ms == 900
+    
+    def test_single_token_has_no_tpot(self):
+        """测试只有一个token时不计算TPOT"""
+        tracker = PerformanceTracker()
+        with _tracker_with_times([0, 250]):
+            tracker.start_request()
+            tracker.record_token()
+        
+        metrics = tracker.calculate_metrics(output_tokens=1)
+        
+        assert metrics.ttft_ms == 250
+        assert metrics.tpot_ms is None
+        assert metrics.total_latency_ms == 250
+    
+    def test_first_token_recorded_without_tokens(self):
+        """测试只记录首token时总延迟从请求开始计算"""
+        tracker = PerformanceTracker()
+        with _tracker_with_times([0, 250, 750]):
+            tracker.start_request()
+            tracker.record_first_token()
+            metrics = tracker.calculate_metrics(output_tokens=0)
+        
+        assert metrics.ttft_ms == 250
+        assert metrics.total_latency_ms == 750
+    
+    def test_non_streaming_metrics(self):
+        """测试非流式请求TTFT等于总延迟"""
+        tracker = PerformanceTracker()
+        with _tracker_with_times([0, 1234]):
+            tracker.start_request()
+            metrics = tracker.calculate_non_streaming_metrics()
+        
+        assert metrics.ttft_ms == metrics.total_latency_ms == 1234
+    
+    def test_calculate_metrics_requires_start(self):
+        """测试未记录开始时间时报错"""
+        with pytest.raises(ValueError):
+            PerformanceTracker().calculate_metrics(output_tokens=1)
@@ -5,7 +5,7 @@
 import pytest
 import httpx
 from unittest.mock import Mock, AsyncMock, patch
-from lessllm.providers.base import BaseProvider
+from lessllm.providers.base import BaseProvider, iter_sse_data
 from lessllm.proxy.manager import ProxyManager
 from lessllm.config import ProxyConfig
 from lessllm.logging.models import RawAPIData
@@ -126,6 +126,36 @@ class TestBaseProvider:
         await provider.close()
         assert provider._client is None
     
+    @pytest.mark.asyncio
+    async def test_shared_client_not_closed(self):
+        """测试共享客户端被复用且不会被Provider关闭"""
+        shared_client = httpx.AsyncClient()
+        provider = ConcreteProvider("test-api-key", http_client=shared_client)
+        
+        assert await provider.get_client() is shared_client
+        
+        await provider.close()
+        assert provider._client is None
+        assert not shared_client.is_closed
+        
+        await shared_client.aclose()
+    
+    @pytest.mark.asyncio
+    async def test_providers_share_proxy_manager_client(self):
+        """测试同一代理管理器下的Provider共用客户端且不会各自关闭它"""
+        proxy_manager = ProxyManager(ProxyConfig())
+        first = ConcreteProvider("key-1", proxy_manager)
+        second = ConcreteProvider("key-2", proxy_manager)
+        
+        client = await first.get_client()
+        assert await second.get_client() is client
+        
+        await first.close()
+        assert not client.is_closed
+        
+        await proxy_manager.aclose()
+        assert client.is_closed
+    
     def test_get_headers_default(self):
         """测试获取默认请求头"""
         provider = ConcreteProvider("test-api-key")
@@ -190,6 +220,34 @@ class TestBaseProvider:
             
             assert is_valid is False
     
+    @pytest.mark.asyncio
+    async def test_send_requests_batch(self):
+        """测试批量并发请求保持顺序并返回异常"""
+        provider = ConcreteProvider("test-api-key")
+        
+        async def fake_send(request):
+            if request["model"] == "bad":
+                raise ValueError("boom")
+            return {"model": request["model"]}
+        
+        with patch.object(provider, 'send_request', side_effect=fake_send):
+            results = await provider.send_requests_batch([
+                {"model": "a"}, {"model": "bad"}, {"model": "c"}
+            ])
+        
+        assert results[0] == {"model": "a"}
+        assert isinstance(results[1], ValueError)
+        assert results[2] == {"model": "c"}
+        await provider.close()
+    
+    @pytest.mark.asyncio
+    async def test_send_requests_batch_empty(self):
+        """测试空批量请求"""
+        provider = ConcreteProvider("test-api-key")
+        
+        assert await provider.send_requests_batch([]) == []
+        assert provider._client is None
+    
     def test_get_model_info(self):
         """测试获取模型信息"""
         provider = ConcreteProvider("test-api-key")
@@ -303,4 +361,36 @@ class TestProviderUtilityMethods:
         
         assert isinstance(raw_data, RawAPIData)
         assert raw_data.raw_request == request
-        assert raw_data.raw_response == response
\ No newline at end of file
+        assert raw_data.raw_response == response
+
+
+class TestIterSSEData:
+    """SSE字节流解析测试"""
+    
+    @staticmethod
+    def _response(chunks):
+        async def aiter_bytes():
+            for chunk in chunks:
+                yield chunk
+        
+        response = Mock()
+        response.aiter_bytes = aiter_bytes
+        return response
+    
+    @pytest.mark.asyncio
+    async def test_lines_split_across_chunks(self):
+        """测试跨分块的行被正确拼接，非data行被忽略"""
+        response = self._response([
+            b"event: message_start\r\nda",
+            b"ta: {\"a\": 1}\r\n\r\n",
+            b"data: {\"b\": 2}\n\ndata: [DONE]"
+        ])
+        
+        payloads = [data async for data in iter_sse_data(response)]
+        
+        assert payloads == [b'{"a": 1}', b'{"b": 2}', b"[DONE]"]
+    
+    @pytest.mark.asyncio
+    async def test_empty_stream(self):
+        """测试空响应流"""
+        assert [data async for data in iter_sse_data(self._response([]))] == []
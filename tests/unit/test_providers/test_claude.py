@@ -0,0 +1,178 @@
+"""
+Claude Provider测试
+"""
+
+import httpx
+import pytest
+
+from lessllm.providers.claude import ClaudeProvider
+
+
+class TestClaudeHeaders:
+    """Claude请求头测试"""
+    
+    def test_headers_cached(self):
+        """测试请求头只构造一次"""
+        provider = ClaudeProvider("test-api-key")
+        
+        headers = provider.get_headers()
+        
+        assert headers["x-api-key"] == "test-api-key"
+        assert headers["anthropic-version"] == "2023-06-01"
+        assert provider.get_headers() is headers
+    
+    def test_headers_rebuilt_when_base_url_changes(self):
+        """测试修改base_url或api_key后请求头重新构造"""
+        provider = ClaudeProvider("test-api-key")
+        provider.get_headers()
+        
+        provider.base_url = "https://dashscope.aliyuncs.com/api/v1"
+        headers = provider.get_headers()
+        assert headers["Authorization"] == "Bearer test-api-key"
+        assert "x-api-key" not in headers
+        
+        provider.api_key = "new-key"
+        assert provider.get_headers()["Authorization"] == "Bearer new-key"
+
+
+class TestClaudeCost:
+    """Claude成本估算测试"""
+    
+    def test_estimate_cost_uses_per_token_prices(self):
+        """测试成本估算与每token单价一致"""
+        provider = ClaudeProvider("test-api-key")
+        model = "claude-3-haiku-20240307"
+        
+        cost = provider.estimate_cost({"prompt_tokens": 1000, "completion_tokens": 2000}, model)
+        
+        expected = 1000 * provider.get_input_cost_per_token(model) + 2000 * provider.get_output_cost_per_token(model)
+        assert cost == expected
+        assert abs(cost - (0.00025 + 2 * 0.00125)) < 1e-12
+    
+    def test_unknown_model_costs_nothing(self):
+        """测试未知模型成本为0"""
+        provider = ClaudeProvider("test-api-key")
+        
+        assert provider.estimate_cost({"prompt_tokens": 10}, "unknown") == 0.0
+        assert provider.get_input_cost_per_token("unknown") == 0.0
+        assert provider.get_output_cost_per_token("unknown") == 0.0
+
+
+class TestClaudeRequestConversion:
+    """OpenAI格式到Claude格式转换测试"""
+    
+    def test_convert_separates_system_and_params(self):
+        """测试system消息被提取，只透传支持的采样参数"""
+        provider = ClaudeProvider("test-api-key")
+        
+        claude_request = provider._convert_to_claude_format({
+            "model": "claude-3-haiku-20240307",
+            "messages": [
+                {"role": "system", "content": "first"},
+                {"role": "user", "content": "hi", "name": "ignored"},
+                {"role": "system", "content": "last"},
+                {"role": "assistant", "content": "hello"}
+            ],
+            "temperature": 0.2,
+            "presence_penalty": 1.0
+        })
+        
+        assert claude_request == {
+            "model": "claude-3-haiku-20240307",
+            "max_tokens": 1000,
+            "messages": [
+                {"role": "user", "content": "hi"},
+                {"role": "assistant", "content": "hello"}
+            ],
+            "system": "last",
+            "temperature": 0.2
+        }
+    
+    @pytest.mark.parametrize("stop, expected", [
+        ("END", ["END"]),
+        (["a", "b"], ["a", "b"])
+    ])
+    def test_convert_forwards_top_k_and_stop(self, stop, expected):
+        """测试top_k原样透传，OpenAI的stop转换为Claude的stop_sequences"""
+        provider = ClaudeProvider("test-api-key")
+        
+        claude_request = provider._convert_to_claude_format({
+            "model": "claude-3-haiku-20240307",
+            "messages": [{"role": "user", "content": "hi"}],
+            "top_k": 5,
+            "stop": stop
+        })
+        
+        assert claude_request["top_k"] == 5
+        assert claude_request["stop_sequences"] == expected
+        assert "stop" not in claude_request
+
+
+class TestClaudeResponseParsing:
+    """Claude响应解析测试"""
+    
+    @pytest.mark.asyncio
+    async def test_send_request_parses_body(self):
+        """测试非流式响应体直接从字节解析"""
+        def handler(request):
+            return httpx.Response(200, content=b'{"id": "msg_1", "content": [{"type": "text", "text": "hi"}]}')
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        provider = ClaudeProvider("test-api-key", http_client=client)
+        
+        response = await provider.send_claude_messages_request({"model": "claude-3-haiku-20240307", "messages": []})
+        
+        assert response == {"id": "msg_1", "content": [{"type": "text", "text": "hi"}]}
+        await client.aclose()
+    
+    @pytest.mark.asyncio
+    async def test_streaming_request_parses_events(self):
+        """测试流式响应逐条解析并在[DONE]处结束"""
+        def handler(request):
+            return httpx.Response(
+                200,
+                content=b'event: ping\ndata: {"type": "ping"}\n\ndata: not-json\n\ndata: [DONE]\n\ndata: {"type": "late"}\n\n'
+            )
+        
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        provider = ClaudeProvider("test-api-key", http_client=client)
+        
+        events = [
+            event async for event in provider.send_claude_messages_streaming_request(
+                {"model": "claude-3-haiku-20240307", "messages": []}
+            )
+        ]
+        
+        assert events == [{"type": "ping"}]
+        await client.aclose()
+
+
+class TestClaudeResponseNormalization:
+    """Claude响应规范化测试"""
+    
+    def test_normalize_response(self):
+        """测试转换为OpenAI格式"""
+        provider = ClaudeProvider("test-api-key")
+        
+        normalized = provider.normalize_response({
+            "id": "msg_1",
+            "model": "claude-3-haiku-20240307",
+            "content": [{"type": "text", "text": "hi"}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": 3, "output_tokens": 2}
+        })
+        
+        assert normalized["choices"][0]["message"] == {"role": "assistant", "content": "hi"}
+        assert normalized["choices"][0]["finish_reason"] == "stop"
+        assert normalized["usage"] == {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}
+    
+    def test_normalize_response_passthrough_and_empty_content(self):
+        """测试无content字段原样返回，空content转为空字符串"""
+        provider = ClaudeProvider("test-api-key")
+        
+        assert provider.normalize_response({"error": "x"}) == {"error": "x"}
+        
+        normalized = provider.normalize_response({"content": [], "stop_reason": "max_tokens"})
+        assert normalized["choices"][0]["message"]["content"] == ""
+        assert normalized["choices"][0]["finish_reason"] == "max_tokens"
+        assert "usage" not in normalized
@@ -61,6 +61,25 @@ class TestOpenAIProvider:
             assert pricing["input"] > 0
             assert pricing["output"] > 0
     
+    def test_reassigned_pricing_used_for_cost(self):
+        """测试重新设置价格表后成本估算使用新价格"""
+        provider = OpenAIProvider("test-api-key")
+        
+        provider.pricing = {**provider.pricing, "gpt-4": {"input": 0.5, "output": 1.0}}
+        
+        assert provider.get_input_cost_per_token("gpt-4") == 0.0005
+        assert provider.get_output_cost_per_token("gpt-4") == 0.001
+        assert provider.estimate_cost({"prompt_tokens": 1000, "completion_tokens": 1000}, "gpt-4") == 1.5
+    
+    def test_pricing_is_read_only(self):
+        """测试价格表不能原地修改，避免换算好的单价过期"""
+        provider = OpenAIProvider("test-api-key")
+        
+        with pytest.raises(TypeError):
+            provider.pricing["gpt-4"]["input"] = 0.5
+        with pytest.raises(TypeError):
+            provider.pricing["gpt-5"] = {"input": 0.5, "output": 1.0}
+    
     def test_max_tokens_data_structure(self):
         """测试最大token数据结构"""
         provider = OpenAIProvider("test-api-key")
@@ -120,25 +139,25 @@ class TestOpenAIProvider:
         provider = OpenAIProvider("test-api-key")
         
         # 创建异步生成器来模拟流式响应
-        async def mock_aiter_lines():
+        async def mock_aiter_bytes():
             for chunk in sample_streaming_chunks:
-                yield f"data: {json.dumps(chunk)}"
-            yield "data: [DONE]"
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+            yield b"data: [DONE]\n\n"
         
         with patch.object(provider, 'get_client') as mock_get_client:
             mock_response = AsyncMock()
             mock_response.status_code = 200
-            mock_response.aiter_lines = Mock(return_value=mock_aiter_lines())
+            mock_response.aiter_bytes = Mock(return_value=mock_aiter_bytes())
             mock_response.raise_for_status = Mock()
             
             # Create a proper async context manager
             class AsyncStreamContextManager:
                 def __init__(self, response):
                     self.response = response
-                    
+                
                 async def __aenter__(self):
                     return self.response
-                    
+                
                 async def __aexit__(self, exc_type, exc_val, exc_tb):
                     return None
             
@@ -163,24 +182,24 @@ class TestOpenAIProvider:
         """测试流式请求中的无效JSON处理"""
         provider = OpenAIProvider("test-api-key")
         
-        async def mock_aiter_lines():
-            yield "data: {invalid json}"
-            yield "data: [DONE]"
+        async def mock_aiter_bytes():
+            yield b"data: {invalid json}\n\n"
+            yield b"data: [DONE]\n\n"
         
         with patch.object(provider, 'get_client') as mock_get_client:
             mock_response = AsyncMock()
             mock_response.status_code = 200
-            mock_response.aiter_lines = Mock(return_value=mock_aiter_lines())
+            mock_response.aiter_bytes = Mock(return_value=mock_aiter_bytes())
             mock_response.raise_for_status = Mock()
             
             # Create a proper async context manager
             class AsyncStreamContextManager:
                 def __init__(self, response):
                     self.response = response
-                    
+                
                 async def __aenter__(self):
                     return self.response
-                    
+                
                 async def __aexit__(self, exc_type, exc_val, exc_tb):
                     return None
             
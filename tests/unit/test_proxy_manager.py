@@ -136,6 +136,42 @@ class TestProxyManager:
         assert client.timeout.read == 60
         await client.aclose()
     
+    @pytest.mark.asyncio
+    async def test_get_httpx_client_uses_configured_limits(self):
+        """测试连接池大小来自代理配置，HTTP代理传输同样生效"""
+        config = ProxyConfig(
+            http_proxy="http://proxy.test:8080",
+            max_connections=50,
+            max_keepalive_connections=10,
+            keepalive_expiry=15.0
+        )
+        manager = ProxyManager(config)
+        
+        client = manager.get_httpx_client()
+        
+        pool = client._transport._pool
+        assert isinstance(client._transport, httpx.AsyncHTTPTransport)
+        assert pool._max_connections == 50
+        assert pool._max_keepalive_connections == 10
+        assert pool._keepalive_expiry == 15.0
+        await client.aclose()
+    
+    @pytest.mark.asyncio
+    async def test_get_shared_client_reused_until_closed(self):
+        """测试共享客户端只创建一次，关闭后重新创建"""
+        manager = ProxyManager(ProxyConfig())
+        
+        client = manager.get_shared_client(timeout=60)
+        assert manager.get_shared_client() is client
+        assert client.timeout.read == 60
+        
+        await manager.aclose()
+        assert client.is_closed
+        
+        new_client = manager.get_shared_client()
+        assert new_client is not client
+        await manager.aclose()
+    
     @pytest.mark.asyncio
     async def test_get_httpx_client_with_proxy(self):
         """测试获取带代理的httpx客户端"""
@@ -204,27 +240,27 @@ class TestProxyManager:
 class TestProxyConnectivity:
     """代理连通性测试"""
     
-    @patch('httpx.Client')
-    def test_connectivity_success(self, mock_client_class):
-        """测试连通性检查成功"""
-        # 设置mock
+    @staticmethod
+    def _with_client(manager, get):
+        """让共享客户端的 get 使用给定的行为"""
         mock_client = Mock()
+        mock_client.get = AsyncMock(side_effect=get)
+        manager._shared_client = mock_client
+        mock_client.is_closed = False
+        return mock_client
+    
+    @pytest.mark.asyncio
+    async def test_connectivity_success(self):
+        """测试连通性检查成功"""
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.elapsed.total_seconds.return_value = 0.5
-        mock_client.get.return_value = mock_response
-        
-        # 使用MagicMock来支持上下文管理器
-        from unittest.mock import MagicMock
-        mock_context_manager = MagicMock()
-        mock_context_manager.__enter__.return_value = mock_client
-        mock_context_manager.__exit__.return_value = None
-        mock_client_class.return_value = mock_context_manager
         
         config = ProxyConfig(socks_proxy="socks5://127.0.0.1:1080")
         manager = ProxyManager(config)
+        self._with_client(manager, lambda url: mock_response)
         
-        result = manager.test_connectivity()
+        result = await manager.test_connectivity()
         
         assert result["success"] is True
         assert result["status_code"] == 200
@@ -232,103 +268,82 @@ class TestProxyConnectivity:
         assert result["proxy_used"] == "socks5://127.0.0.1:1080"
         assert "successful" in result["message"]
     
-    @patch('httpx.Client')
-    def test_connectivity_timeout(self, mock_client_class):
+    @pytest.mark.asyncio
+    async def test_connectivity_timeout(self):
         """测试连通性检查超时"""
-        # 设置mock抛出超时异常
-        mock_client = Mock()
-        mock_client.get.side_effect = httpx.TimeoutException("Timeout")
-        
-        # 使用MagicMock来支持上下文管理器
-        from unittest.mock import MagicMock
-        mock_context_manager = MagicMock()
-        mock_context_manager.__enter__.return_value = mock_client
-        mock_context_manager.__exit__.return_value = None
-        mock_client_class.return_value = mock_context_manager
-        
         config = ProxyConfig(
             http_proxy="http://proxy.test:8080",
             timeout=10
         )
         manager = ProxyManager(config)
+        self._with_client(manager, httpx.TimeoutException("Timeout"))
         
-        result = manager.test_connectivity()
+        result = await manager.test_connectivity()
         
         assert result["success"] is False
         assert result["error"] == "Connection timeout"
         assert result["proxy_used"] == "http://proxy.test:8080"
         assert "timed out after 10s" in result["message"]
     
-    @patch('httpx.Client')
-    def test_connectivity_proxy_error(self, mock_client_class):
+    @pytest.mark.asyncio
+    async def test_connectivity_proxy_error(self):
         """测试代理错误"""
-        # 设置mock抛出代理错误
-        mock_client = Mock()
-        mock_client.get.side_effect = httpx.ProxyError("Proxy connection failed")
-        
-        # 使用MagicMock来支持上下文管理器
-        from unittest.mock import MagicMock
-        mock_context_manager = MagicMock()
-        mock_context_manager.__enter__.return_value = mock_client
-        mock_context_manager.__exit__.return_value = None
-        mock_client_class.return_value = mock_context_manager
-        
         config = ProxyConfig(socks_proxy="socks5://invalid:1080")
         manager = ProxyManager(config)
+        self._with_client(manager, httpx.ProxyError("Proxy connection failed"))
         
-        result = manager.test_connectivity()
+        result = await manager.test_connectivity()
         
         assert result["success"] is False
         assert result["error"] == "Proxy error"
         assert "Proxy connection failed" in result["message"]
     
-    @patch('httpx.Client')
-    def test_connectivity_unknown_error(self, mock_client_class):
+    @pytest.mark.asyncio
+    async def test_connectivity_unknown_error(self):
         """测试未知错误"""
-        # 设置mock抛出其他异常
-        mock_client = Mock()
-        mock_client.get.side_effect = Exception("Unexpected error")
-        
-        # 使用MagicMock来支持上下文管理器
-        from unittest.mock import MagicMock
-        mock_context_manager = MagicMock()
-        mock_context_manager.__enter__.return_value = mock_client
-        mock_context_manager.__exit__.return_value = None
-        mock_client_class.return_value = mock_context_manager
-        
         config = ProxyConfig()
         manager = ProxyManager(config)
+        self._with_client(manager, Exception("Unexpected error"))
         
-        result = manager.test_connectivity()
+        result = await manager.test_connectivity()
         
         assert result["success"] is False
         assert result["error"] == "Unknown error"
         assert "Unexpected error" in result["message"]
     
-    @patch('httpx.Client')
-    def test_connectivity_custom_test_url(self, mock_client_class):
+    @pytest.mark.asyncio
+    async def test_connectivity_custom_test_url(self):
         """测试自定义测试URL"""
-        mock_client = Mock()
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.elapsed.total_seconds.return_value = 0.3
-        mock_client.get.return_value = mock_response
-        
-        # 使用MagicMock来支持上下文管理器
-        from unittest.mock import MagicMock
-        mock_context_manager = MagicMock()
-        mock_context_manager.__enter__.return_value = mock_client
-        mock_context_manager.__exit__.return_value = None
-        mock_client_class.return_value = mock_context_manager
         
         config = ProxyConfig()
         manager = ProxyManager(config)
+        mock_client = self._with_client(manager, lambda url: mock_response)
         
-        result = manager.test_connectivity("https://custom.test.com/ping")
+        result = await manager.test_connectivity("https://custom.test.com/ping")
         
         assert result["success"] is True
         # 验证使用了自定义URL
         mock_client.get.assert_called_with("https://custom.test.com/ping")
+    
+    @pytest.mark.asyncio
+    async def test_connectivity_uses_shared_client(self):
+        """测试连通性检查复用共享客户端，不另建连接池"""
+        def handler(request):
+            return httpx.Response(200, stream=httpx.ByteStream(b"ok"))
+        
+        manager = ProxyManager(ProxyConfig())
+        client = manager.get_shared_client(transport=httpx.MockTransport(handler))
+        
+        with patch('httpx.AsyncClient') as mock_client_class:
+            result = await manager.test_connectivity()
+        
+        assert result["success"] is True
+        mock_client_class.assert_not_called()
+        assert manager.get_shared_client() is client
+        await manager.aclose()
 
 
 class TestProxyManagerEdgeCases:
@@ -373,4 +388,6 @@ class TestProxyManagerEdgeCases:
         
         info = manager.get_proxy_info()
         # active_proxy应该显示SOCKS代理
-        assert info["active_proxy"] == "socks5://socks-proxy:1080"
\ No newline at end of file
+        assert info["active_proxy"] == "socks5://socks-proxy:1080"
+        assert manager.active_proxy == "socks5://socks-proxy:1080"
+        assert manager.get_proxy_info() is info
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""
+重试策略单元测试
+"""
+
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from lessllm.reliability.retry import retry_async, is_retryable
+
+
+def _status_error(status_code):
+    request = httpx.Request("POST", "https://api.test.com/v1/chat/completions")
+    response = httpx.Response(status_code, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+class TestIsRetryable:
+    """可重试异常分类测试"""
+    
+    def test_classification(self):
+        """测试只重试超时、连接错误、429和网关错误"""
+        assert is_retryable(httpx.ReadTimeout("timeout"))
+        assert is_retryable(httpx.ProxyError("proxy down"))
+        assert is_retryable(_status_error(429))
+        assert is_retryable(_status_error(503))
+        assert not is_retryable(_status_error(401))
+        assert not is_retryable(_status_error(400))
+        assert not is_retryable(ValueError("bad request"))
+
+
+class TestRetryAsync:
+    """指数退避重试测试"""
+    
+    @pytest.mark.asyncio
+    async def test_retries_transient_errors_with_backoff(self):
+        """测试暂时性错误按指数退避重试直到成功"""
+        fn = AsyncMock(side_effect=[httpx.ReadTimeout("timeout"), _status_error(502), "ok"])
+        
+        with patch("lessllm.reliability.retry.asyncio.sleep", new_callable=AsyncMock) as sleep, \
+             patch("lessllm.reliability.retry.random.uniform", return_value=0.1):
+            result = await retry_async(fn, attempts=3, base=0.5)
+        
+        assert result == "ok"
+        assert fn.await_count == 3
+        assert [call.args[0] for call in sleep.await_args_list] == [0.6, 1.1]
+    
+    @pytest.mark.asyncio
+    async def test_does_not_retry_client_errors(self):
+        """测试认证、参数等错误不重试"""
+        fn = AsyncMock(side_effect=_status_error(401))
+        
+        with patch("lessllm.reliability.retry.asyncio.sleep", new_callable=AsyncMock) as sleep:
+            with pytest.raises(httpx.HTTPStatusError):
+                await retry_async(fn, attempts=3)
+        
+        assert fn.await_count == 1
+        sleep.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_gives_up_after_attempts(self):
+        """测试超过尝试次数后抛出最后一次的异常"""
+        fn = AsyncMock(side_effect=httpx.ConnectError("refused"))
+        
+        with patch("lessllm.reliability.retry.asyncio.sleep", new_callable=AsyncMock):
+            with pytest.raises(httpx.ConnectError):
+                await retry_async(fn, attempts=2)
+        
+        assert fn.await_count == 2
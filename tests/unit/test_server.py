@@ -0,0 +1,498 @@
+"""
+服务器路由单元测试
+"""
+
+import asyncio
+import httpx
+import json
+import pytest
+from unittest.mock import AsyncMock, Mock
+from fastapi import HTTPException
+
+from lessllm import server
+from lessllm.utils import json_codec
+from lessllm.providers.openai import OpenAIProvider
+from lessllm.providers.claude import ClaudeProvider
+from lessllm.monitoring.performance import PerformanceTracker
+from lessllm.logging.logger import APILogger
+
+
+@pytest.fixture
+def configure_providers(monkeypatch):
+    """替换已配置的提供商并重建路由表"""
+    def configure(configured):
+        monkeypatch.setattr(server, "providers", configured)
+        monkeypatch.setattr(server, "model_routes", {})
+        monkeypatch.setattr(server, "default_route", None)
+        monkeypatch.setattr(server, "single_route", None)
+        server.build_model_routes()
+    
+    return configure
+
+
+class TestModelRouting:
+    """模型路由测试"""
+    
+    def test_routes_by_model_prefix(self, configure_providers):
+        """测试按模型前缀路由到第一个同类提供商"""
+        openai = OpenAIProvider("openai-key")
+        claude = ClaudeProvider("claude-key")
+        backup = ClaudeProvider("backup-key")
+        configure_providers({"openai": openai, "claude": claude, "anthropic": backup})
+        
+        assert server.get_provider_for_model("gpt-4") == ("openai", openai)
+        assert server.get_provider_for_model("claude-3-haiku-20240307") == ("claude", claude)
+    
+    def test_falls_back_to_first_provider(self, configure_providers):
+        """测试没有匹配的提供商时使用第一个"""
+        claude = ClaudeProvider("claude-key")
+        configure_providers({"claude": claude})
+        
+        assert server.get_provider_for_model("gpt-4") == ("claude", claude)
+        assert server.get_provider_for_model("llama-3") == ("claude", claude)
+    
+    def test_single_provider_serves_every_model(self, configure_providers):
+        """测试只有一个提供商时所有模型都路由到它"""
+        claude = ClaudeProvider("claude-key")
+        configure_providers({"claude": claude})
+        
+        assert server.single_route == ("claude", claude)
+        assert server.get_provider_for_model("gpt-4") == ("claude", claude)
+        assert server.get_provider_for_model("claude-3") == ("claude", claude)
+    
+    def test_resolution_cached_until_routes_rebuilt(self, configure_providers):
+        """测试模型解析结果被缓存，重建路由表时失效"""
+        openai = OpenAIProvider("openai-key")
+        claude = ClaudeProvider("claude-key")
+        configure_providers({"openai": openai, "claude": claude})
+        
+        server.get_provider_for_model("gpt-4")
+        server.get_provider_for_model("gpt-4")
+        assert server.resolve_model_route.cache_info().hits == 1
+        
+        other = OpenAIProvider("other-key")
+        configure_providers({"other": other, "claude": claude})
+        assert server.get_provider_for_model("gpt-4") == ("other", other)
+    
+    def test_no_providers(self, configure_providers):
+        """测试没有任何提供商时返回400"""
+        configure_providers({})
+        
+        with pytest.raises(HTTPException) as exc_info:
+            server.get_provider_for_model("gpt-4")
+        assert exc_info.value.status_code == 400
+
+
+class TestRequestConversion:
+    """请求格式转换测试"""
+    
+    def test_claude_content_blocks_flattened(self):
+        """测试Claude内容块只保留文本并以空格拼接"""
+        converted = server.convert_claude_to_openai({
+            "model": "claude-3",
+            "system": "be brief",
+            "messages": [
+                {"role": "user", "content": "hi"},
+                {"role": "user", "content": [
+                    {"type": "text", "text": "look at"},
+                    {"type": "image", "source": {}},
+                    {"type": "text", "text": "this"}
+                ]}
+            ]
+        })
+        
+        assert converted["messages"] == [
+            {"role": "system", "content": "be brief"},
+            {"role": "user", "content": "hi"},
+            {"role": "user", "content": "look at this"}
+        ]
+
+
+class TestHealthCheck:
+    """健康检查测试"""
+    
+    @pytest.mark.asyncio
+    async def test_response_cached_within_ttl(self, monkeypatch):
+        """测试TTL内复用同一份响应，过期后重新生成"""
+        monkeypatch.setattr(server, "_health_cache", (0.0, {}))
+        monkeypatch.setattr(server, "proxy_manager", None)
+        
+        first = await server.health_check()
+        assert await server.health_check() is first
+        
+        monkeypatch.setattr(server, "HEALTH_CACHE_TTL_SECONDS", 0.0)
+        assert await server.health_check() is not first
+
+
+class TestStreamingConversion:
+    """流式分块格式转换测试"""
+    
+    def test_openai_delta_to_claude(self):
+        """测试OpenAI增量内容转换为Claude文本增量事件"""
+        chunk = {"choices": [{"index": 0, "delta": {"content": "Hi"}}]}
+        
+        assert server.convert_openai_streaming_to_claude(chunk) == {
+            "type": "content_block_delta",
+            "index": 0,
+            "delta": {"type": "text_delta", "text": "Hi"}
+        }
+        assert server.convert_openai_to_claude_response(chunk, is_streaming=True)["delta"]["text"] == "Hi"
+    
+    def test_chunks_without_content_become_ping(self):
+        """测试没有内容的分块转换为ping事件"""
+        for chunk in (
+            {},
+            {"choices": []},
+            {"choices": [{"finish_reason": "stop"}]},
+            {"choices": [{"delta": None}]},
+            {"choices": [{"delta": {"role": "assistant"}}]},
+            {"choices": [{"delta": {"content": None}}]}
+        ):
+            assert server.convert_openai_streaming_to_claude(chunk) == {"type": "ping"}
+    
+    def test_text_delta_extraction(self):
+        """测试从两种格式的流式分块中提取文本增量"""
+        assert server.openai_text_delta({"choices": [{"delta": {"content": "a"}}]}) == "a"
+        assert server.openai_text_delta({"choices": [{"delta": {}}]}) is None
+        assert server.openai_text_delta({"choices": []}) is None
+        
+        assert server.claude_text_delta({"type": "content_block_delta", "delta": {"type": "text_delta", "text": "b"}}) == "b"
+        assert server.claude_text_delta({"type": "content_block_delta", "delta": {"type": "input_json_delta"}}) is None
+        assert server.claude_text_delta({"type": "content_block_delta"}) is None
+        assert server.claude_text_delta({"delta": {"type": "text_delta", "text": "c"}}) is None
+    
+    def test_openai_delta_event_matches_encoded_conversion(self):
+        """测试预编码的OpenAI增量事件与转换后再编码的结果一致"""
+        claude_chunk = {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": 'say "hi"\n'}}
+        
+        converted = server.convert_claude_streaming_to_openai(claude_chunk)
+        event = server.openai_delta_event(server.claude_text_delta(claude_chunk))
+        
+        assert event == server.SSE_DATA_PREFIX + json_codec.dumps_bytes(converted) + server.SSE_EVENT_END
+        assert server.claude_text_delta({"type": "message_stop"}) is None
+
+
+class TestRequestLogging:
+    """请求日志测试"""
+    
+    @staticmethod
+    def _http_context():
+        return {
+            "client_ip": "127.0.0.1",
+            "user_agent": "pytest",
+            "request_headers": {},
+            "request_url": "http://test/v1/chat/completions",
+            "query_params": {},
+            "request_method": "POST"
+        }
+    
+    @pytest.mark.asyncio
+    async def test_logs_built_after_response(self, monkeypatch):
+        """测试日志在响应返回后由后台任务构建并交给日志记录器，不直接写存储"""
+        api_logger = Mock(log_request=AsyncMock())
+        storage = Mock()
+        monkeypatch.setattr(server, "api_logger", api_logger)
+        monkeypatch.setattr(server, "storage", storage)
+        
+        provider = OpenAIProvider("openai-key")
+        provider.send_request = AsyncMock(return_value={"choices": [], "usage": {"prompt_tokens": 3, "completion_tokens": 2}})
+        tracker = PerformanceTracker()
+        tracker.start_request()
+        
+        await server.handle_regular_request(
+            {"model": "gpt-4", "messages": []}, provider, "openai", "req-1", tracker, self._http_context()
+        )
+        
+        api_logger.log_request.assert_not_awaited()
+        await asyncio.sleep(0)
+        
+        log = api_logger.log_request.await_args.args[0]
+        assert (log.request_id, log.success) == ("req-1", True)
+        storage.store_log.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_error_log_shares_zero_analysis(self, monkeypatch):
+        """测试失败请求的错误日志复用共享的零值分析数据"""
+        api_logger = APILogger(Mock())
+        monkeypatch.setattr(api_logger, "log_request", AsyncMock())
+        monkeypatch.setattr(server, "api_logger", api_logger)
+        monkeypatch.setattr(server, "proxy_manager", None)
+        
+        provider = OpenAIProvider("openai-key")
+        provider.send_request = AsyncMock(side_effect=ValueError("bad request"))
+        
+        for request_id in ("req-1", "req-2"):
+            with pytest.raises(ValueError):
+                await server.handle_regular_request(
+                    {"model": "gpt-4"}, provider, "openai", request_id, PerformanceTracker(), self._http_context()
+                )
+        
+        first, second = (call.args[0] for call in api_logger.log_request.await_args_list)
+        assert (first.success, first.error_message) == (False, "bad request")
+        assert first.estimated_analysis.estimated_performance is second.estimated_analysis.estimated_performance
+    
+    @pytest.mark.asyncio
+    async def test_log_tasks_bounded(self, monkeypatch):
+        """测试进行中的日志任务达到上限时丢弃新任务，完成后释放名额"""
+        monkeypatch.setattr(server, "MAX_LOG_TASKS", 1)
+        monkeypatch.setattr(server, "log_tasks", set())
+        release = asyncio.Event()
+        
+        async def record():
+            await release.wait()
+        
+        task = server.spawn_log_task(record())
+        assert server.spawn_log_task(record()) is None
+        
+        release.set()
+        await task
+        assert server.log_tasks == set()
+        assert server.spawn_log_task(record()) is not None
+
+
+class TestStreamingHandlers:
+    """流式响应处理测试"""
+    
+    @pytest.mark.asyncio
+    async def test_converted_chunks_encoded_as_sse_bytes(self, monkeypatch):
+        """测试转换后的分块以JSON字节形式输出为SSE事件"""
+        monkeypatch.setattr(server, "api_logger", None)
+        
+        async def fake_stream(request):
+            yield {"choices": [{"delta": {"content": "你好"}}]}
+        
+        provider = Mock(send_streaming_request=fake_stream)
+        events = [
+            event async for event in server.handle_claude_to_openai_streaming_conversion(
+                {"model": "gpt-4"}, provider, "openai", "req-1", PerformanceTracker(), {}
+            )
+        ]
+        
+        assert events[0] == (
+            b'data: {"type":"content_block_delta","index":0,'
+            b'"delta":{"type":"text_delta","text":"' + "你好".encode() + b'"}}\n\n'
+        )
+    
+    @pytest.mark.asyncio
+    async def test_passthrough_chunks_are_json(self, monkeypatch):
+        """测试透传的OpenAI分块编码为JSON而不是Python repr"""
+        monkeypatch.setattr(server, "api_logger", None)
+        chunk = {"choices": [{"delta": {"content": "it's"}}], "done": False}
+        
+        async def fake_stream(request):
+            yield chunk
+        
+        provider = Mock(send_streaming_request=fake_stream)
+        events = [
+            event async for event in server.handle_streaming_request(
+                {"model": "gpt-4"}, provider, "openai", "req-1", PerformanceTracker(), {}
+            )
+        ]
+        
+        assert events[0].startswith(b"data: ")
+        assert json.loads(events[0][len(b"data: "):]) == chunk
+    
+    @pytest.mark.asyncio
+    async def test_ping_and_done_use_shared_events(self, monkeypatch):
+        """测试ping和结束事件直接复用预先编码的字节"""
+        monkeypatch.setattr(server, "api_logger", None)
+        
+        async def fake_stream(request):
+            yield {"choices": [{"delta": {"role": "assistant"}}]}
+        
+        provider = Mock(send_streaming_request=fake_stream)
+        events = [
+            event async for event in server.handle_claude_to_openai_streaming_conversion(
+                {"model": "gpt-4"}, provider, "openai", "req-1", PerformanceTracker(), {}
+            )
+        ]
+        
+        assert events == [server.SSE_PING, server.SSE_DONE]
+        assert events[-1] == b"data: [DONE]\n\n"
+    
+    @pytest.mark.asyncio
+    async def test_error_event_is_valid_json(self, monkeypatch):
+        """测试错误信息含引号时仍输出合法JSON"""
+        monkeypatch.setattr(server, "api_logger", None)
+        
+        async def failing_stream(request):
+            raise ValueError('bad "model"')
+            yield
+        
+        provider = Mock(send_streaming_request=failing_stream)
+        events = [
+            event async for event in server.handle_streaming_request(
+                {"model": "gpt-4"}, provider, "openai", "req-1", PerformanceTracker(), {}
+            )
+        ]
+        
+        assert json.loads(events[-1][len(b"data: "):]) == {"error": 'bad "model"'}
+    
+    @pytest.mark.asyncio
+    async def test_logged_content_joined_from_deltas(self, monkeypatch):
+        """测试日志记录的完整文本由各个增量拼接而成"""
+        record_log = AsyncMock()
+        monkeypatch.setattr(server, "api_logger", Mock())
+        monkeypatch.setattr(server, "record_claude_streaming_log", record_log)
+        
+        async def fake_stream(request):
+            for text in ("Hel", "lo", None):
+                yield {"choices": [{"delta": {"content": text}}]}
+        
+        provider = Mock(send_streaming_request=fake_stream)
+        async for _ in server.handle_claude_to_openai_streaming_conversion(
+            {"model": "gpt-4"}, provider, "openai", "req-1", PerformanceTracker(), {}
+        ):
+            pass
+        await asyncio.sleep(0)
+        
+        assert record_log.await_args.args[1] == "Hello"
+    
+    @pytest.mark.asyncio
+    async def test_logged_size_counts_sent_bytes(self, monkeypatch):
+        """测试日志记录的响应大小等于实际发送给客户端的字节数"""
+        record_log = AsyncMock()
+        monkeypatch.setattr(server, "api_logger", Mock())
+        monkeypatch.setattr(server, "record_streaming_log", record_log)
+        
+        async def fake_stream(request):
+            for text in ("你好", "!"):
+                yield {"choices": [{"delta": {"content": text}}]}
+        
+        provider = Mock(send_streaming_request=fake_stream)
+        events = [
+            event async for event in server.handle_streaming_request(
+                {"model": "gpt-4"}, provider, "openai", "req-1", PerformanceTracker(), {}
+            )
+        ]
+        await asyncio.sleep(0)
+        
+        assert record_log.await_args.args[-1] == sum(len(event) for event in events)
+
+
+class TestHttpContext:
+    """HTTP上下文捕获测试"""
+    
+    def test_capture_keeps_read_only_views(self):
+        """测试捕获的请求头和查询参数保留只读映射"""
+        from starlette.requests import Request
+        
+        request = Request({
+            "type": "http",
+            "method": "POST",
+            "scheme": "http",
+            "server": ("proxy", 8000),
+            "path": "/v1/messages",
+            "query_string": b"beta=true",
+            "headers": [(b"user-agent", b"claude-cli")],
+            "client": ("10.0.0.1", 5000)
+        })
+        
+        context = server.capture_http_context(request)
+        
+        assert context["request_headers"] is request.headers
+        assert context["query_params"] is request.query_params
+        assert (context["client_ip"], context["user_agent"]) == ("10.0.0.1", "claude-cli")
+        assert context["request_url"] == "http://proxy:8000/v1/messages?beta=true"
+        assert context["request_method"] == "POST"
+
+
+@pytest.fixture
+def reliable_openai(monkeypatch, configure_providers):
+    """配置单个OpenAI提供商和较小的可靠性阈值"""
+    from lessllm.config import ReliabilityConfig
+    
+    monkeypatch.setattr(server, "api_logger", None)
+    monkeypatch.setattr(server, "circuit_breakers", {})
+    monkeypatch.setattr(server, "bulkheads", {})
+    monkeypatch.setattr(server, "reliability_config", ReliabilityConfig(
+        circuit_failure_threshold=2, retry_attempts=1, bulkhead_capacity=1, bulkhead_max_waiting=0
+    ))
+    
+    provider = OpenAIProvider("openai-key")
+    configure_providers({"openai": provider})
+    return provider
+
+
+class TestUpstreamReliability:
+    """上游断路器与并发隔离舱的服务端行为测试"""
+    
+    REQUEST = {"model": "gpt-4", "messages": [{"role": "user", "content": "hi"}]}
+    
+    @staticmethod
+    def _server_error():
+        request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+        return httpx.HTTPStatusError("server error", request=request, response=httpx.Response(500, request=request))
+    
+    @classmethod
+    async def _post(cls, times: int = 1):
+        """通过ASGI直接调用应用，返回各次响应"""
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.post("/v1/chat/completions", json=cls.REQUEST) for _ in range(times)]
+    
+    @pytest.mark.asyncio
+    async def test_upstream_failures_open_breaker(self, reliable_openai):
+        """测试上游连续5xx后断路器打开，后续请求直接返回503且不再发往上游"""
+        reliable_openai.send_request = AsyncMock(side_effect=self._server_error())
+        
+        responses = await self._post(3)
+        
+        assert [response.status_code for response in responses] == [500, 500, 503]
+        assert reliable_openai.send_request.await_count == 2
+        assert server.get_circuit_breaker("openai").is_open()
+    
+    @pytest.mark.asyncio
+    async def test_client_errors_do_not_open_breaker(self, reliable_openai):
+        """测试非上游故障（如请求参数错误）不计入断路器"""
+        reliable_openai.send_request = AsyncMock(side_effect=ValueError("bad request"))
+        
+        responses = await self._post(3)
+        
+        assert [response.status_code for response in responses] == [500, 500, 500]
+        assert not server.get_circuit_breaker("openai").is_open()
+    
+    @pytest.mark.asyncio
+    async def test_full_bulkhead_returns_503(self, reliable_openai):
+        """测试并发名额和等待队列都已满时直接返回503，不再发往上游"""
+        reliable_openai.send_request = AsyncMock(return_value={"choices": []})
+        bulkhead = server.get_bulkhead("openai")
+        await bulkhead.acquire()
+        
+        [response] = await self._post()
+        
+        assert response.status_code == 503
+        reliable_openai.send_request.assert_not_awaited()
+        
+        bulkhead.release()
+        [response] = await self._post()
+        assert response.status_code == 200
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("error", [
+        server.CircuitOpenError("open"),
+        server.BulkheadFullError("full")
+    ])
+    async def test_errors_raised_mid_request_map_to_503(self, reliable_openai, monkeypatch, error):
+        """测试请求进行中才出现的断路器打开或并发已满错误映射为503"""
+        monkeypatch.setattr(server, "call_upstream", AsyncMock(side_effect=error))
+        
+        [response] = await self._post()
+        
+        assert response.status_code == 503
+        assert "openai" in response.json()["detail"]
+    
+    @pytest.mark.asyncio
+    async def test_guard_stream_records_failures(self, reliable_openai):
+        """测试流式响应中途的上游故障计入断路器，并释放并发名额"""
+        async def failing_stream():
+            yield {"choices": []}
+            raise httpx.ConnectError("connection reset")
+        
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectError):
+                async for _ in server.guard_stream("openai", failing_stream()):
+                    pass
+        
+        assert server.get_circuit_breaker("openai").is_open()
+        assert not server.get_bulkhead("openai").is_full()
@@ -2,6 +2,7 @@
 DuckDB存储系统单元测试
 """
 
+import duckdb
 import pytest
 import tempfile
 import os
@@ -136,6 +137,15 @@ class TestLogStorage:
         result = storage.query("SELECT COUNT(*) as count FROM api_calls")
         assert result[0]['count'] == 0  # 新数据库应该为空
     
+    def test_init_skips_low_cardinality_indexes(self, storage):
+        """测试不为低基数的provider/model列创建索引"""
+        result = storage.query("SELECT index_name FROM duckdb_indexes() WHERE table_name = 'api_calls'")
+        index_names = {row['index_name'] for row in result}
+        
+        assert 'idx_user_session' in index_names
+        assert 'idx_provider_model' not in index_names
+        assert 'idx_model_timestamp' not in index_names
+    
     def test_init_creates_views(self, storage):
         """测试初始化创建视图"""
         # 验证cache_analysis_comparison视图
@@ -181,6 +191,64 @@ class TestLogStorageOperations:
         assert stored_log['estimated_tpot_ms'] == 20.5
         assert stored_log['estimated_cost_usd'] == 0.00025
     
+    def test_store_logs_batch(self, storage, sample_api_log):
+        """测试批量存储日志"""
+        logs = [sample_api_log.model_copy(update={"request_id": f"batch-{i}"}) for i in range(5)]
+        
+        storage.store_logs_batch(logs)
+        
+        result = storage.query("SELECT request_id, actual_total_tokens FROM api_calls ORDER BY request_id")
+        assert [row['request_id'] for row in result] == [f"batch-{i}" for i in range(5)]
+        assert all(row['actual_total_tokens'] == 15 for row in result)
+    
+    def test_store_logs_batch_sorted_by_timestamp(self, storage, sample_api_log):
+        """测试批量写入按时间顺序排列"""
+        now = datetime.utcnow()
+        logs = [
+            sample_api_log.model_copy(update={"request_id": f"t-{offset}", "timestamp": now + timedelta(seconds=offset)})
+            for offset in (3, 1, 2)
+        ]
+        
+        storage.store_logs_batch(logs)
+        
+        result = storage.query("SELECT request_id FROM api_calls")
+        assert [row['request_id'] for row in result] == ["t-1", "t-2", "t-3"]
+    
+    def test_store_logs_batch_preserves_nulls_and_types(self, storage, sample_api_log):
+        """测试批量存储保留空值和列类型"""
+        with_usage = sample_api_log.model_copy(update={"request_id": "with-usage"})
+        without_usage = sample_api_log.model_copy(update={
+            "request_id": "without-usage",
+            "raw_data": sample_api_log.raw_data.model_copy(update={"extracted_usage": None}),
+        })
+        
+        storage.store_logs_batch([with_usage, without_usage])
+        
+        result = storage.query(
+            "SELECT request_id, actual_prompt_tokens, extracted_usage, typeof(timestamp) AS ts_type "
+            "FROM api_calls ORDER BY request_id"
+        )
+        assert result[0]['request_id'] == "with-usage"
+        assert result[0]['actual_prompt_tokens'] == 10
+        assert result[1]['extracted_usage'] is None
+        assert all(row['ts_type'] == "TIMESTAMP" for row in result)
+    
+    def test_store_logs_batch_rolls_back_on_failure(self, storage, sample_api_log):
+        """测试批量存储失败时整批回滚"""
+        with patch.object(storage, '_daily_stats_rows', side_effect=RuntimeError("stats failed")):
+            with pytest.raises(RuntimeError):
+                storage.store_logs_batch([sample_api_log, sample_api_log.model_copy()])
+        
+        result = storage.query("SELECT COUNT(*) as count FROM api_calls")
+        assert result[0]['count'] == 0
+    
+    def test_request_id_not_unique_constrained(self, storage, sample_api_log):
+        """测试主表不再对 request_id 维护唯一约束"""
+        storage.store_logs_batch([sample_api_log, sample_api_log.model_copy()])
+        
+        result = storage.query("SELECT COUNT(*) as count FROM api_calls WHERE request_id = ?", [sample_api_log.request_id])
+        assert result[0]['count'] == 2
+    
     def test_store_log_handles_json_fields(self, storage, sample_api_log):
         """测试存储JSON字段"""
         storage.store_log(sample_api_log)
@@ -225,6 +293,32 @@ class TestLogStorageOperations:
             storage.store_log(invalid_log)
 
 
+class TestKeepConnection:
+    """长连接模式测试"""
+    
+    def test_reuses_single_connection(self, temp_db_path, sample_api_log):
+        """测试长连接模式只打开一次数据库"""
+        with patch('lessllm.logging.storage.duckdb.connect', wraps=duckdb.connect) as mock_connect:
+            storage = LogStorage(temp_db_path, keep_connection=True)
+            storage.store_log(sample_api_log)
+            storage.store_logs_batch([sample_api_log.model_copy(update={"request_id": "batch-1"})])
+            result = storage.query("SELECT COUNT(*) as count FROM api_calls")
+            storage.cleanup_old_logs(days_to_keep=30)
+        
+        assert result[0]['count'] == 2
+        assert mock_connect.call_count == 1
+        storage.close()
+    
+    def test_close_releases_database(self, temp_db_path, sample_api_log):
+        """测试关闭长连接后其他连接可以打开数据库"""
+        storage = LogStorage(temp_db_path, keep_connection=True)
+        storage.store_log(sample_api_log)
+        storage.close()
+        
+        assert storage._conn is None
+        assert LogStorage(temp_db_path).query("SELECT COUNT(*) as count FROM api_calls")[0]['count'] == 1
+
+
 class TestLogQueries:
     """日志查询测试"""
     
@@ -330,6 +424,69 @@ class TestPerformanceStats:
         # 测试15天内的统计（应该包含旧日志）
         stats = storage.get_performance_stats(days=15)
         assert stats['total_requests'] == 1
+    
+    @staticmethod
+    def _make_log(latency_ms, ttft_ms=None, success=True, days_ago=0):
+        return APICallLog(
+            provider="openai",
+            model="gpt-4",
+            endpoint="/v1/chat/completions",
+            raw_data=RawAPIData(raw_request={}, raw_response={}),
+            estimated_analysis=EstimatedAnalysis(
+                estimated_performance=PerformanceAnalysis(total_latency_ms=latency_ms, ttft_ms=ttft_ms),
+                estimated_cache=CacheAnalysis(),
+                estimated_cost_usd=0.001
+            ),
+            success=success,
+            timestamp=datetime.utcnow() - timedelta(days=days_ago)
+        )
+    
+    def test_stats_match_raw_table_with_nulls(self, storage):
+        """测试物化统计与直接在主表上聚合的结果一致（NULL不计入平均）"""
+        storage.store_log(self._make_log(1000, ttft_ms=200))
+        storage.store_logs_batch([
+            self._make_log(2000),
+            self._make_log(3000, ttft_ms=400, success=False)
+        ])
+        
+        stats = storage.get_performance_stats()
+        
+        assert stats['total_requests'] == 3
+        assert stats['successful_requests'] == 2
+        assert stats['avg_latency_ms'] == 2000
+        assert stats['avg_ttft_ms'] == 300
+        assert stats['avg_tpot_ms'] is None
+        assert stats['total_cost_usd'] == pytest.approx(0.003)
+    
+    def test_cleanup_removes_stats_rows(self, storage):
+        """测试清理旧日志时同步删除过期的统计行"""
+        storage.store_log(self._make_log(1000, days_ago=40))
+        storage.store_log(self._make_log(1000))
+        
+        storage.cleanup_old_logs(days_to_keep=30)
+        
+        assert storage.get_performance_stats(days=60)['total_requests'] == 1
+    
+    def test_refresh_rebuilds_from_raw_table(self, storage):
+        """测试重建统计与增量结果一致"""
+        storage.store_logs_batch([self._make_log(1000), self._make_log(3000, days_ago=2)])
+        before = storage.get_performance_stats()
+        
+        storage.refresh_performance_stats()
+        
+        assert storage.get_performance_stats() == before
+    
+    def test_backfill_existing_database(self, temp_db_path):
+        """测试旧数据库首次打开时根据已有日志回填统计"""
+        storage = LogStorage(temp_db_path)
+        storage.store_log(self._make_log(1000))
+        with duckdb.connect(temp_db_path) as conn:
+            conn.execute("DROP TABLE performance_stats_daily")
+        
+        stats = LogStorage(temp_db_path).get_performance_stats()
+        
+        assert stats['total_requests'] == 1
+        assert stats['avg_latency_ms'] == 1000
 
 
 class TestCacheAnalysis:
@@ -437,6 +594,26 @@ class TestDataExport:
         finally:
             if os.path.exists(export_path):
                 os.unlink(export_path)
+    
+    def test_export_parquet_compression_and_quoted_path(self, storage, sample_api_log, tmp_path):
+        """测试导出使用ZSTD压缩且路径中的单引号被正确转义"""
+        storage.store_log(sample_api_log)
+        export_path = str(tmp_path / "it's.parquet")
+        
+        storage.export_parquet(export_path)
+        
+        with duckdb.connect() as conn:
+            codecs = conn.execute(
+                "SELECT DISTINCT compression FROM parquet_metadata(?)", [export_path]
+            ).fetchall()
+            count = conn.execute("SELECT COUNT(*) FROM read_parquet(?)", [export_path]).fetchone()[0]
+        assert codecs == [("ZSTD",)]
+        assert count == 1
+    
+    def test_export_parquet_rejects_unknown_filter(self, storage, tmp_path):
+        """测试未知筛选条件直接报错而不是被忽略"""
+        with pytest.raises(ValueError):
+            storage.export_parquet(str(tmp_path / "out.parquet"), user="x")
 
 
 class TestUtilityMethods:
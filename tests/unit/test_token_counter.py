@@ -0,0 +1,42 @@
+"""
+Token计数单元测试
+"""
+
+from lessllm.utils.token_counter import count_tokens, count_messages_tokens
+
+
+class TestCountTokens:
+    """Token计数测试"""
+    
+    def test_empty_text(self):
+        """测试空文本"""
+        assert count_tokens("") == 0
+    
+    def test_words_and_punctuation(self):
+        """测试单词和标点符号各算一个token"""
+        assert count_tokens("Hello, world!") == 4
+    
+    def test_chinese_characters_counted_extra(self):
+        """测试中文字符在单词计数之外按字符再计数"""
+        # "你好" 是一个单词，加上两个中文字符
+        assert count_tokens("你好 ok") == 4
+    
+    def test_claude_discount(self):
+        """测试Claude模型的估算系数"""
+        assert count_tokens("one two three four five six seven eight nine ten", "claude-3") == 9
+
+
+class TestCountMessagesTokens:
+    """消息列表Token计数测试"""
+    
+    def test_text_and_image_content(self):
+        """测试文本和图片内容的token合计"""
+        messages = [
+            {"role": "user", "content": [
+                {"type": "text", "text": "hi there"},
+                {"type": "image_url", "image_url": {"url": "http://x"}}
+            ]}
+        ]
+        
+        # role(1) + text(2) + 图片(85) + 消息开销(4) + 对话开销(2)
+        assert count_messages_tokens(messages) == 94